@@ -0,0 +1,297 @@
+"""
+Замеры производительности всех публичных методов ImageProcessor
+на разных размерах и режимах изображений.
+
+Запуск из каталога Src:
+    python benchmarks/bench_processor.py --sizes thumb,1mp -o results.json
+    python benchmarks/bench_processor.py --baseline results.json --threshold 1.2
+
+Результат - JSON со временем (минимум и медиана по повторам), пропускной
+способностью в Мп/с и пиковой памятью. При сравнении с базовым файлом
+замеры, ставшие медленнее порога, помечаются как регрессии, и скрипт
+завершается с кодом 1
+"""
+import argparse
+import ctypes
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import PIL
+from PIL import Image
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from image_lib.image_processor import ImageProcessor
+from image_lib import color_engine
+
+SIZES = {
+    'thumb': (160, 120),
+    '1mp': (1152, 864),
+    '12mp': (4000, 3000),
+    '24mp': (6000, 4000),
+    '50mp': (8660, 5774)
+}
+
+MODES = ('RGB', 'RGBA', 'L', 'P')
+
+# Пресеты, поставляемые с приложением (для apply_preset)
+PRESETS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'configs')
+
+DEFAULT_SIZES = ('thumb', '1mp')
+
+# Аргументы операций; вызываемые получают изображение
+OPERATION_ARGS = {
+    'adjust_brightness': (1.2,),
+    'adjust_contrast': (1.2,),
+    'adjust_saturation': (1.2,),
+    'apply_color_matrix': (color_engine.SEPIA_MATRIX,),
+    'apply_color_preset': ('sepia',),
+    'apply_preset': ('vintage',),
+    'resize_image': lambda image: (max(1, image.width // 2), max(1, image.height // 2)),
+}
+
+# Минимальное суммарное время повторов одного замера, секунды
+MIN_TOTAL_TIME = 0.5
+MAX_REPEATS = 20
+
+_HEAP_SAMPLE_INTERVAL = 0.001
+
+
+# ===== ПОДГОТОВКА ДАННЫХ =====
+def make_image(width: int, height: int, mode: str) -> Image.Image:
+    """Детерминированное изображение: градиенты с шумом, чтобы фильтры и сжатие работали как на фото"""
+    rng = np.random.default_rng(width * 31 + height)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    arr = np.empty((height, width, 3), dtype=np.uint8)
+    noise = rng.integers(0, 32, (height, width), dtype=np.uint8)
+    arr[..., 0] = (x + noise) % 256
+    arr[..., 1] = (y + noise) % 256
+    arr[..., 2] = ((x + y) / 2 + noise) % 256
+    image = Image.fromarray(arr)
+    if mode == 'RGBA':
+        image.putalpha(Image.fromarray(noise * 8))
+    elif mode != 'RGB':
+        image = image.convert(mode)
+    return image
+
+
+def benchmark_cases(processor: ImageProcessor, temp_dir: str) -> dict:
+    """Имя метода -> функция(изображение) для каждого публичного метода процессора"""
+    cases = {}
+    for name in ImageProcessor.OPERATIONS:
+        args = OPERATION_ARGS.get(name, ())
+        method = getattr(processor, name)
+        cases[name] = (lambda image, method=method, args=args:
+                       method(image, *(args(image) if callable(args) else args)))
+
+    path = os.path.join(temp_dir, 'bench.png')
+    cases['get_image_info'] = processor.get_image_info
+    cases['create_preview'] = lambda image: processor.create_preview(image, 400, 300)
+    cases['save_image'] = lambda image: processor.save_image(image, path)
+    # Методы чтения работают с файлом, записанным подготовкой замера
+    cases['validate_image'] = lambda image: processor.validate_image(path)
+    cases['load_image'] = lambda image: processor.load_image(path)
+    return cases
+
+
+# ===== ЗАМЕРЫ =====
+class _MallInfo2(ctypes.Structure):
+    _fields_ = [(name, ctypes.c_size_t) for name in (
+        'arena', 'ordblks', 'smblks', 'hblks', 'hblkhd', 'usmblks',
+        'fsmblks', 'uordblks', 'fordblks', 'keepcost')]
+
+
+def _load_mallinfo():
+    try:
+        mallinfo = ctypes.CDLL(None).mallinfo2
+    except (OSError, AttributeError):
+        return None
+    mallinfo.restype = _MallInfo2
+    return mallinfo
+
+
+_mallinfo = _load_mallinfo()
+
+
+def _heap_in_use() -> int:
+    # Занятая память кучи C (glibc): сюда попадают и буферы Pillow, и массивы numpy
+    info = _mallinfo()
+    return info.uordblks + info.hblkhd
+
+
+def measure_memory(func, image) -> dict:
+    """
+    Пиковая память вызова: tracemalloc видит память Python и numpy, а опрос
+    кучи glibc в фоновом потоке - еще и выделения внутри Pillow
+    """
+    heap_before = heap_peak = 0
+    stop = threading.Event()
+    sampler = None
+    if _mallinfo is not None:
+        heap_before = heap_peak = _heap_in_use()
+
+        def sample():
+            nonlocal heap_peak
+            while not stop.is_set():
+                heap_peak = max(heap_peak, _heap_in_use())
+                time.sleep(_HEAP_SAMPLE_INTERVAL)
+
+        sampler = threading.Thread(target=sample, daemon=True)
+
+    tracemalloc.start()
+    if sampler is not None:
+        sampler.start()
+    try:
+        func(image)
+    finally:
+        stop.set()
+        if sampler is not None:
+            sampler.join()
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "traced_peak_bytes": traced_peak,
+        "heap_peak_bytes": heap_peak - heap_before if sampler is not None else None
+    }
+
+
+def measure_time(func, image, max_repeats: int = MAX_REPEATS) -> list:
+    timings = []
+    while len(timings) < max_repeats:
+        start = time.perf_counter()
+        func(image)
+        timings.append(time.perf_counter() - start)
+        if sum(timings) >= MIN_TOTAL_TIME and len(timings) >= 3:
+            break
+    return timings
+
+
+def run_benchmarks(sizes, modes, operations=None, max_repeats: int = MAX_REPEATS, progress=None) -> dict:
+    processor = ImageProcessor(history_file=None, presets_dir=PRESETS_DIR)
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cases = benchmark_cases(processor, temp_dir)
+        names = [name for name in cases if not operations or name in operations]
+        for size_name in sizes:
+            width, height = SIZES[size_name]
+            for mode in modes:
+                image = make_image(width, height, mode)
+                image.save(os.path.join(temp_dir, 'bench.png'))
+                for name in names:
+                    result = {
+                        "operation": name,
+                        "size": size_name,
+                        "mode": mode,
+                        "width": width,
+                        "height": height
+                    }
+                    try:
+                        timings = measure_time(cases[name], image, max_repeats)
+                        result.update(measure_memory(cases[name], image))
+                    except Exception as e:
+                        result["error"] = f"{type(e).__name__}: {e}"
+                    else:
+                        best = min(timings)
+                        result.update({
+                            "repeats": len(timings),
+                            "min_s": best,
+                            "median_s": statistics.median(timings),
+                            "mp_per_s": width * height / 1e6 / best if best else None
+                        })
+                    results.append(result)
+                    if progress:
+                        progress(result)
+
+    return {
+        "meta": {
+            "date": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()
+        },
+        "results": results
+    }
+
+
+# ===== СРАВНЕНИЕ С БАЗОВЫМ ЗАМЕРОМ =====
+def _result_key(result: dict) -> tuple:
+    return result["operation"], result["size"], result["mode"]
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """Замеры, у которых минимальное время выросло больше чем в threshold раз"""
+    base = {_result_key(r): r for r in baseline["results"] if "min_s" in r}
+    regressions = []
+    for result in current["results"]:
+        previous = base.get(_result_key(result))
+        if previous is None or "min_s" not in result or not previous["min_s"]:
+            continue
+        ratio = result["min_s"] / previous["min_s"]
+        result["baseline_min_s"] = previous["min_s"]
+        result["ratio"] = ratio
+        if ratio > threshold:
+            regressions.append(result)
+    return regressions
+
+
+def _format_result(result: dict) -> str:
+    label = f"{result['operation']:<20} {result['size']:>6} {result['mode']:<4}"
+    if "error" in result:
+        return f"{label} ошибка: {result['error']}"
+    memory = max(result["heap_peak_bytes"] or 0, result["traced_peak_bytes"])
+    return (f"{label} {result['min_s'] * 1000:10.2f} мс {result['mp_per_s'] or 0:9.1f} Мп/с "
+            f"{memory / 2 ** 20:8.1f} МБ")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Замеры производительности ImageProcessor")
+    parser.add_argument("--sizes", default=",".join(DEFAULT_SIZES),
+                        help=f"размеры через запятую: {', '.join(SIZES)} или all")
+    parser.add_argument("--modes", default=",".join(MODES), help="режимы через запятую")
+    parser.add_argument("--ops", help="только эти методы, через запятую")
+    parser.add_argument("--repeats", type=int, default=MAX_REPEATS, help="максимум повторов одного замера")
+    parser.add_argument("-o", "--output", help="файл для результатов в JSON")
+    parser.add_argument("--baseline", help="базовый JSON для поиска регрессий")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="во сколько раз замер может быть медленнее базового (по умолчанию 1.2)")
+    args = parser.parse_args(argv)
+
+    sizes = list(SIZES) if args.sizes == "all" else args.sizes.split(",")
+    for size in sizes:
+        if size not in SIZES:
+            parser.error(f"Неизвестный размер: {size}")
+    modes = args.modes.split(",")
+    operations = args.ops.split(",") if args.ops else None
+
+    report = run_benchmarks(sizes, modes, operations, args.repeats,
+                            progress=lambda result: print(_format_result(result), flush=True))
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for result in regressions:
+            print(f"Регрессия: {result['operation']} {result['size']} {result['mode']}: "
+                  f"{result['baseline_min_s'] * 1000:.2f} -> {result['min_s'] * 1000:.2f} мс "
+                  f"(x{result['ratio']:.2f})")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""
+Замеры холодного запуска: импорт image_lib, создание ImageProcessor,
+справка CLI и открытие главного окна. Каждый сценарий запускается в новом
+процессе интерпретатора, поэтому в замер входят все импорты.
+
+Запуск из каталога Src:
+    python benchmarks/bench_startup.py -o startup.json
+    python benchmarks/bench_startup.py --baseline startup.json --threshold 1.2
+
+Для каждого сценария сохраняется время (минимум и медиана по повторам)
+и список тяжелых модулей, которые оказались загружены. Сценарий
+interpreter - пустой запуск Python, нижняя граница для остальных
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Модули, загрузку которых отслеживают замеры
+HEAVY_MODULES = ('numpy', 'PyQt6.QtWidgets', 'multiprocessing', 'pstats', 'tracemalloc')
+
+_REPORT_MODULES = (
+    "import json, sys\n"
+    f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))\n"
+)
+
+# Сценарий -> код, который выполняется в новом процессе
+SCENARIOS = {
+    'interpreter': "pass\n",
+    'import': "import image_lib\n",
+    'processor': "from image_lib import ImageProcessor\nImageProcessor()\n",
+    'cli': "import sys\nfrom image_lib import cli\n"
+           "try:\n    cli.main(['--help'])\nexcept SystemExit:\n    pass\n",
+    'gui': "from PyQt6.QtWidgets import QApplication\napp = QApplication([])\n"
+           "from ui.main_window import MainWindow\nwindow = MainWindow()\nwindow.show()\napp.processEvents()\n",
+}
+
+DEFAULT_REPEATS = 7
+
+
+def run_scenario(code: str, workdir: str) -> tuple:
+    """Время одного запуска в секундах и загруженные тяжелые модули"""
+    env = dict(os.environ, PYTHONPATH=SRC_DIR, QT_QPA_PLATFORM=os.environ.get('QT_QPA_PLATFORM', 'offscreen'))
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-c', code + _REPORT_MODULES], cwd=workdir, env=env,
+                               capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else
+                           f"код возврата {completed.returncode}")
+    return elapsed, json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def run_benchmarks(scenarios, repeats: int = DEFAULT_REPEATS, progress=None) -> dict:
+    results = []
+    # Сценарии запускаются в пустом каталоге: видно, трогает ли запуск диск (файл истории)
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in scenarios:
+            result = {"scenario": name}
+            try:
+                # Первый запуск прогревает файловый кэш и .pyc и в замер не входит
+                run_scenario(SCENARIOS[name], workdir)
+                timings, modules = [], []
+                for _ in range(repeats):
+                    elapsed, modules = run_scenario(SCENARIOS[name], workdir)
+                    timings.append(elapsed)
+            except RuntimeError as e:
+                result["error"] = str(e)
+            else:
+                result.update({
+                    "repeats": repeats,
+                    "min_s": min(timings),
+                    "median_s": statistics.median(timings),
+                    "heavy_modules": modules,
+                    "created_files": sorted(os.listdir(workdir))
+                })
+            results.append(result)
+            if progress:
+                progress(result)
+
+    return {
+        "meta": {
+            "date": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()
+        },
+        "results": results
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """Сценарии, у которых минимальное время выросло больше чем в threshold раз"""
+    base = {r["scenario"]: r for r in baseline["results"] if "min_s" in r}
+    regressions = []
+    for result in current["results"]:
+        previous = base.get(result["scenario"])
+        if previous is None or "min_s" not in result:
+            continue
+        result["baseline_min_s"] = previous["min_s"]
+        result["ratio"] = result["min_s"] / previous["min_s"]
+        if result["ratio"] > threshold:
+            regressions.append(result)
+    return regressions
+
+
+def _format_result(result: dict) -> str:
+    label = f"{result['scenario']:<12}"
+    if "error" in result:
+        return f"{label} ошибка: {result['error']}"
+    modules = ", ".join(result["heavy_modules"]) or "-"
+    return f"{label} {result['min_s'] * 1000:8.1f} мс (медиана {result['median_s'] * 1000:.1f})  модули: {modules}"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Замеры времени запуска")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"сценарии через запятую: {', '.join(SCENARIOS)}")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="число запусков каждого сценария")
+    parser.add_argument("-o", "--output", help="файл для результатов в JSON")
+    parser.add_argument("--baseline", help="базовый JSON для поиска регрессий")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="во сколько раз запуск может быть медленнее базового (по умолчанию 1.2)")
+    args = parser.parse_args(argv)
+
+    scenarios = args.scenarios.split(",")
+    for name in scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"Неизвестный сценарий: {name}")
+
+    report = run_benchmarks(scenarios, args.repeats, progress=lambda result: print(_format_result(result), flush=True))
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for result in regressions:
+            print(f"Регрессия: {result['scenario']}: {result['baseline_min_s'] * 1000:.1f} -> "
+                  f"{result['min_s'] * 1000:.1f} мс (x{result['ratio']:.2f})")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
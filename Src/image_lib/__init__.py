@@ -1,3 +1,24 @@
 from .image_processor import ImageProcessor
+from .history import OperationHistory, read_history
+from .cache import ResultCache
 
-__all__ = ['ImageProcessor']
+# Экспорт, наблюдение за каталогами и пул процессов тянут multiprocessing
+# и numpy, поэтому импортируются при первом обращении (image_lib.WorkerPool)
+_LAZY_EXPORTS = {
+    'Exporter': '.export',
+    'ExportVariant': '.export',
+    'WatchService': '.watch',
+    'WorkerPool': '.workers',
+}
+
+__all__ = ['ImageProcessor', 'OperationHistory', 'read_history', 'ResultCache', 'Exporter', 'ExportVariant',
+           'WatchService', 'WorkerPool']
+
+
+def __getattr__(name):
+    if name not in _LAZY_EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+    value = getattr(importlib.import_module(_LAZY_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,198 @@
+import ast
+import glob
+import logging
+import os
+from concurrent.futures import as_completed
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from . import resampling
+from .image_processor import ImageProcessor, SUPPORTED_EXTENSIONS, normalize_format
+
+if TYPE_CHECKING:
+    from .workers import WorkerPool
+
+logger = logging.getLogger(__name__)
+
+_FORMAT_EXTENSIONS = {'JPEG': '.jpg', 'TIFF': '.tiff'}
+
+
+def parse_operation(spec: str) -> Tuple[str, list, dict]:
+    """
+    Разбирает описание операции вида "name" или "name:1.2" или
+    "resize_image:width=800,height=600" в (имя, позиционные, именованные)
+    """
+    name, _, raw_params = spec.partition(':')
+    name = name.strip()
+    if name not in ImageProcessor.OPERATIONS:
+        raise ValueError(f"Неизвестная операция: {name}")
+
+    args, kwargs = [], {}
+    for item in filter(None, (part.strip() for part in raw_params.split(','))):
+        key, sep, value = item.partition('=')
+        if sep:
+            kwargs[key.strip()] = _parse_value(value.strip())
+        else:
+            args.append(_parse_value(item))
+    return name, args, kwargs
+
+
+def _parse_value(value: str):
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return value
+
+
+def collect_inputs(source: str) -> List[str]:
+    """Файлы изображений из каталога или по маске (glob), в отсортированном порядке"""
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in os.listdir(source)]
+    else:
+        paths = glob.glob(source, recursive=True)
+    return sorted(p for p in paths if os.path.isfile(p) and p.lower().endswith(SUPPORTED_EXTENSIONS))
+
+
+def input_root(source: str) -> str:
+    """
+    Каталог, от которого отсчитываются пути файлов из collect_inputs(source):
+    сам каталог или часть маски до первого шаблона ('photos/**/*.jpg' -> 'photos')
+    """
+    if os.path.isdir(source):
+        return source
+    root = os.path.dirname(source)
+    while any(char in root for char in '*?['):
+        root = os.path.dirname(root)
+    return root or os.curdir
+
+
+def output_path_for(input_path: str, output_dir: str, format: Optional[str] = None,
+                    suffix: str = '', root: Optional[str] = None) -> str:
+    """
+    Путь результата в output_dir. С root подкаталоги исходного файла
+    относительно root повторяются в output_dir
+    """
+    stem, ext = os.path.splitext(os.path.basename(input_path))
+    stem += suffix
+    if format:
+        format = normalize_format(format)
+        ext = _FORMAT_EXTENSIONS.get(format, '.' + format.lower())
+    if root is not None:
+        output_dir = os.path.join(output_dir, os.path.dirname(os.path.relpath(input_path, root)))
+    return os.path.join(output_dir, stem + ext)
+
+
+def output_paths_for(input_path: str, output_dir: str, format: Optional[str] = None,
+                     sizes: Optional[List[tuple]] = None, root: Optional[str] = None) -> List[str]:
+    """Пути всех результатов process_file для одного файла"""
+    if not sizes:
+        return [output_path_for(input_path, output_dir, format, root=root)]
+    return [output_path_for(input_path, output_dir, format, f"_{width}x{height}", root)
+            for width, height in sizes]
+
+
+def parse_options(specs: List[str]) -> dict:
+    """Параметры кодировщика из строк вида "quality=90" """
+    options = {}
+    for spec in specs:
+        key, sep, value = spec.partition('=')
+        if not sep:
+            raise ValueError(f"Ожидается параметр вида ключ=значение: {spec}")
+        options[key.strip()] = _parse_value(value.strip())
+    return options
+
+
+def parse_sizes(spec: str) -> List[Tuple[int, int]]:
+    """Размеры из строки вида "1600x1200,800x600" """
+    sizes = []
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        width, sep, height = item.lower().partition('x')
+        if not sep or not width.isdigit() or not height.isdigit():
+            raise ValueError(f"Ожидается размер вида ШИРИНАxВЫСОТА: {item}")
+        sizes.append((int(width), int(height)))
+    return sizes
+
+
+def process_file(processor: ImageProcessor, input_path: str, operations: list,
+                 output_dir: str, format: Optional[str] = None, save_options: Optional[dict] = None,
+                 sizes: Optional[List[tuple]] = None, resize_mode: str = 'fit',
+                 root: Optional[str] = None) -> List[str]:
+    """
+    Применяет цепочку операций к одному файлу и сохраняет результат.
+    С sizes сохраняется по файлу на каждый размер (имя_ШxВ), все размеры
+    строятся от общей пирамиды уменьшений. root - см. output_path_for
+    """
+    image = processor.load_image(input_path)
+    for name, args, kwargs in operations:
+        image = processor.apply_operation(image, name, *args, **kwargs)
+
+    images = resampling.resize_many(image, sizes, resize_mode) if sizes else [image]
+    outputs = list(zip(images, output_paths_for(input_path, output_dir, format, sizes, root)))
+    for result, output_path in outputs:
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        processor.save_image(result, output_path, format, **(save_options or {}))
+    return [output_path for _, output_path in outputs]
+
+
+def run_batch(inputs: List[str], operations: list, output_dir: str,
+              format: Optional[str] = None, workers: Optional[int] = None,
+              processor: Optional[ImageProcessor] = None, cache_dir: Optional[str] = None,
+              save_options: Optional[dict] = None, sizes: Optional[List[tuple]] = None,
+              resize_mode: str = 'fit', pool: Optional['WorkerPool'] = None,
+              root: Optional[str] = None) -> dict:
+    """
+    Обрабатывает файлы в пуле процессов (по умолчанию один процесс на ядро).
+    С cache_dir результаты операций кэшируются на диске между запусками,
+    save_options передаются кодировщику формата результата, sizes задает
+    несколько размеров результата (см. process_file). Переданный pool
+    переиспользуется и не закрывается, workers и cache_dir тогда не нужны.
+    С root результаты раскладываются по подкаталогам, как исходные файлы
+    относительно root (см. input_root). Если два файла дают один и тот же
+    результат, обработка не начинается (ValueError).
+    Возвращает сводку {"processed": [...], "failed": {путь: ошибка}}
+    """
+    # Одноименные файлы из разных каталогов (или a.jpg и a.png при общем
+    # формате) молча перезаписали бы друг друга
+    claimed = {}
+    for path in inputs:
+        for output_path in output_paths_for(path, output_dir, format, sizes, root):
+            key = os.path.normcase(os.path.abspath(output_path))
+            if key in claimed:
+                raise ValueError(f"Файлы {claimed[key]} и {path} дают один результат {output_path}")
+            claimed[key] = path
+
+    os.makedirs(output_dir, exist_ok=True)
+    processor = processor or ImageProcessor()
+    summary = {"processed": [], "failed": {}}
+
+    own_pool = pool is None
+    if own_pool:
+        # Пул тянет numpy и multiprocessing, поэтому импортируется только здесь
+        from .workers import WorkerPool
+        pool = WorkerPool(workers, cache_dir=cache_dir)
+    try:
+        # Рабочие процессы сами читают и пишут файлы: между процессами передаются только пути
+        futures = {
+            pool.run(process_file, path, operations, output_dir, format, save_options, sizes, resize_mode, root): path
+            for path in inputs
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                output_paths = future.result()
+            except Exception as e:
+                logger.error(f"Ошибка обработки {path}: {e}")
+                summary["failed"][path] = str(e)
+                continue
+            summary["processed"].extend(output_paths)
+            processor._log_operation("batch_process", {
+                "file_path": path,
+                "output_paths": output_paths,
+                "operations": [name for name, _, _ in operations]
+            })
+    finally:
+        if own_pool:
+            pool.close()
+
+    logger.info(f"Пакетная обработка завершена: {len(summary['processed'])} успешно, "
+                f"{len(summary['failed'])} с ошибками")
+    return summary
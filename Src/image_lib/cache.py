@@ -0,0 +1,146 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
+
+# Сколько байт изображения хэшируется за раз
+_HASH_CHUNK_BYTES = 16 * 1024 * 1024
+
+
+def image_digest(image: Image.Image) -> str:
+    """
+    Быстрый хэш содержимого изображения (режим, размер и пиксели).
+    Считается при каждом вызове и не запоминается на изображении: вызывающий
+    может изменить его на месте (paste, ImageDraw), и старый хэш стал бы неверным
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(f"{image.mode}:{image.width}x{image.height}".encode())
+    if image.mode == 'P':
+        hasher.update(bytes(image.getpalette() or []))
+
+    # Пиксели хэшируются полосами, чтобы не копировать изображение целиком
+    row_bytes = max(1, image.width * len(image.getbands()))
+    rows = max(1, _HASH_CHUNK_BYTES // row_bytes)
+    for top in range(0, image.height, rows):
+        hasher.update(image.crop((0, top, image.width, min(image.height, top + rows))).tobytes())
+
+    return hasher.hexdigest()
+
+
+def operation_key(digest: str, operation: str, args=(), kwargs=None) -> str:
+    """Ключ результата: хэш исходного изображения, имя операции и ее параметры"""
+    description = json.dumps([digest, operation, list(args), kwargs or {}], sort_keys=True, default=repr)
+    return hashlib.blake2b(description.encode(), digest_size=16).hexdigest()
+
+
+def image_nbytes(image: Image.Image) -> int:
+    return image.width * image.height * len(image.getbands())
+
+
+class ResultCache:
+    """
+    LRU-кэш результатов операций с ограничением по объему в байтах и
+    необязательным вторым уровнем на диске (PNG без потерь) для повторных
+    пакетных запусков. Кэш хранит собственные копии и отдает копии, поэтому
+    изменение результата на месте не портит закэшированное значение
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES, disk_dir: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def get(self, key: str) -> Optional[Image.Image]:
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return image.copy()
+
+        image = self._load_from_disk(key)
+        with self._lock:
+            if image is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self._remember(key, image)
+        return image.copy()
+
+    def put(self, key: str, image: Image.Image) -> None:
+        # Исходный результат остается у вызывающего, в кэш попадает копия
+        self._remember(key, image.copy())
+        if self.disk_dir:
+            self._save_to_disk(key, image)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def _remember(self, key: str, image: Image.Image):
+        nbytes = image_nbytes(image)
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = image
+            self._size += nbytes
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= image_nbytes(evicted)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key + '.png')
+
+    def _load_from_disk(self, key: str) -> Optional[Image.Image]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with Image.open(path) as cached:
+                image = cached.copy()
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать кэш {path}: {e}")
+            return None
+        return image
+
+    def _save_to_disk(self, key: str, image: Image.Image):
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            return
+        # Запись во временный файл и переименование: параллельные процессы
+        # никогда не увидят недописанный файл
+        fd, temp_path = tempfile.mkstemp(dir=self.disk_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                image.save(f, format='PNG', compress_level=1)
+            os.replace(temp_path, path)
+        except Exception as e:
+            logger.warning(f"Не удалось записать кэш {path}: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
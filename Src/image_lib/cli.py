@@ -0,0 +1,131 @@
+import argparse
+import logging
+import signal
+import sys
+
+from . import batch, resampling
+from .watch import DEFAULT_MAX_ATTEMPTS, DEFAULT_POLL_INTERVAL, DEFAULT_RETRY_DELAY, WatchService
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m image_lib",
+                                     description="Обработка изображений без графического интерфейса")
+    parser.add_argument("-v", "--verbose", action="store_true", help="подробный журнал операций")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    batch_parser = commands.add_parser("batch", help="пакетная обработка файлов")
+    batch_parser.add_argument("input", help="каталог или маска файлов (glob), например 'photos/**/*.jpg'")
+    batch_parser.add_argument("-o", "--output-dir", required=True,
+                              help="каталог для результатов; подкаталоги исходных файлов повторяются в нем")
+    batch_parser.add_argument("--op", dest="operations", action="append", default=[],
+                              metavar="NAME[:ARGS]",
+                              help="операция ImageProcessor, например apply_sepia, "
+                                   "adjust_brightness:1.2 или resize_image:width=800,height=600; "
+                                   "можно указать несколько раз")
+    batch_parser.add_argument("-f", "--format", help="формат результата (png, jpeg, ...), "
+                                                    "по умолчанию как у исходного файла")
+    batch_parser.add_argument("-j", "--workers", type=int, help="число процессов (по умолчанию - число ядер)")
+    batch_parser.add_argument("--cache-dir", help="каталог дискового кэша результатов для повторных запусков")
+    batch_parser.add_argument("--sizes", help="несколько размеров результата, например 1600x1200,800x600,400x300")
+    batch_parser.add_argument("--resize-mode", default="fit", choices=resampling.RESIZE_MODES,
+                              help="как вписывать изображение в размеры --sizes (по умолчанию fit)")
+    batch_parser.add_argument("-O", "--save-option", dest="save_options", action="append", default=[],
+                              metavar="КЛЮЧ=ЗНАЧЕНИЕ",
+                              help="параметр кодировщика, например -O quality=90 -O progressive=True")
+
+    watch_parser = commands.add_parser("watch", help="обработка новых файлов в каталогах загрузки")
+    watch_parser.add_argument("input", nargs="+", help="наблюдаемые каталоги")
+    watch_parser.add_argument("-o", "--output-dir", required=True, help="каталог для результатов")
+    watch_parser.add_argument("--op", dest="operations", action="append", default=[],
+                              metavar="NAME[:ARGS]", help="операция ImageProcessor, как в batch")
+    watch_parser.add_argument("-f", "--format", help="формат результата, по умолчанию как у исходного файла")
+    watch_parser.add_argument("-j", "--workers", type=int, help="число процессов (по умолчанию - число ядер)")
+    watch_parser.add_argument("--max-pending", type=int,
+                              help="сколько файлов одновременно в работе (по умолчанию - вдвое больше процессов)")
+    watch_parser.add_argument("--ledger", help="журнал обработанных файлов "
+                                               "(по умолчанию .processed.jsonl в каталоге результатов)")
+    watch_parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL,
+                              help="интервал опроса каталогов, с (по умолчанию 1)")
+    watch_parser.add_argument("--polling", action="store_true", help="опрашивать каталоги вместо inotify")
+    watch_parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS,
+                              help="сколько раз пробовать файл, который обрабатывается с ошибкой (по умолчанию 3)")
+    watch_parser.add_argument("--retry-delay", type=float, default=DEFAULT_RETRY_DELAY,
+                              help="через сколько секунд повторять файл с ошибкой (по умолчанию 5)")
+    watch_parser.add_argument("--sizes", help="несколько размеров результата, как в batch")
+    watch_parser.add_argument("--resize-mode", default="fit", choices=resampling.RESIZE_MODES,
+                              help="как вписывать изображение в размеры --sizes (по умолчанию fit)")
+    watch_parser.add_argument("-O", "--save-option", dest="save_options", action="append", default=[],
+                              metavar="КЛЮЧ=ЗНАЧЕНИЕ", help="параметр кодировщика, как в batch")
+
+    tiled_parser = commands.add_parser("tiled", help="обработка полосами изображений больше памяти")
+    tiled_parser.add_argument("input", help="несжатый растр: .npy, .ppm или несжатый TIFF")
+    tiled_parser.add_argument("output", help="результат: .npy или .ppm")
+    tiled_parser.add_argument("--op", dest="operations", action="append", default=[],
+                              metavar="NAME[:ARGS]", help="операция ImageProcessor, как в batch")
+    tiled_parser.add_argument("--memory-mb", type=int, default=256,
+                              help="бюджет памяти на полосу, МБ (по умолчанию 256)")
+    return parser
+
+
+def run_tiled_command(args) -> int:
+    # Обработка полосами тянет numpy: модуль нужен только этой команде
+    from .tiling import TiledProcessor
+    operations = [batch.parse_operation(spec) for spec in args.operations]
+    TiledProcessor(memory_budget=args.memory_mb * 1024 * 1024).process(args.input, args.output, operations)
+    return 0
+
+
+def run_batch_command(args) -> int:
+    operations = [batch.parse_operation(spec) for spec in args.operations]
+    inputs = batch.collect_inputs(args.input)
+    if not inputs:
+        logging.error(f"Не найдено изображений: {args.input}")
+        return 1
+
+    summary = batch.run_batch(inputs, operations, args.output_dir, args.format, args.workers,
+                              cache_dir=args.cache_dir, save_options=batch.parse_options(args.save_options),
+                              sizes=batch.parse_sizes(args.sizes) if args.sizes else None,
+                              resize_mode=args.resize_mode, root=batch.input_root(args.input))
+    print(f"Обработано: {len(summary['processed'])}, ошибок: {len(summary['failed'])}")
+    return 1 if summary["failed"] else 0
+
+
+def run_watch_command(args) -> int:
+    service = WatchService(args.input, args.output_dir, [batch.parse_operation(spec) for spec in args.operations],
+                           args.format, args.workers, ledger_path=args.ledger, max_pending=args.max_pending,
+                           poll_interval=args.poll_interval, polling=args.polling,
+                           save_options=batch.parse_options(args.save_options),
+                           sizes=batch.parse_sizes(args.sizes) if args.sizes else None,
+                           resize_mode=args.resize_mode, max_attempts=args.max_attempts,
+                           retry_delay=args.retry_delay)
+    # Ctrl+C и SIGTERM дожидаются файлов, которые уже в работе
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: service.stop())
+    service.run()
+    print(f"Обработано: {service.processed}, ошибок: {service.failed}")
+    return 1 if service.failed else 0
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    try:
+        if args.command == "batch":
+            return run_batch_command(args)
+        if args.command == "watch":
+            return run_watch_command(args)
+        if args.command == "tiled":
+            return run_tiled_command(args)
+    except ValueError as e:
+        parser.error(str(e))
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+from typing import TYPE_CHECKING
+
+import numpy as np
+from PIL import Image
+
+if TYPE_CHECKING:
+    from .stats import ImageStats
+
+# Сколько пикселей обрабатывается за один проход матричного фильтра.
+# Ограничивает размер временных буферов float64 на больших изображениях.
+BAND_PIXELS = 1 << 20
+
+SEPIA_MATRIX = (
+    (0.393, 0.769, 0.189),
+    (0.349, 0.686, 0.168),
+    (0.272, 0.534, 0.131),
+)
+
+WARM_TONE_SCALES = (1.1, 1.05, 1.0)
+COOL_TONE_SCALES = (1.0, 1.05, 1.1)
+BLUE_TONE_SCALES = (0.9, 0.95, 1.2)
+SKIN_TONE_SCALES = (1.1, 1.05, 0.9)
+
+WHITE_BALANCE_MODES = ('gray_world', 'white_patch', 'percentile')
+
+
+def image_to_array(image: Image.Image) -> np.ndarray:
+    """Возвращает пиксели изображения как массив uint8 формы (H, W, 3)"""
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return np.asarray(image)
+
+
+def scale_lut(factor: float) -> np.ndarray:
+    """Таблица из 256 значений: умножение на коэффициент с отсечением дробной части"""
+    return np.array([min(255, int(v * factor)) for v in range(256)], dtype=np.uint8)
+
+
+def channel_scale_luts(scales) -> np.ndarray:
+    return np.stack([scale_lut(s) for s in scales])
+
+
+def _prepare_out(arr: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    if arr.ndim != 3 or arr.shape[2] != 3 or arr.dtype != np.uint8:
+        raise ValueError("Ожидается массив uint8 формы (H, W, 3)")
+    if out is None:
+        return np.empty_like(arr)
+    if out.shape != arr.shape or out.dtype != np.uint8:
+        raise ValueError(f"Буфер результата должен иметь форму {arr.shape} и тип uint8")
+    return out
+
+
+def apply_channel_luts(arr: np.ndarray, luts: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """Поканальное преобразование по таблицам luts формы (3, 256)"""
+    out = _prepare_out(arr, out)
+    for c in range(3):
+        np.take(luts[c], arr[..., c], out=out[..., c], mode='clip')
+    return out
+
+
+def apply_matrix(arr: np.ndarray, matrix, offset=(0.0, 0.0, 0.0),
+                 out: np.ndarray = None) -> np.ndarray:
+    """
+    Линейное преобразование цвета: out_i = int(m_i0*r + m_i1*g + m_i2*b + offset_i)
+    с отсечением в диапазон 0..255, как в поэлементной реализации на Python
+    """
+    out = _prepare_out(arr, out)
+    # Произведения коэффициентов на все 256 значений канала считаются заранее:
+    # float64 даёт те же результаты, что и вычисление в чистом Python
+    values = np.arange(256, dtype=np.float64)
+    tables = [[m * values for m in row] for row in matrix]
+
+    height, width = arr.shape[:2]
+    rows = max(1, BAND_PIXELS // max(1, width))
+    acc = np.empty((min(rows, height), width), dtype=np.float64)
+    tmp = np.empty_like(acc)
+
+    for top in range(0, height, rows):
+        band = arr[top:top + rows]
+        band_out = out[top:top + rows]
+        band_acc = acc[:band.shape[0]]
+        band_tmp = tmp[:band.shape[0]]
+        for i in range(3):
+            np.take(tables[i][0], band[..., 0], out=band_acc, mode='clip')
+            np.take(tables[i][1], band[..., 1], out=band_tmp, mode='clip')
+            band_acc += band_tmp
+            np.take(tables[i][2], band[..., 2], out=band_tmp, mode='clip')
+            band_acc += band_tmp
+            if offset[i]:
+                band_acc += offset[i]
+            np.clip(band_acc, 0, 255, out=band_acc)
+            np.copyto(band_out[..., i], band_acc, casting='unsafe')
+    return out
+
+
+class ColorTransform:
+    """
+    Поканальное цветовое преобразование: матрица 3x3 со смещением (3x4)
+    или готовые таблицы из 256 значений на каждый канал
+    """
+    
+    def __init__(self, matrix=None, offset=(0.0, 0.0, 0.0), luts=None):
+        if (matrix is None) == (luts is None):
+            raise ValueError("Нужно указать либо матрицу, либо таблицы преобразования")
+        
+        self.matrix = None
+        self.offset = None
+        if matrix is not None:
+            rows = [list(row) for row in matrix]
+            if len(rows) != 3 or {len(row) for row in rows} not in ({3}, {4}):
+                raise ValueError("Матрица цвета должна иметь размер 3x3 или 3x4")
+            if len(offset) != 3:
+                raise ValueError("Смещение должно содержать 3 значения")
+            if len(rows[0]) == 4:
+                offset = [row[3] for row in rows]
+            self.matrix = tuple(tuple(float(m) for m in row[:3]) for row in rows)
+            self.offset = tuple(float(o) for o in offset)
+            luts = self._diagonal_luts()
+        
+        if luts is not None:
+            luts = np.asarray(luts, dtype=np.uint8)
+            if luts.shape != (3, 256):
+                raise ValueError("Таблицы преобразования должны иметь форму (3, 256)")
+        self.luts = luts
+        # Таблица для Image.point: 768 значений, по 256 на канал
+        self._point_table = luts.reshape(-1).tolist() if luts is not None else None
+    
+    @classmethod
+    def from_scales(cls, scales) -> 'ColorTransform':
+        return cls(luts=channel_scale_luts(scales))
+    
+    def _diagonal_luts(self):
+        # Диагональная матрица без смешивания каналов сводится к таблицам,
+        # которые Pillow применяет через Image.point на C
+        for i, row in enumerate(self.matrix):
+            if any(m != 0.0 for j, m in enumerate(row) if j != i):
+                return None
+        return np.array([
+            [min(255, max(0, int(self.matrix[i][i] * v + self.offset[i]))) for v in range(256)]
+            for i in range(3)
+        ], dtype=np.uint8)
+    
+    def apply_array(self, arr: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        if self.luts is not None:
+            return apply_channel_luts(arr, self.luts, out=out)
+        return apply_matrix(arr, self.matrix, self.offset, out=out)
+    
+    def apply(self, image: Image.Image, out: np.ndarray = None) -> Image.Image:
+        if out is None and self._point_table is not None:
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            return image.point(self._point_table)
+        return Image.fromarray(self.apply_array(image_to_array(image), out=out))
+
+
+def apply_color_matrix(image: Image.Image, matrix, offset=(0.0, 0.0, 0.0),
+                       out: np.ndarray = None) -> Image.Image:
+    """Применяет к изображению матрицу цвета 3x3 (со смещением) или 3x4"""
+    return ColorTransform(matrix, offset).apply(image, out=out)
+
+
+# ===== УСИЛИТЕЛИ (как в ImageEnhance) =====
+def blend_values(base, values, alpha: float) -> np.ndarray:
+    """
+    Смешивание base + alpha * (values - base) в float32 с отсечением,
+    побитово повторяющее Image.blend, на котором построен ImageEnhance
+    """
+    base = np.asarray(base, dtype=np.int32)
+    values = np.asarray(values, dtype=np.int32)
+    mixed = base.astype(np.float32) + np.float32(alpha) * (values - base).astype(np.float32)
+    np.clip(mixed, 0, 255, out=mixed)
+    return mixed.astype(np.uint8)
+
+
+def brightness_luts(factor: float) -> np.ndarray:
+    lut = blend_values(0, np.arange(256), factor)
+    return np.stack([lut, lut, lut])
+
+
+def contrast_luts(mean: int, factor: float) -> np.ndarray:
+    lut = blend_values(mean, np.arange(256), factor)
+    return np.stack([lut, lut, lut])
+
+
+def mean_luminance(histogram) -> int:
+    """Средняя яркость по гистограмме L с округлением, как в ImageEnhance.Contrast"""
+    count = sum(histogram)
+    if count == 0:
+        return 0
+    return int(sum(i * h for i, h in enumerate(histogram)) / count + 0.5)
+
+
+# ===== БАЛАНС БЕЛОГО =====
+def white_balance_gains(image_stats: 'ImageStats', mode: str = 'gray_world', percentile: float = 99.0) -> list:
+    """
+    Коэффициенты каналов по статистике изображения: gray_world выравнивает
+    средние, white_patch растягивает максимум каждого канала до 255,
+    percentile - заданный перцентиль
+    """
+    if mode not in WHITE_BALANCE_MODES:
+        raise ValueError(f"Неизвестный режим баланса белого: {mode}")
+    if not 0 < percentile <= 100:
+        raise ValueError("Перцентиль должен быть в диапазоне (0, 100]")
+
+    if mode == 'gray_world':
+        references = image_stats.means()
+        target = sum(references) / len(references)
+    else:
+        target = 255
+        references = image_stats.percentiles(100 if mode == 'white_patch' else percentile)
+
+    # Пустой канал не усиливается
+    return [target / reference if reference else 1.0 for reference in references]
+
+
+def gain_lut(gains) -> list:
+    """Одна таблица на 768 значений для Image.point: умножение с округлением и отсечением"""
+    return [min(255, round(v * gain)) for gain in gains for v in range(256)]
+
+
+# ===== ПРЕСЕТЫ =====
+COLOR_PRESETS = {
+    'sepia': ColorTransform(SEPIA_MATRIX),
+    'warm_tone': ColorTransform.from_scales(WARM_TONE_SCALES),
+    'cool_tone': ColorTransform.from_scales(COOL_TONE_SCALES),
+    'blue_tone': ColorTransform.from_scales(BLUE_TONE_SCALES),
+    'skin_tone': ColorTransform.from_scales(SKIN_TONE_SCALES),
+}
+
+
+def register_preset(name: str, transform: ColorTransform) -> None:
+    """Добавляет цветовой пресет, доступный через ImageProcessor.apply_color_preset"""
+    COLOR_PRESETS[name] = transform
+
+
+def get_preset(name: str) -> ColorTransform:
+    if name not in COLOR_PRESETS:
+        raise ValueError(f"Неизвестный цветовой пресет: {name}")
+    return COLOR_PRESETS[name]
@@ -0,0 +1,212 @@
+import logging
+import zlib
+from typing import Callable, List, Optional
+
+from PIL import Image
+
+from .resampling import target_size
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MEMORY_LIMIT = 256 * 1024 * 1024
+
+# Полный снимок состояния сохраняется через каждые столько шагов
+DEFAULT_CHECKPOINT_INTERVAL = 4
+
+# Параметры операций в пикселях (по порядку позиционных аргументов), которые
+# масштабируются, когда история ведется на уменьшенной копии изображения
+SCALED_PARAMETERS = {
+    'resize_image': ('width', 'height'),
+    'apply_blur': ('radius',),
+    'apply_sharpen': ('radius',),
+}
+
+
+def _scale_value(value, scale: float):
+    # Целые размеры остаются целыми, дробные радиусы масштабируются точно
+    if value is None:
+        return None
+    if isinstance(value, int):
+        return max(1, round(value * scale))
+    return value * scale
+
+
+def scale_operation(operation: tuple, scale: float) -> tuple:
+    """Операция с размерами в пикселях, пересчитанными для копии в масштабе scale"""
+    name, args, kwargs = operation
+    names = SCALED_PARAMETERS.get(name)
+    if scale == 1.0 or not names:
+        return name, list(args), dict(kwargs)
+    args = [_scale_value(value, scale) if i < len(names) else value for i, value in enumerate(args)]
+    kwargs = {key: _scale_value(value, scale) if key in names else value for key, value in kwargs.items()}
+    return name, args, kwargs
+
+
+class Snapshot:
+    """Сжатое (zlib) состояние изображения"""
+
+    def __init__(self, image: Image.Image):
+        self.mode = image.mode
+        self.size = image.size
+        self.palette = image.getpalette() if image.mode == 'P' else None
+        self.data = zlib.compress(image.tobytes(), 1)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data)
+
+    def restore(self) -> Image.Image:
+        image = Image.frombytes(self.mode, self.size, zlib.decompress(self.data))
+        if self.palette is not None:
+            image.putpalette(self.palette)
+        return image
+
+
+class EditStep:
+    """Шаг правки: подпись и цепочка операций [(имя, args, kwargs), ...]"""
+
+    def __init__(self, label: str, operations: list):
+        self.label = label
+        self.operations = [(name, list(args), dict(kwargs)) for name, args, kwargs in operations]
+        self.snapshot = None
+
+
+class EditHistory:
+    """
+    Многоуровневая история отмены и повтора. Шаги хранятся как описания
+    операций; полные состояния хранятся сжатыми снимками через каждые
+    checkpoint_interval шагов. При превышении memory_limit старые снимки
+    вытесняются, а нужные состояния пересчитываются повтором операций
+    от ближайшего сохраненного снимка.
+    Если base - уменьшенная копия в масштабе scale, операции хранятся для
+    полного разрешения, а на копии выполняются с пересчитанными размерами
+    """
+
+    def __init__(self, processor, base: Image.Image, memory_limit: int = DEFAULT_MEMORY_LIMIT,
+                 checkpoint_interval: int = DEFAULT_CHECKPOINT_INTERVAL, scale: float = 1.0,
+                 full_size: Optional[tuple] = None):
+        self.processor = processor
+        self.scale = scale
+        self.full_size = full_size or base.size
+        self.memory_limit = memory_limit
+        self.checkpoint_interval = max(1, checkpoint_interval)
+        # Исходное состояние не вытесняется: от него повторяются все операции
+        self.base = Snapshot(base)
+        self.steps: List[EditStep] = []
+        self.index = 0
+        # Текущее состояние держится несжатым: его показывает интерфейс
+        self._current = base
+
+    @property
+    def current(self) -> Image.Image:
+        return self._current
+
+    @property
+    def current_step(self) -> Optional[EditStep]:
+        return self.steps[self.index - 1] if self.index else None
+
+    def can_undo(self) -> bool:
+        return self.index > 0
+
+    def can_redo(self) -> bool:
+        return self.index < len(self.steps)
+
+    @property
+    def memory_used(self) -> int:
+        return self.base.nbytes + sum(step.snapshot.nbytes for step in self.steps if step.snapshot)
+
+    def push(self, label: str, operations: list, image: Image.Image) -> None:
+        """Добавляет шаг с уже вычисленным результатом; ветка повтора отбрасывается"""
+        del self.steps[self.index:]
+        step = EditStep(label, operations)
+        self.steps.append(step)
+        self.index = len(self.steps)
+        if self.index % self.checkpoint_interval == 0:
+            step.snapshot = Snapshot(image)
+            self._evict()
+        self._current = image
+
+    def replace_last(self, label: str, operations: list, image: Image.Image) -> None:
+        """Заменяет текущий шаг (например, повторное движение слайдера)"""
+        if not self.index:
+            raise ValueError("Нет шага для замены")
+        self.index -= 1
+        self.push(label, operations, image)
+
+    def undo(self) -> Image.Image:
+        if not self.can_undo():
+            raise ValueError("Нечего отменять")
+        self.seek(self.index - 1, self.image_at(self.index - 1))
+        return self._current
+
+    def redo(self) -> Image.Image:
+        if not self.can_redo():
+            raise ValueError("Нечего повторять")
+        self.seek(self.index + 1, self.image_at(self.index + 1))
+        return self._current
+
+    def seek(self, index: int, image: Image.Image) -> None:
+        """Переходит к состоянию после index шагов, уже вычисленному (см. replayer)"""
+        if not 0 <= index <= len(self.steps):
+            raise ValueError(f"Нет состояния {index} в истории правок")
+        self.index = index
+        self._current = image
+
+    def image_at(self, index: int) -> Image.Image:
+        """Состояние после index шагов: ближайший снимок и повтор операций после него"""
+        return self.replayer(index)()
+
+    def replayer(self, index: int) -> Callable[[], Image.Image]:
+        """
+        Функция, вычисляющая состояние после index шагов. Снимок и шаги
+        выбираются сразу, поэтому ее можно выполнить в фоновом потоке,
+        даже если история тем временем изменится
+        """
+        if not 0 <= index <= len(self.steps):
+            raise ValueError(f"Нет состояния {index} в истории правок")
+        start = index
+        while start > 0 and start != self.index and self.steps[start - 1].snapshot is None:
+            start -= 1
+        if start == self.index:
+            # Следующие состояния повторяются от текущего, оно уже вычислено
+            current = self._current
+            restore = lambda: current
+        else:
+            restore = self.steps[start - 1].snapshot.restore if start else self.base.restore
+        steps = self.steps[start:index]
+        return lambda: self._replay(restore(), steps)
+
+    def current_full_size(self) -> tuple:
+        """Размер текущего состояния в полном разрешении"""
+        size = self.full_size
+        for step in self.steps[:self.index]:
+            for name, args, kwargs in step.operations:
+                if name == 'resize_image':
+                    params = dict(zip(SCALED_PARAMETERS[name] + ('mode',), args), **kwargs)
+                    size, _ = target_size(size, params['width'], params['height'], params.get('mode', 'exact'))
+        return size
+
+    def render(self, image: Image.Image) -> Image.Image:
+        """Применяет шаги до текущего к изображению в полном разрешении"""
+        for step in self.steps[:self.index]:
+            for name, args, kwargs in step.operations:
+                image = self.processor.apply_operation(image, name, *args, **kwargs)
+        return image
+
+    def _replay(self, image: Image.Image, steps: List[EditStep]) -> Image.Image:
+        for step in steps:
+            for operation in step.operations:
+                name, args, kwargs = scale_operation(operation, self.scale)
+                image = self.processor.apply_operation(image, name, *args, **kwargs)
+        return image
+
+    def _evict(self):
+        # Вытесняются самые старые снимки; последний снимок остается всегда
+        snapshots = [step for step in self.steps if step.snapshot]
+        used = self.memory_used
+        for step in snapshots[:-1]:
+            if used <= self.memory_limit:
+                break
+            used -= step.snapshot.nbytes
+            step.snapshot = None
+            logger.debug(f"Снимок шага '{step.label}' вытеснен из истории правок")
@@ -0,0 +1,71 @@
+import logging
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional
+
+from PIL import Image
+
+from . import resampling
+from .image_processor import ImageProcessor, normalize_format
+
+logger = logging.getLogger(__name__)
+
+
+class ExportVariant:
+    """Один вариант экспорта: путь, формат, ограничение размера и параметры кодировщика"""
+
+    def __init__(self, path: str, format: Optional[str] = None, max_size: Optional[tuple] = None, **options):
+        self.path = path
+        self.format = normalize_format(format or os.path.splitext(path)[1])
+        self.max_size = tuple(max_size) if max_size else None
+        self.options = options
+
+
+class Exporter:
+    """
+    Асинхронный экспорт: кодирование и запись в пуле потоков. Кодировщики
+    Pillow отпускают GIL, поэтому несколько вариантов одного изображения
+    (размеры и форматы) кодируются параллельно, а вызывающий поток
+    (например, интерфейс) не ждет записи
+    """
+
+    def __init__(self, processor: Optional[ImageProcessor] = None, workers: Optional[int] = None):
+        self.processor = processor or ImageProcessor(history_file=None)
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="image-export")
+
+    def submit(self, image: Image.Image, path: str, format: Optional[str] = None,
+               max_size: Optional[tuple] = None, **options) -> Future:
+        """Ставит запись в очередь; Future возвращает путь к файлу"""
+        return self.export_variants(image, [ExportVariant(path, format, max_size, **options)])[0]
+
+    def export_variants(self, image: Image.Image, variants: List[ExportVariant]) -> List[Future]:
+        """
+        Записывает все варианты одного изображения параллельно. Уменьшенные
+        копии строятся одной задачей от общей пирамиды (resampling.resize_many)
+        """
+        # Ленивое декодирование не потокобезопасно: пиксели загружаются заранее
+        image.load()
+        sizes = sorted({variant.max_size for variant in variants if variant.max_size})
+        resized = self._pool.submit(self._resize, image, sizes) if sizes else None
+        return [self._pool.submit(self._export, image, resized, variant) for variant in variants]
+
+    def close(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @staticmethod
+    def _resize(image: Image.Image, sizes: list) -> dict:
+        return dict(zip(sizes, resampling.resize_many(image, sizes, mode='thumbnail')))
+
+    def _export(self, image: Image.Image, resized: Optional[Future], variant: ExportVariant) -> str:
+        # Задача уменьшения поставлена в очередь раньше, поэтому ожидание не блокирует пул
+        if variant.max_size:
+            image = resized.result()[variant.max_size]
+        self.processor.save_image(image, variant.path, variant.format, **variant.options)
+        return variant.path
@@ -0,0 +1,214 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HISTORY_FILE = "user_history.jsonl"
+
+_migrated = set()
+_migrate_lock = threading.Lock()
+
+
+def migrate_legacy_history(path: str = DEFAULT_HISTORY_FILE) -> bool:
+    """
+    Однократно переносит записи из старого журнала (JSON-массив в
+    user_history.json) в JSON Lines. Старый файл сохраняется как .json.bak.
+    Возвращает True, если перенос был выполнен
+    """
+    key = os.path.abspath(path)
+    with _migrate_lock:
+        if key in _migrated:
+            return False
+        _migrated.add(key)
+
+        root, ext = os.path.splitext(path)
+        legacy = root + ".json"
+        if ext != ".jsonl" or not os.path.exists(legacy) or os.path.exists(path):
+            return False
+
+        try:
+            with open(legacy, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            if not isinstance(entries, list):
+                raise ValueError("ожидался список записей")
+            temp_path = path + ".tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+            os.replace(temp_path, path)
+            os.replace(legacy, legacy + ".bak")
+        except Exception as e:
+            logger.error(f"Не удалось перенести историю из {legacy}: {e}")
+            return False
+
+        logger.info(f"История перенесена из {legacy} в {path} ({len(entries)} записей)")
+        return True
+
+
+class OperationHistory:
+    """
+    Журнал операций в формате JSON Lines. Записи копятся в очереди и
+    дописываются в конец файла фоновым потоком пачками; при превышении
+    max_bytes файл ротируется (history.jsonl.1, history.jsonl.2, ...)
+    """
+
+    def __init__(self, path: str = DEFAULT_HISTORY_FILE, flush_interval: float = 1.0,
+                 max_bytes: int = 5 * 1024 * 1024, backup_count: int = 3, batch_size: int = 256):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._file = None
+        self._last_flush = 0.0
+        self._closed = False
+
+    def record(self, operation: str, parameters: dict) -> None:
+        """Ставит запись в очередь; запись на диск выполняет фоновый поток"""
+        if self._closed:
+            return
+        self._ensure_thread()
+        self._queue.put({
+            "date": datetime.now().isoformat(),
+            "operation": operation,
+            "parameters": parameters
+        })
+
+    def flush(self, timeout: float = None) -> None:
+        """Дожидается записи на диск всех ранее поставленных в очередь записей"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        stop = False
+        while not stop:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._flush_file()
+                continue
+
+            entries, waiters = [], []
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    entries.append(item)
+                if stop or len(entries) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if entries:
+                self._write(entries)
+            if stop or waiters or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush_file()
+            for waiter in waiters:
+                waiter.set()
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, entries: list):
+        try:
+            if self._file is None:
+                migrate_legacy_history(self.path)
+                self._file = open(self.path, 'a', encoding='utf-8')
+            lines = [json.dumps(entry, ensure_ascii=False, default=str) for entry in entries]
+            self._file.write("\n".join(lines) + "\n")
+            if self.max_bytes and self._file.tell() >= self.max_bytes:
+                self._rotate()
+        except Exception as e:
+            logger.error(f"Ошибка при записи истории: {e}")
+
+    def _flush_file(self):
+        self._last_flush = time.monotonic()
+        if self._file is not None:
+            try:
+                self._file.flush()
+            except Exception as e:
+                logger.error(f"Ошибка при записи истории: {e}")
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        if self.backup_count <= 0:
+            os.remove(self.path)
+            return
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+
+_histories = {}
+_histories_lock = threading.Lock()
+
+
+def get_history(path: str = DEFAULT_HISTORY_FILE) -> OperationHistory:
+    """Возвращает общий журнал для файла, чтобы в него писал один поток"""
+    key = os.path.abspath(path)
+    with _histories_lock:
+        if key not in _histories:
+            _histories[key] = OperationHistory(path)
+        return _histories[key]
+
+
+def read_history(path: str = DEFAULT_HISTORY_FILE) -> Iterator[dict]:
+    """Лениво читает записи журнала, начиная с самых старых ротированных файлов"""
+    migrate_legacy_history(path)
+    backups = []
+    i = 1
+    while os.path.exists(f"{path}.{i}"):
+        backups.append(f"{path}.{i}")
+        i += 1
+
+    for file_path in list(reversed(backups)) + [path]:
+        if not os.path.exists(file_path):
+            continue
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # Недописанная строка при аварийном завершении
+                    logger.warning(f"Пропущена поврежденная запись истории в {file_path}")
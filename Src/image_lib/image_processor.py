@@ -1,64 +1,244 @@
+import inspect
 import logging
-import json
 import os
-from datetime import datetime
-from PIL import Image, ImageEnhance, ImageOps, ImageFilter
-import numpy as np
+from typing import TYPE_CHECKING, Iterator, Optional, Tuple
+from PIL import Image, ImageEnhance, ImageFilter
+
+from . import cache as result_cache, history, metrics, presets, resampling
+from .lazy import lazy_import
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Модули на numpy загружаются при первой операции, которой они нужны
+color_engine = lazy_import('.color_engine', __package__)
+filters = lazy_import('.filters', __package__)
+pipeline = lazy_import('.pipeline', __package__)
+stats = lazy_import('.stats', __package__)
 
 logger = logging.getLogger(__name__)
 
+# Сигнатуры операций по (классу, имени) для журнала попаданий в кэш
+_signatures = {}
+
+SUPPORTED_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.gif')
+
+# Сигнатуры поддерживаемых форматов: первые байты файла -> формат Pillow
+MAGIC_NUMBERS = (
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+    (b'BM', 'BMP'),
+    (b'II*\x00', 'TIFF'),
+    (b'MM\x00*', 'TIFF'),
+)
+
+SUPPORTED_FORMATS = tuple(dict.fromkeys(format for _, format in MAGIC_NUMBERS))
+
+FORMAT_ALIASES = {'JPG': 'JPEG', 'TIF': 'TIFF'}
+
+# Форматы без альфа-канала: перед сохранением изображение приводится к RGB
+RGB_ONLY_FORMATS = ('JPEG', 'BMP')
+
+# Параметры кодировщиков, которые принимает save_image
+ENCODER_OPTIONS = {
+    'JPEG': ('quality', 'subsampling', 'progressive', 'optimize'),
+    'PNG': ('compress_level', 'optimize'),
+    'WEBP': ('quality', 'lossless', 'method'),
+    'TIFF': ('compression',),
+    'GIF': ('optimize',),
+    'BMP': (),
+}
+
+_INVERT_LUT = list(range(255, -1, -1)) * 3
+
+# Статистика баланса белого для больших изображений считается по прореженной выборке
+WHITE_BALANCE_SAMPLE_PIXELS = 1 << 21
+
+def normalize_format(format: str) -> str:
+    """Имя формата Pillow по имени или расширению: 'jpg' и '.jpg' -> 'JPEG'"""
+    format = format.upper().lstrip('.')
+    return FORMAT_ALIASES.get(format, format)
+
+
+def sniff_format(header: bytes) -> Optional[str]:
+    """Определяет формат по первым байтам файла"""
+    for magic, format in MAGIC_NUMBERS:
+        if header.startswith(magic):
+            return format
+    return None
+
+
 class ImageProcessor:
-    def __init__(self):
-        self.history_file = "user_history.json"
-        self._init_history()
+    # Операции вида image -> image, доступные по имени (пакетная обработка и т.п.)
+    OPERATIONS = (
+        'adjust_brightness', 'adjust_contrast', 'adjust_saturation',
+        'apply_grayscale', 'apply_invert', 'apply_sepia',
+        'apply_color_matrix', 'apply_color_preset',
+        'apply_warm_tone', 'apply_cool_tone', 'apply_vintage', 'apply_preset',
+        'auto_contrast', 'white_balance', 'black_point',
+        'blue_tone', 'skin_tone_enhance', 'vibrance',
+        'apply_blur', 'apply_sharpen', 'apply_emboss', 'resize_image'
+    )
     
-    def _init_history(self):
-        if not os.path.exists(self.history_file):
-            with open(self.history_file, 'w', encoding='utf-8') as f:
-                json.dump([], f)
+    def __init__(self, history_file: Optional[str] = history.DEFAULT_HISTORY_FILE,
+                 cache: Optional[result_cache.ResultCache] = None, workers: Optional[int] = None,
+                 presets_dir: str = presets.DEFAULT_PRESETS_DIR):
+        # history_file=None отключает запись истории операций
+        self.history_file = history_file
+        # Пресеты из JSON/TOML в presets_dir для apply_preset
+        self.presets = presets.PresetLibrary(presets_dir)
+        # Кэш результатов используется операциями, вызванными через apply_operation
+        self.cache = cache
+        # workers > 1 включает обработку больших изображений полосами в пуле потоков
+        self.executor = None
+        if workers and workers > 1:
+            # parallel сам строится на ImageProcessor, поэтому импортируется здесь
+            from .parallel import ParallelExecutor
+            self.executor = ParallelExecutor(workers)
+        # Журнал не трогает диск до первой записи: файл создаст фоновый поток
+        self.history = history.get_history(history_file) if history_file else None
     
     def _log_operation(self, operation: str, parameters: dict):
-        try:
-            with open(self.history_file, 'r', encoding='utf-8') as f:
-                history = json.load(f)
-            
-            history.append({
-                "date": datetime.now().isoformat(),
-                "operation": operation,
-                "parameters": parameters
-            })
-            
-            with open(self.history_file, 'w', encoding='utf-8') as f:
-                json.dump(history, f, indent=2, ensure_ascii=False)
-                
-        except Exception as e:
-            logger.error(f"Ошибка при записи истории: {e}")
+        # Запись ставится в очередь, на диск ее дописывает фоновый поток
+        if self.history is not None:
+            self.history.record(operation, parameters)
+    
+    def read_history(self) -> Iterator[dict]:
+        """Лениво возвращает записи истории операций, начиная со старых"""
+        if self.history is None:
+            return iter(())
+        self.history.flush()
+        return history.read_history(self.history_file)
+    
+    def pipeline(self) -> 'pipeline.Pipeline':
+        """Создает ленивый конвейер операций над изображением"""
+        return pipeline.Pipeline(self)
+    
+    def apply_operation(self, image: Image.Image, name: str, *args, **kwargs) -> Image.Image:
+        """Применяет операцию из OPERATIONS по имени"""
+        if name not in self.OPERATIONS:
+            raise ValueError(f"Неизвестная операция: {name}")
+        # Результат в заранее выделенный буфер не кэшируется
+        if self.cache is None or 'out' in kwargs:
+            return self._execute(image, name, args, kwargs)
+
+        key_kwargs = kwargs
+        if name == 'apply_preset':
+            # Результат пресета зависит и от содержимого его файла
+            preset = self.presets.get(*args, **kwargs)
+            key_kwargs = dict(kwargs, preset_fingerprint=preset.fingerprint)
+        key = result_cache.operation_key(result_cache.image_digest(image), name, args, key_kwargs)
+        result = self.cache.get(key)
+        if result is not None:
+            self._log_operation(name, dict(self._operation_parameters(name, args, kwargs), cached=True))
+            return result
+        result = self._execute(image, name, args, kwargs)
+        if result is not image:
+            self.cache.put(key, result)
+        return result
+    
+    def _operation_parameters(self, name: str, args, kwargs) -> dict:
+        # Параметры операции по именам, как их передал вызывающий (для журнала)
+        key = (type(self), name)
+        signature = _signatures.get(key)
+        if signature is None:
+            signature = _signatures[key] = inspect.signature(getattr(self, name))
+        bound = signature.bind_partial(None, *args, **kwargs)
+        return {key: value for key, value in list(bound.arguments.items())[1:]}
+    
+    def _execute(self, image: Image.Image, name: str, args, kwargs) -> Image.Image:
+        operations = [(name, args, kwargs)]
+        if self.executor is None or 'out' in kwargs or not self.executor.supports(image, operations):
+            return getattr(self, name)(image, *args, **kwargs)
+        
+        with metrics.registry.measure(name, image.width * image.height):
+            result = self.executor.run(image, operations)
+        self._log_operation(name, {"workers": self.executor.workers})
+        return result
+    
+    def _open_image(self, f) -> Image.Image:
+        # Формат определяется по сигнатуре, и Pillow разбирает только его
+        format = sniff_format(f.read(16))
+        if format is None:
+            raise ValueError("Содержимое файла не соответствует поддерживаемому формату")
+        f.seek(0)
+        return Image.open(f, formats=[format])
     
     def validate_image(self, image_path: str) -> bool:
-        if not os.path.exists(image_path):
-            logger.error(f"Файл не существует: {image_path}")
-            return False
-        
-        supported_formats = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.gif')
-        if not image_path.lower().endswith(supported_formats):
+        if not image_path.lower().endswith(SUPPORTED_EXTENSIONS):
             logger.error(f"Неподдерживаемый формат файла: {image_path}")
             return False
         
         try:
-            with Image.open(image_path) as img:
-                img.verify()
+            with open(image_path, 'rb') as f:
+                self._open_image(f).verify()
             return True
+        except FileNotFoundError:
+            logger.error(f"Файл не существует: {image_path}")
+            return False
         except Exception as e:
             logger.error(f"Ошибка при проверке изображения: {e}")
             return False
     
-    def load_image(self, image_path: str) -> Image.Image:
-        if not self.validate_image(image_path):
+    @metrics.instrument
+    def load_image(self, image_path: str, trusted: bool = False,
+                   target_size: Optional[Tuple[int, int]] = None) -> Image.Image:
+        """
+        Открывает файл один раз: проверяет сигнатуру и сразу декодирует
+        изображение, ошибки декодирования считаются повреждением файла.
+        В режиме trusted проверка пропускается, а декодирование
+        откладывается до первого обращения к пикселям.
+        С target_size изображение декодируется в уменьшенном виде, но не
+        меньше target_size; исходный размер сохраняется в info["full_size"]
+        """
+        if not image_path.lower().endswith(SUPPORTED_EXTENSIONS):
+            logger.error(f"Неподдерживаемый формат файла: {image_path}")
+            raise ValueError("Некорректный файл изображения")
+        
+        try:
+            if trusted:
+                image = Image.open(image_path, formats=SUPPORTED_FORMATS)
+                if target_size:
+                    image = self._reduce_on_load(image, target_size)
+            else:
+                with open(image_path, 'rb') as f:
+                    image = self._open_image(f)
+                    if target_size:
+                        image = self._reduce_on_load(image, target_size)
+                    image.load()
+        except FileNotFoundError:
+            logger.error(f"Файл не существует: {image_path}")
+            raise ValueError("Некорректный файл изображения")
+        except Exception as e:
+            logger.error(f"Ошибка при проверке изображения: {e}")
             raise ValueError("Некорректный файл изображения")
         
         self._log_operation("load_image", {"file_path": image_path})
         logger.info(f"Загружено изображение: {image_path}")
-        return Image.open(image_path)
+        return image
+    
+    def _reduce_on_load(self, image: Image.Image, target_size: Tuple[int, int]) -> Image.Image:
+        target_width, target_height = target_size
+        if target_width <= 0 or target_height <= 0:
+            raise ValueError("Ширина и высота должны быть положительными числами")
+        full_size = image.size
+        format = image.format
+        
+        if format == 'JPEG':
+            # Масштабирование в DCT: декодер сразу выдает изображение в 2, 4 или 8 раз меньше
+            image.draft(None, target_size)
+        
+        # Остальные форматы (и JPEG сверх 1/8) уменьшаются целочисленным усреднением
+        factor = min(image.width // target_width, image.height // target_height)
+        if factor >= 2 and image.mode in resampling.REDUCIBLE_MODES:
+            image.load()
+            image = image.reduce(factor)
+            image.format = format
+        
+        image.info["full_size"] = full_size
+        return image
     
     def get_image_info(self, image: Image.Image) -> dict:
         info = {
@@ -71,16 +251,54 @@ class ImageProcessor:
         logger.info(f"Получена информация об изображении: {info}")
         return info
     
-    def save_image(self, image: Image.Image, file_path: str, format: str = None) -> None:
-        if format is None:
-            format = os.path.splitext(file_path)[1][1:].upper()
+    @metrics.instrument
+    def create_preview(self, image: Image.Image, max_width: int, max_height: int) -> Image.Image:
+        """Уменьшенная копия изображения для живого предпросмотра"""
+        if max_width <= 0 or max_height <= 0:
+            raise ValueError("Ширина и высота должны быть положительными числами")
         
-        image.save(file_path, format=format)
+        preview = image.convert('RGB') if image.mode not in ('RGB', 'RGBA') else image.copy()
+        preview.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
         
-        self._log_operation("save_image", {"file_path": file_path, "format": format})
+        logger.info(f"Создан предпросмотр: {preview.width}x{preview.height}")
+        return preview
+    
+    @metrics.instrument
+    def save_image(self, image: Image.Image, file_path: str, format: str = None, **options) -> None:
+        """
+        Сохраняет изображение; формат по умолчанию берется из расширения.
+        options - параметры кодировщика из ENCODER_OPTIONS, например
+        quality и progressive для JPEG или compress_level для PNG
+        """
+        format = normalize_format(format or os.path.splitext(file_path)[1])
+        if not format:
+            raise ValueError(f"Не удалось определить формат файла: {file_path}")
+        unknown = set(options) - set(ENCODER_OPTIONS.get(format, ()))
+        if unknown:
+            raise ValueError(f"Неизвестные параметры для формата {format}: {', '.join(sorted(unknown))}")
+        if format in RGB_ONLY_FORMATS and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        
+        # Запись во временный файл рядом и переименование: при ошибке или
+        # одновременном экспорте на месте файла никогда не остается недописанный
+        directory, name = os.path.split(os.path.abspath(file_path))
+        temp_path = os.path.join(directory, f".{name}.{os.urandom(6).hex()}.tmp")
+        # Права 0666 урезаются umask процесса, как у обычного open()
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                image.save(f, format=format, **options)
+            os.replace(temp_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        
+        self._log_operation("save_image", {"file_path": file_path, "format": format, **options})
         logger.info(f"Изображение сохранено: {file_path} в формате {format}")
     
     # ===== ОСНОВНЫЕ КОРРЕКЦИИ =====
+    @metrics.instrument
     def adjust_brightness(self, image: Image.Image, factor: float) -> Image.Image:
         if factor < 0:
             raise ValueError("Коэффициент яркости не может быть отрицательным")
@@ -92,6 +310,7 @@ class ImageProcessor:
         logger.info(f"Изменена яркость: коэффициент {factor}")
         return result
     
+    @metrics.instrument
     def adjust_contrast(self, image: Image.Image, factor: float) -> Image.Image:
         if factor < 0:
             raise ValueError("Коэффициент контраста не может быть отрицательным")
@@ -103,6 +322,7 @@ class ImageProcessor:
         logger.info(f"Изменен контраст: коэффициент {factor}")
         return result
     
+    @metrics.instrument
     def adjust_saturation(self, image: Image.Image, factor: float) -> Image.Image:
         if factor < 0:
             raise ValueError("Коэффициент насыщенности не может быть отрицательным")
@@ -115,175 +335,147 @@ class ImageProcessor:
         return result
     
     # ===== ОСНОВНЫЕ ФИЛЬТРЫ =====
+    @metrics.instrument
     def apply_grayscale(self, image: Image.Image) -> Image.Image:
         result = image.convert('L').convert('RGB')
         self._log_operation("apply_grayscale", {})
         logger.info("Применен Ч/Б фильтр")
         return result
     
+    @metrics.instrument
     def apply_invert(self, image: Image.Image) -> Image.Image:
-        result = ImageOps.invert(image.convert('RGB'))
+        rgb = image if image.mode == 'RGB' else image.convert('RGB')
+        result = stats.point(rgb, _INVERT_LUT)
         self._log_operation("apply_invert", {})
         logger.info("Применена инверсия цветов")
         return result
     
-    def apply_sepia(self, image: Image.Image) -> Image.Image:
-        # Простая реализация сепии
-        result = image.convert('RGB')
-        width, height = result.size
-        pixels = result.load()
-        
-        for py in range(height):
-            for px in range(width):
-                r, g, b = result.getpixel((px, py))
-                
-                tr = int(0.393 * r + 0.769 * g + 0.189 * b)
-                tg = int(0.349 * r + 0.686 * g + 0.168 * b)
-                tb = int(0.272 * r + 0.534 * g + 0.131 * b)
-                
-                pixels[px, py] = (
-                    min(255, tr),
-                    min(255, tg),
-                    min(255, tb)
-                )
+    @metrics.instrument
+    def apply_sepia(self, image: Image.Image, out: 'np.ndarray' = None) -> Image.Image:
+        # Сепия - матричное преобразование каналов
+        result = color_engine.COLOR_PRESETS['sepia'].apply(image, out=out)
         
         self._log_operation("apply_sepia", {})
         logger.info("Применен сепия фильтр")
         return result
     
     # ===== ЦВЕТОВЫЕ ПРЕСЕТЫ =====
-    def apply_warm_tone(self, image: Image.Image) -> Image.Image:
+    @metrics.instrument
+    def apply_color_matrix(self, image: Image.Image, matrix, offset=(0.0, 0.0, 0.0),
+                           out: 'np.ndarray' = None) -> Image.Image:
+        result = color_engine.apply_color_matrix(image, matrix, offset, out=out)
+        
+        self._log_operation("apply_color_matrix", {
+            "matrix": [list(row) for row in matrix],
+            "offset": list(offset)
+        })
+        logger.info("Применена матрица цвета")
+        return result
+    
+    @metrics.instrument
+    def apply_color_preset(self, image: Image.Image, name: str, out: 'np.ndarray' = None) -> Image.Image:
+        result = color_engine.get_preset(name).apply(image, out=out)
+        
+        self._log_operation("apply_color_preset", {"preset": name})
+        logger.info(f"Применен цветовой пресет: {name}")
+        return result
+    
+    @metrics.instrument
+    def apply_warm_tone(self, image: Image.Image, out: 'np.ndarray' = None) -> Image.Image:
         # Теплые тона - увеличиваем красный и желтый
         result = image.convert('RGB')
         enhancer = ImageEnhance.Color(result)
         result = enhancer.enhance(1.2)
         
         # Добавляем теплый оттенок
-        width, height = result.size
-        pixels = result.load()
-        
-        for py in range(height):
-            for px in range(width):
-                r, g, b = result.getpixel((px, py))
-                pixels[px, py] = (
-                    min(255, int(r * 1.1)),
-                    min(255, int(g * 1.05)),
-                    b
-                )
+        result = color_engine.COLOR_PRESETS['warm_tone'].apply(result, out=out)
         
         self._log_operation("apply_warm_tone", {})
         logger.info("Применены теплые тона")
         return result
     
-    def apply_cool_tone(self, image: Image.Image) -> Image.Image:
+    @metrics.instrument
+    def apply_cool_tone(self, image: Image.Image, out: 'np.ndarray' = None) -> Image.Image:
         # Холодные тона - увеличиваем синий и голубой
-        result = image.convert('RGB')
-        
-        width, height = result.size
-        pixels = result.load()
-        
-        for py in range(height):
-            for px in range(width):
-                r, g, b = result.getpixel((px, py))
-                pixels[px, py] = (
-                    r,
-                    min(255, int(g * 1.05)),
-                    min(255, int(b * 1.1))
-                )
+        result = color_engine.COLOR_PRESETS['cool_tone'].apply(image, out=out)
         
         self._log_operation("apply_cool_tone", {})
         logger.info("Применены холодные тона")
         return result
     
+    @metrics.instrument
     def apply_vintage(self, image: Image.Image) -> Image.Image:
         # Винтажный эффект - сепия + снижение насыщенности
-        result = self.apply_sepia(image)
-        enhancer = ImageEnhance.Color(result)
-        result = enhancer.enhance(0.8)
-        enhancer = ImageEnhance.Brightness(result)
-        result = enhancer.enhance(0.9)
+        result = pipeline.Pipeline().color_preset('sepia').saturation(0.8).brightness(0.9).execute(image)
         
         self._log_operation("apply_vintage", {})
         logger.info("Применен винтажный эффект")
         return result
     
+    @metrics.instrument
+    def apply_preset(self, image: Image.Image, name: str) -> Image.Image:
+        """Пресет из каталога presets_dir, скомпилированный в один проход (см. presets)"""
+        result = self.presets.get(name).apply(image)
+        
+        self._log_operation("apply_preset", {"preset": name})
+        logger.info(f"Применен пресет: {name}")
+        return result
+    
     # ===== СПЕЦИАЛЬНЫЕ ЭФФЕКТЫ =====
+    @metrics.instrument
     def auto_contrast(self, image: Image.Image) -> Image.Image:
-        result = ImageOps.autocontrast(image.convert('RGB'))
+        """Растягивает каналы на весь диапазон, как ImageOps.autocontrast, по кэшированным гистограммам"""
+        rgb = image if image.mode == 'RGB' else image.convert('RGB')
+        result = stats.point(rgb, stats.image_stats(rgb).autocontrast_lut())
         self._log_operation("auto_contrast", {})
         logger.info("Применен автоконтраст")
         return result
     
-    def white_balance(self, image: Image.Image) -> Image.Image:
-        # Простой баланс белого - выравнивание цветовых каналов
-        result = image.convert('RGB')
-        r, g, b = result.split()
-        
-        # Находим средние значения каналов
-        r_avg = np.mean(np.array(r))
-        g_avg = np.mean(np.array(g))
-        b_avg = np.mean(np.array(b))
-        
-        # Выравниваем каналы
-        avg = (r_avg + g_avg + b_avg) / 3
-        r = r.point(lambda x: x * (avg / r_avg))
-        g = g.point(lambda x: x * (avg / g_avg))
-        b = b.point(lambda x: x * (avg / b_avg))
-        
-        result = Image.merge('RGB', (r, g, b))
-        
-        self._log_operation("white_balance", {})
-        logger.info("Применен баланс белого")
+    @metrics.instrument
+    def white_balance(self, image: Image.Image, mode: str = 'gray_world', percentile: float = 99.0,
+                      sample_pixels: Optional[int] = WHITE_BALANCE_SAMPLE_PIXELS) -> Image.Image:
+        """
+        Баланс белого: статистика каналов собирается одной гистограммой,
+        коэффициенты применяются одной таблицей через point.
+        sample_pixels=None считает статистику по всем пикселям
+        """
+        result = image.convert('RGB') if image.mode != 'RGB' else image
+        gains = color_engine.white_balance_gains(stats.image_stats(result, sample_pixels), mode, percentile)
+        result = stats.point(result, color_engine.gain_lut(gains))
+        
+        self._log_operation("white_balance", {"mode": mode})
+        logger.info(f"Применен баланс белого ({mode})")
         return result
     
+    @metrics.instrument
     def black_point(self, image: Image.Image) -> Image.Image:
-        # Коррекция черной точки - увеличиваем контраст в тенях
-        result = image.convert('RGB')
-        result = ImageOps.autocontrast(result, cutoff=2)
+        # Коррекция черной точки - автоконтраст с отсечением 2% пикселей с краев
+        rgb = image if image.mode == 'RGB' else image.convert('RGB')
+        result = stats.point(rgb, stats.image_stats(rgb).autocontrast_lut(cutoff=2))
         
         self._log_operation("black_point", {})
         logger.info("Применена коррекция черной точки")
         return result
     
-    def blue_tone(self, image: Image.Image) -> Image.Image:
+    @metrics.instrument
+    def blue_tone(self, image: Image.Image, out: 'np.ndarray' = None) -> Image.Image:
         # Усиление синих тонов
-        result = image.convert('RGB')
-        width, height = result.size
-        pixels = result.load()
-        
-        for py in range(height):
-            for px in range(width):
-                r, g, b = result.getpixel((px, py))
-                pixels[px, py] = (
-                    int(r * 0.9),
-                    int(g * 0.95),
-                    min(255, int(b * 1.2))
-                )
+        result = color_engine.COLOR_PRESETS['blue_tone'].apply(image, out=out)
         
         self._log_operation("blue_tone", {})
         logger.info("Применен синий тон")
         return result
     
-    def skin_tone_enhance(self, image: Image.Image) -> Image.Image:
+    @metrics.instrument
+    def skin_tone_enhance(self, image: Image.Image, out: 'np.ndarray' = None) -> Image.Image:
         # Улучшение тона кожи - теплые оттенки
-        result = image.convert('RGB')
-        width, height = result.size
-        pixels = result.load()
-        
-        for py in range(height):
-            for px in range(width):
-                r, g, b = result.getpixel((px, py))
-                # Увеличиваем красный и уменьшаем синий для теплого тона кожи
-                pixels[px, py] = (
-                    min(255, int(r * 1.1)),
-                    min(255, int(g * 1.05)),
-                    int(b * 0.9)
-                )
+        result = color_engine.COLOR_PRESETS['skin_tone'].apply(image, out=out)
         
         self._log_operation("skin_tone_enhance", {})
         logger.info("Применено улучшение тона кожи")
         return result
     
+    @metrics.instrument
     def vibrance(self, image: Image.Image) -> Image.Image:
         # Вибрация - усиление насыщенности менее насыщенных цветов
         result = image.convert('RGB')
@@ -295,31 +487,53 @@ class ImageProcessor:
         return result
     
     # ===== ХУДОЖЕСТВЕННЫЕ ЭФФЕКТЫ =====
-    def apply_blur(self, image: Image.Image) -> Image.Image:
-        result = image.filter(ImageFilter.BLUR)
-        self._log_operation("apply_blur", {})
-        logger.info("Применено размытие")
+    @metrics.instrument
+    def apply_blur(self, image: Image.Image, radius: Optional[float] = None,
+                   method: str = 'gaussian') -> Image.Image:
+        """Размытие с радиусом в пикселях (gaussian или box); без радиуса - ядро 5x5"""
+        if radius is None:
+            result = image.filter(ImageFilter.BLUR)
+        else:
+            result = filters.blur(image, radius, method)
+        self._log_operation("apply_blur", {"radius": radius, "method": method})
+        logger.info(f"Применено размытие (радиус {radius})")
         return result
     
-    def apply_sharpen(self, image: Image.Image) -> Image.Image:
-        result = image.filter(ImageFilter.SHARPEN)
-        self._log_operation("apply_sharpen", {})
-        logger.info("Применена резкость")
+    @metrics.instrument
+    def apply_sharpen(self, image: Image.Image, radius: Optional[float] = None,
+                      percent: int = 150, threshold: int = 3) -> Image.Image:
+        """Нерезкое маскирование с радиусом в пикселях; без радиуса - ядро 3x3"""
+        if radius is None:
+            result = image.filter(ImageFilter.SHARPEN)
+        else:
+            result = filters.unsharp_mask(image, radius, percent, threshold)
+        self._log_operation("apply_sharpen", {"radius": radius, "percent": percent, "threshold": threshold})
+        logger.info(f"Применена резкость (радиус {radius})")
         return result
     
-    def apply_emboss(self, image: Image.Image) -> Image.Image:
+    @metrics.instrument
+    def apply_emboss(self, image: Image.Image, strength: float = 1.0) -> Image.Image:
+        """Тиснение; strength < 1 смешивает результат с исходным изображением"""
+        if not 0 <= strength <= 1:
+            raise ValueError("Сила тиснения должна быть от 0 до 1")
         result = image.filter(ImageFilter.EMBOSS)
-        self._log_operation("apply_emboss", {})
+        if strength != 1.0:
+            result = Image.blend(image, result, strength)
+        self._log_operation("apply_emboss", {"strength": strength})
         logger.info("Применено тиснение")
         return result
     
-    def resize_image(self, image: Image.Image, width: int, height: int) -> Image.Image:
-        if width <= 0 or height <= 0:
-            raise ValueError("Ширина и высота должны быть положительными числами")
-        
-        result = image.resize((width, height), Image.Resampling.LANCZOS)
-        
-        self._log_operation("resize_image", {"new_width": width, "new_height": height})
-        logger.info(f"Изменен размер: {width}x{height}")
+    @metrics.instrument
+    def resize_image(self, image: Image.Image, width: int, height: int, mode: str = 'exact',
+                     filter: str = 'lanczos', reducing_gap: Optional[float] = None) -> Image.Image:
+        """
+        Изменение размера: mode - exact, fit, fill или thumbnail (см. resampling),
+        reducing_gap включает быстрое предварительное уменьшение через reduce
+        """
+        result = resampling.resize(image, width, height, mode, filter, reducing_gap)
+        
+        self._log_operation("resize_image", {"new_width": width, "new_height": height, "mode": mode,
+                                             "filter": filter, "reducing_gap": reducing_gap})
+        logger.info(f"Изменен размер: {result.width}x{result.height}")
         return result
       
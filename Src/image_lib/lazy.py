@@ -0,0 +1,31 @@
+import importlib
+from typing import Optional
+
+
+class LazyModule:
+    """
+    Модуль, который импортируется при первом обращении к его атрибуту.
+    Так numpy и модули на нем не загружаются при импорте image_lib, а
+    только когда их действительно вызывают. Импорт выполняет
+    importlib.import_module, поэтому первое обращение из разных потоков безопасно
+    """
+
+    def __init__(self, name: str, package: Optional[str] = None):
+        self._name = name
+        self._package = package
+        self._module = None
+
+    def __getattr__(self, attr: str):
+        module = self._module
+        if module is None:
+            module = self._module = importlib.import_module(self._name, self._package)
+        return getattr(module, attr)
+
+    def __repr__(self) -> str:
+        state = "загружен" if self._module is not None else "не загружен"
+        return f"<LazyModule {self._name} ({state})>"
+
+
+def lazy_import(name: str, package: Optional[str] = None) -> LazyModule:
+    """lazy_import('numpy') или lazy_import('.stats', __package__)"""
+    return LazyModule(name, package)
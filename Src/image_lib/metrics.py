@@ -0,0 +1,253 @@
+import cProfile
+import functools
+import io
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from PIL import Image
+
+from .lazy import lazy_import
+
+# Нужны только в режимах профилирования, поэтому не замедляют импорт
+pstats = lazy_import('pstats')
+tracemalloc = lazy_import('tracemalloc')
+
+logger = logging.getLogger(__name__)
+
+# Режимы дополнительного сбора данных
+CAPTURE_OFF = 'off'
+CAPTURE_TRACEMALLOC = 'tracemalloc'
+CAPTURE_PROFILE = 'cprofile'
+
+
+class OperationStats:
+    """Накопленные замеры одной операции"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.errors = 0
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.max_wall_time = 0.0
+        self.pixels = 0
+        self.allocated_peak = None
+        self.last = None
+
+    def add(self, record: dict):
+        self.calls += 1
+        self.errors += record["error"]
+        self.wall_time += record["wall_time"]
+        self.cpu_time += record["cpu_time"]
+        self.max_wall_time = max(self.max_wall_time, record["wall_time"])
+        self.pixels += record["pixels"]
+        if record["allocated"] is not None:
+            self.allocated_peak = max(self.allocated_peak or 0, record["allocated"])
+        self.last = record
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "wall_time": self.wall_time,
+            "cpu_time": self.cpu_time,
+            "mean_wall_time": self.wall_time / self.calls if self.calls else 0.0,
+            "max_wall_time": self.max_wall_time,
+            "mp_per_s": self.pixels / 1e6 / self.wall_time if self.wall_time else None,
+            "allocated_peak": self.allocated_peak
+        }
+
+
+class MetricsRegistry:
+    """
+    Реестр замеров операций: время по часам, процессорное время потока,
+    пропускная способность в Мп/с и (в режиме tracemalloc) пик выделенной
+    памяти. В режиме cprofile внешние вызовы выполняются под профилировщиком
+    """
+
+    def __init__(self, capture: str = CAPTURE_OFF):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {}
+        self._last = None
+        self._profiler = None
+        self._profiler_lock = threading.Lock()
+        self.capture = CAPTURE_OFF
+        self.set_capture(capture)
+
+    # ===== НАСТРОЙКА =====
+    def set_capture(self, capture: str) -> None:
+        if capture not in (CAPTURE_OFF, CAPTURE_TRACEMALLOC, CAPTURE_PROFILE):
+            raise ValueError(f"Неизвестный режим сбора: {capture}")
+        if capture == CAPTURE_TRACEMALLOC and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif self.capture == CAPTURE_TRACEMALLOC and capture != CAPTURE_TRACEMALLOC:
+            tracemalloc.stop()
+        if capture == CAPTURE_PROFILE and self._profiler is None:
+            self._profiler = cProfile.Profile()
+        self.capture = capture
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+            self._last = None
+        with self._profiler_lock:
+            if self._profiler is not None:
+                self._profiler = cProfile.Profile()
+
+    # ===== ЗАМЕРЫ =====
+    @contextmanager
+    def measure(self, name: str, pixels: int = 0):
+        """Замеряет блок кода; вложенные замеры учитываются отдельно"""
+        if getattr(self._local, 'suspended', False):
+            yield {"operation": name, "pixels": pixels, "error": False}
+            return
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+        outermost = depth == 0
+
+        profiler = None
+        if outermost and self.capture == CAPTURE_PROFILE and self._profiler_lock.acquire(blocking=False):
+            profiler = self._profiler
+        traced_start = None
+        if outermost and self.capture == CAPTURE_TRACEMALLOC and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            traced_start = tracemalloc.get_traced_memory()[0]
+
+        record = {"operation": name, "pixels": pixels, "error": False}
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield record
+        except BaseException:
+            record["error"] = True
+            raise
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self._profiler_lock.release()
+            record["wall_time"] = time.perf_counter() - wall_start
+            record["cpu_time"] = time.thread_time() - cpu_start
+            record["allocated"] = None
+            if traced_start is not None:
+                record["allocated"] = tracemalloc.get_traced_memory()[1] - traced_start
+            self._local.depth = depth
+            self._record(record)
+            collector = getattr(self._local, 'collector', None)
+            if outermost and collector is not None:
+                collector.append(record)
+
+    @contextmanager
+    def collect(self):
+        """Собирает внешние (не вложенные) замеры, выполненные в этом потоке внутри блока"""
+        records = []
+        previous = getattr(self._local, 'collector', None)
+        self._local.collector = records
+        try:
+            yield records
+        finally:
+            self._local.collector = previous
+
+    @contextmanager
+    def suspended(self):
+        """Отключает замеры в этом потоке (части операции, замеренной целиком в другом потоке)"""
+        previous = getattr(self._local, 'suspended', False)
+        self._local.suspended = True
+        try:
+            yield
+        finally:
+            self._local.suspended = previous
+
+    def _record(self, record: dict):
+        wall = record["wall_time"]
+        record["mp_per_s"] = record["pixels"] / 1e6 / wall if wall and record["pixels"] else None
+        with self._lock:
+            stats = self._stats.get(record["operation"])
+            if stats is None:
+                stats = self._stats[record["operation"]] = OperationStats(record["operation"])
+            stats.add(record)
+            self._last = record
+        logger.debug(f"Замер {format_record(record)}")
+
+    # ===== ВЫГРУЗКА =====
+    def last(self) -> Optional[dict]:
+        """Последний завершенный замер"""
+        return self._last
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {name: stats.to_dict() for name, stats in self._stats.items()}
+
+    def dump(self, path: str) -> None:
+        """Сохраняет накопленные замеры в JSON"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+
+    def format_summary(self) -> str:
+        lines = []
+        for name, stats in sorted(self.snapshot().items(), key=lambda item: -item[1]["wall_time"]):
+            throughput = f"{stats['mp_per_s']:.1f} Мп/с" if stats["mp_per_s"] else "-"
+            lines.append(f"{name}: {stats['calls']} выз., {stats['wall_time'] * 1000:.1f} мс, "
+                         f"CPU {stats['cpu_time'] * 1000:.1f} мс, {throughput}")
+        return "\n".join(lines)
+
+    def profile_stats(self, sort: str = 'cumulative', limit: int = 30) -> str:
+        """Текстовый отчет cProfile по вызовам, собранным в режиме cprofile"""
+        if self._profiler is None:
+            return ""
+        stream = io.StringIO()
+        with self._profiler_lock:
+            try:
+                stats = pstats.Stats(self._profiler, stream=stream)
+            except TypeError:
+                # Профилировщик еще не собрал ни одного вызова
+                return ""
+            stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def dump_profile(self, path: str) -> None:
+        """Сохраняет данные cProfile для pstats или snakeviz"""
+        if self._profiler is None:
+            raise ValueError("Профилирование не включено")
+        with self._profiler_lock:
+            self._profiler.dump_stats(path)
+
+
+def format_record(record: dict) -> str:
+    text = (f"{record['operation']}: {record['wall_time'] * 1000:.1f} мс, "
+            f"CPU {record['cpu_time'] * 1000:.1f} мс")
+    if record["mp_per_s"]:
+        text += f", {record['mp_per_s']:.1f} Мп/с"
+    if record["allocated"] is not None:
+        text += f", {record['allocated'] / 2 ** 20:.1f} МБ"
+    return text
+
+
+# Общий реестр, в который пишут методы ImageProcessor
+registry = MetricsRegistry()
+
+
+def _image_pixels(args, result) -> int:
+    for value in args:
+        if isinstance(value, Image.Image):
+            return value.width * value.height
+    if isinstance(result, Image.Image):
+        return result.width * result.height
+    return 0
+
+
+def instrument(func):
+    """Декоратор метода: замер каждого вызова в общем реестре"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with registry.measure(func.__name__) as record:
+            result = func(*args, **kwargs)
+            record["pixels"] = _image_pixels(args[1:], result)
+        return result
+    return wrapper
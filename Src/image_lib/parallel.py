@@ -0,0 +1,103 @@
+import logging
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+from . import metrics
+from .image_processor import ImageProcessor
+from .tiling import (KERNEL_OPERATIONS, POINTWISE_OPERATIONS, STATISTICS_OPERATIONS,
+                     apply_operations, contrast_point, operations_halo)
+
+logger = logging.getLogger(__name__)
+
+# Изображения меньше этого размера обрабатываются последовательно:
+# накладные расходы на полосы больше выигрыша
+DEFAULT_MIN_PIXELS = 1 << 20
+
+# Полос больше, чем потоков, чтобы потоки равномерно догружались
+_BANDS_PER_WORKER = 2
+
+_PARALLEL_MODES = ('RGB', 'RGBA', 'L')
+
+
+class ParallelExecutor:
+    """
+    Параллельная обработка одного изображения полосами строк в пуле потоков.
+    Pillow и numpy отпускают GIL на время работы с пикселями, поэтому полосы
+    обрабатываются на разных ядрах. Фильтры с ядром получают перекрытие
+    соседних строк, контраст - среднюю яркость всего изображения, поэтому
+    результат побитово совпадает с последовательной обработкой
+    """
+
+    def __init__(self, workers: Optional[int] = None, min_pixels: int = DEFAULT_MIN_PIXELS):
+        self.workers = workers or os.cpu_count() or 1
+        self.min_pixels = min_pixels
+        # Полосы обрабатываются без записи в историю
+        self._band_processor = ImageProcessor(history_file=None)
+        self._pool = None
+
+    def supports(self, image: Image.Image, operations: list) -> bool:
+        """Можно ли выполнить цепочку операций полосами"""
+        if self.workers < 2 or image.mode not in _PARALLEL_MODES:
+            return False
+        if image.width * image.height < self.min_pixels:
+            return False
+        return all(name in POINTWISE_OPERATIONS or name in KERNEL_OPERATIONS
+                   or name in STATISTICS_OPERATIONS for name, _, _ in operations)
+
+    def run(self, image: Image.Image, operations: list) -> Image.Image:
+        """
+        Применяет цепочку [(имя, args, kwargs), ...]; каждая полоса проходит
+        всю цепочку целиком. Неподдерживаемые цепочки выполняются последовательно
+        """
+        operations = [(name, list(args), dict(kwargs)) for name, args, kwargs in operations]
+        if not self.supports(image, operations):
+            return apply_operations(self._band_processor, image, operations)
+        # Ленивое декодирование не потокобезопасно: пиксели загружаются до раздачи полос
+        image.load()
+
+        for i, (name, args, kwargs) in enumerate(operations):
+            if name in STATISTICS_OPERATIONS:
+                histograms = self._map_bands(image, operations[:i],
+                                             lambda band: np.asarray(band.convert('L').histogram(), dtype=np.int64))
+                operations[i] = contrast_point(args, kwargs, sum(histograms).tolist())
+
+        bands = self._map_bands(image, operations, lambda band: band)
+        result = Image.new(bands[0].mode, (bands[0].width, image.height))
+        top = 0
+        for band in bands:
+            result.paste(band, (0, top))
+            top += band.height
+        return result
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _map_bands(self, image: Image.Image, operations: list, reduce) -> list:
+        halo = operations_halo(operations)
+        rows = max(1, math.ceil(image.height / (self.workers * _BANDS_PER_WORKER)))
+
+        def process(top):
+            # Время операции замеряется целиком в вызывающем потоке
+            with metrics.registry.suspended():
+                return process_band(top)
+
+        def process_band(top):
+            bottom = min(image.height, top + rows)
+            read_top = max(0, top - halo)
+            read_bottom = min(image.height, bottom + halo)
+            band = image.crop((0, read_top, image.width, read_bottom))
+            band = apply_operations(self._band_processor, band, operations)
+            if read_top != top or read_bottom != bottom:
+                band = band.crop((0, top - read_top, band.width, bottom - read_top))
+            return reduce(band)
+
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="image-band")
+        return list(self._pool.map(process, range(0, image.height, rows)))
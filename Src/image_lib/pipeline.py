@@ -0,0 +1,222 @@
+import logging
+import numpy as np
+from PIL import Image
+
+from . import color_engine, stats
+
+logger = logging.getLogger(__name__)
+
+# Сколько пикселей обрабатывается за один проход конвейера. Полоса такого
+# размера помещается в кэш процессора, поэтому все шаги проходят по ней подряд
+PIPELINE_BAND_PIXELS = 1 << 18
+
+
+class Pipeline:
+    """
+    Ленивый конвейер обработки. Методы только записывают шаги, а execute()
+    объединяет соседние поканальные шаги в одну таблицу и выполняет все
+    поточечные шаги полосами за один проход, без промежуточных изображений.
+    Для RGB и RGBA результат совпадает с последовательным вызовом методов
+    ImageProcessor, в том числе по режиму: яркость, контраст и насыщенность
+    сохраняют альфа-канал, как ImageEnhance, а Ч/Б, инверсия и цветовые
+    преобразования возвращают RGB
+    """
+
+    def __init__(self, processor=None):
+        self.processor = processor
+        self.steps = []
+        self._ops = []
+        # Стадии со склеенными таблицами; строятся при первом execute()
+        # и переиспользуются, пока не добавлен новый шаг
+        self._stages = None
+
+    # ===== ЗАПИСЬ ШАГОВ =====
+    def brightness(self, factor: float) -> 'Pipeline':
+        if factor < 0:
+            raise ValueError("Коэффициент яркости не может быть отрицательным")
+        return self._add("adjust_brightness", {"brightness_factor": factor},
+                         'lut', color_engine.brightness_luts(factor), keeps_alpha=True)
+
+    def contrast(self, factor: float) -> 'Pipeline':
+        if factor < 0:
+            raise ValueError("Коэффициент контраста не может быть отрицательным")
+        return self._add("adjust_contrast", {"contrast_factor": factor}, 'contrast', factor, keeps_alpha=True)
+
+    def saturation(self, factor: float) -> 'Pipeline':
+        if factor < 0:
+            raise ValueError("Коэффициент насыщенности не может быть отрицательным")
+        return self._add("adjust_saturation", {"saturation_factor": factor}, 'saturation', factor,
+                         keeps_alpha=True)
+
+    def color_preset(self, name: str) -> 'Pipeline':
+        return self._add_transform("apply_color_preset", {"preset": name}, color_engine.get_preset(name))
+
+    def channel_scales(self, scales) -> 'Pipeline':
+        if len(scales) != 3 or any(s < 0 for s in scales):
+            raise ValueError("Нужны три неотрицательных коэффициента каналов")
+        return self._add_transform("channel_scales", {"scales": list(scales)},
+                                   color_engine.ColorTransform.from_scales(scales))
+
+    def color_matrix(self, matrix, offset=(0.0, 0.0, 0.0)) -> 'Pipeline':
+        transform = color_engine.ColorTransform(matrix, offset)
+        return self._add_transform("apply_color_matrix", {
+            "matrix": [list(row) for row in matrix],
+            "offset": list(offset)
+        }, transform)
+
+    def grayscale(self) -> 'Pipeline':
+        return self._add("apply_grayscale", {}, 'grayscale', None)
+
+    def invert(self) -> 'Pipeline':
+        lut = np.arange(255, -1, -1, dtype=np.uint8)
+        return self._add("apply_invert", {}, 'lut', np.stack([lut, lut, lut]))
+
+    def resize(self, width: int, height: int,
+               resample=Image.Resampling.LANCZOS, reducing_gap=None) -> 'Pipeline':
+        if width <= 0 or height <= 0:
+            raise ValueError("Ширина и высота должны быть положительными числами")
+        return self._add("resize_image", {"new_width": width, "new_height": height, "reducing_gap": reducing_gap},
+                         'resize', ((width, height), resample, reducing_gap), keeps_alpha=True)
+
+    def _add(self, operation: str, parameters: dict, kind: str, arg, keeps_alpha: bool = False) -> 'Pipeline':
+        self.steps.append({"operation": operation, "parameters": parameters})
+        self._ops.append((kind, arg))
+        if not keeps_alpha:
+            # Как соответствующий метод ImageProcessor, шаг возвращает RGB
+            self._ops.append(('flatten', None))
+        self._stages = None
+        return self
+
+    def _add_transform(self, operation: str, parameters: dict, transform) -> 'Pipeline':
+        if transform.luts is not None:
+            return self._add(operation, parameters, 'lut', transform.luts)
+        return self._add(operation, parameters, 'matrix', transform)
+
+    # ===== ИСПОЛНЕНИЕ =====
+    def execute(self, image: Image.Image) -> Image.Image:
+        mode = 'RGBA' if _has_alpha(image) else 'RGB'
+        result = image.convert(mode) if image.mode != mode else image
+
+        if self._stages is None:
+            self._stages = self._build_stages()
+        for kind, arg, flatten in self._stages:
+            if kind == 'resize':
+                size, resample, reducing_gap = arg
+                result = result.resize(size, resample, reducing_gap=reducing_gap)
+            elif result.mode == 'RGBA':
+                # Поточечные шаги меняют только цвет; альфа-канал возвращается,
+                # если ни один шаг стадии его не отбрасывает
+                rgb = self._run_pointwise(result.convert('RGB'), *arg)
+                result = rgb if flatten else Image.merge('RGBA', (*rgb.split(), result.getchannel('A')))
+            else:
+                result = self._run_pointwise(result, *arg)
+
+        if result is image:
+            result = image.copy()
+
+        if self.processor is not None:
+            self.processor._log_operation("pipeline", {"steps": self.steps})
+        logger.info(f"Выполнен конвейер из {len(self.steps)} шагов")
+        return result
+
+    def _build_stages(self) -> list:
+        """
+        Делит шаги на стадии между изменениями размера. Поточечные стадии без
+        контраста компилируются сразу: таблицы не зависят от изображения
+        """
+        stages, stage, flatten = [], [], False
+        for kind, arg in self._ops + [('end', None)]:
+            if kind == 'flatten':
+                flatten = True
+                continue
+            if kind not in ('resize', 'end'):
+                stage.append((kind, arg))
+                continue
+            if stage:
+                has_contrast = any(k == 'contrast' for k, _ in stage)
+                stages.append(('points', (stage, None if has_contrast else _compile(stage)), flatten))
+                stage, flatten = [], False
+            if kind == 'resize':
+                stages.append((kind, arg, False))
+        return stages
+
+    def _run_pointwise(self, image: Image.Image, ops: list, compiled: list = None) -> Image.Image:
+        if compiled is None:
+            ops = list(ops)
+            # Контраст зависит от средней яркости промежуточного результата:
+            # она считается потоково, без сохранения промежуточного изображения
+            for i, (kind, arg) in enumerate(ops):
+                if kind == 'contrast':
+                    mean = self._mean_luminance(image, _compile(ops[:i]))
+                    ops[i] = ('lut', color_engine.contrast_luts(mean, arg))
+            compiled = _compile(ops)
+
+        ops = compiled
+        if not ops:
+            return image
+        if len(ops) == 1 and ops[0][0] == 'lut':
+            # Одна таблица: гистограммы исходного изображения переносятся на результат
+            return stats.point(image, ops[0][1])
+
+        result = Image.new('RGB', image.size)
+        for top, band in _iter_bands(image):
+            result.paste(_apply_ops(band, ops), (0, top))
+        return result
+
+    def _mean_luminance(self, image: Image.Image, ops: list) -> int:
+        histogram = [0] * 256
+        for _, band in _iter_bands(image):
+            band_histogram = _apply_ops(band, ops).convert('L').histogram()
+            histogram = [a + b for a, b in zip(histogram, band_histogram)]
+        return color_engine.mean_luminance(histogram)
+
+
+def _compile(ops: list) -> list:
+    """
+    Склеивает подряд идущие табличные шаги в одну таблицу и готовит
+    таблицы для Image.point (768 значений, по 256 на канал)
+    """
+    fused = []
+    for kind, arg in ops:
+        if kind == 'lut' and fused and fused[-1][0] == 'lut':
+            previous = fused[-1][1]
+            fused[-1] = ('lut', np.stack([arg[c][previous[c]] for c in range(3)]))
+        else:
+            fused.append((kind, arg))
+
+    compiled = []
+    identity = np.arange(256, dtype=np.uint8)
+    for kind, arg in fused:
+        if kind == 'lut':
+            if all(np.array_equal(lut, identity) for lut in arg):
+                continue
+            arg = arg.reshape(-1).tolist()
+        compiled.append((kind, arg))
+    return compiled
+
+
+def _has_alpha(image: Image.Image) -> bool:
+    return 'A' in image.getbands() or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def _iter_bands(image: Image.Image):
+    width, height = image.size
+    rows = max(1, PIPELINE_BAND_PIXELS // max(1, width))
+    for top in range(0, height, rows):
+        yield top, image.crop((0, top, width, min(height, top + rows)))
+
+
+def _apply_ops(band: Image.Image, ops: list) -> Image.Image:
+    """Выполняет поточечные шаги над полосой теми же ядрами Pillow, что и ImageProcessor"""
+    for kind, arg in ops:
+        if kind == 'lut':
+            band = band.point(arg)
+        elif kind == 'matrix':
+            band = Image.fromarray(arg.apply_array(np.asarray(band)))
+        elif kind == 'saturation':
+            band = Image.blend(band.convert('L').convert('RGB'), band, arg)
+        elif kind == 'grayscale':
+            band = band.convert('L').convert('RGB')
+        else:
+            raise ValueError(f"Неизвестный шаг конвейера: {kind}")
+    return band
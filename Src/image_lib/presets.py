@@ -0,0 +1,141 @@
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import threading
+from typing import List, Optional
+
+from PIL import Image
+
+from .lazy import lazy_import
+
+# Pipeline тянет numpy: модуль загружается при первой компиляции пресета
+pipeline = lazy_import('.pipeline', __package__)
+
+# Python < 3.11: доступны только пресеты в JSON
+tomllib = lazy_import('tomllib') if importlib.util.find_spec('tomllib') else None
+
+logger = logging.getLogger(__name__)
+
+# Каталог пресетов; main.py создает его рядом с приложением
+DEFAULT_PRESETS_DIR = 'configs'
+
+PRESET_EXTENSIONS = ('.json', '.toml')
+
+# Шаги пресета: метод Pipeline -> (обязательные параметры, необязательные)
+STEP_PARAMETERS = {
+    'brightness': (('factor',), ()),
+    'contrast': (('factor',), ()),
+    'saturation': (('factor',), ()),
+    'color_preset': (('name',), ()),
+    'color_matrix': (('matrix',), ('offset',)),
+    'channel_scales': (('scales',), ()),
+    'grayscale': ((), ()),
+    'invert': ((), ()),
+    'resize': (('width', 'height'), ()),
+}
+
+
+class Preset:
+    """
+    Пресет - именованная цепочка шагов вида {"op": "saturation", "factor": 0.8}.
+    Цепочка один раз компилируется в Pipeline: соседние табличные шаги
+    склеиваются в одну таблицу, и пресет применяется за один проход
+    """
+
+    def __init__(self, name: str, steps: List[dict], description: str = ''):
+        self.name = name
+        self.description = description
+        self.steps = [dict(step) for step in steps]
+        self.pipeline = compile_steps(self.steps, name)
+        # Отпечаток шагов входит в ключ кэша результатов: измененный пресет не берется из кэша
+        description = json.dumps(self.steps, sort_keys=True)
+        self.fingerprint = hashlib.blake2b(description.encode(), digest_size=8).hexdigest()
+
+    def apply(self, image: Image.Image) -> Image.Image:
+        return self.pipeline.execute(image)
+
+
+def compile_steps(steps: List[dict], source: str = '') -> 'pipeline.Pipeline':
+    """Проверяет шаги пресета и собирает из них Pipeline"""
+    if not steps:
+        raise ValueError(f"Пресет {source} не содержит шагов")
+    compiled = pipeline.Pipeline()
+    for step in steps:
+        params = dict(step)
+        op = params.pop('op', None)
+        if op not in STEP_PARAMETERS:
+            raise ValueError(f"Пресет {source}: неизвестный шаг {op}. Доступные: {', '.join(STEP_PARAMETERS)}")
+        required, optional = STEP_PARAMETERS[op]
+        missing = set(required) - set(params)
+        unknown = set(params) - set(required) - set(optional)
+        if missing or unknown:
+            raise ValueError(f"Пресет {source}: шаг {op} ожидает параметры "
+                             f"{', '.join(required + optional) or 'без параметров'}")
+        getattr(compiled, op)(**params)
+    return compiled
+
+
+def parse_preset(data: dict, name: str) -> Preset:
+    if not isinstance(data, dict) or not isinstance(data.get('steps'), list):
+        raise ValueError(f"Пресет {name} должен содержать список шагов 'steps'")
+    return Preset(data.get('name', name), data['steps'], data.get('description', ''))
+
+
+def load_preset(path: str) -> Preset:
+    """Читает пресет из JSON или TOML; имя по умолчанию - имя файла"""
+    name, ext = os.path.splitext(os.path.basename(path))
+    if ext == '.toml':
+        if tomllib is None:
+            raise ValueError("Пресеты в TOML требуют Python 3.11 или новее")
+        with open(path, 'rb') as f:
+            data = tomllib.load(f)
+    elif ext == '.json':
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    else:
+        raise ValueError(f"Неподдерживаемый формат пресета: {path}")
+    return parse_preset(data, name)
+
+
+class PresetLibrary:
+    """
+    Пресеты из каталога. Скомпилированный пресет кэшируется и читается
+    заново, только если файл изменился
+    """
+
+    def __init__(self, directory: str = DEFAULT_PRESETS_DIR):
+        self.directory = directory
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def names(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(dict.fromkeys(os.path.splitext(entry)[0] for entry in os.listdir(self.directory)
+                                    if entry.endswith(PRESET_EXTENSIONS)))
+
+    def get(self, name: str) -> Preset:
+        if os.path.basename(name) != name:
+            raise ValueError(f"Недопустимое имя пресета: {name}")
+        path = self._find(name)
+        if path is None:
+            raise ValueError(f"Пресет не найден: {name}")
+        stamp = os.stat(path).st_mtime_ns
+        with self._lock:
+            cached = self._cache.get(name)
+            if cached is not None and cached[0] == (path, stamp):
+                return cached[1]
+        preset = load_preset(path)
+        with self._lock:
+            self._cache[name] = ((path, stamp), preset)
+        logger.info(f"Загружен пресет {name} из {path}")
+        return preset
+
+    def _find(self, name: str) -> Optional[str]:
+        for ext in PRESET_EXTENSIONS:
+            path = os.path.join(self.directory, name + ext)
+            if os.path.isfile(path):
+                return path
+        return None
@@ -0,0 +1,121 @@
+import logging
+from typing import List, Optional, Tuple
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+RESAMPLE_FILTERS = {
+    'nearest': Image.Resampling.NEAREST,
+    'box': Image.Resampling.BOX,
+    'bilinear': Image.Resampling.BILINEAR,
+    'hamming': Image.Resampling.HAMMING,
+    'bicubic': Image.Resampling.BICUBIC,
+    'lanczos': Image.Resampling.LANCZOS,
+}
+
+# exact - ровно заданный размер; fit - вписать с сохранением пропорций;
+# fill - заполнить с обрезкой по центру; thumbnail - как fit, но без увеличения
+RESIZE_MODES = ('exact', 'fit', 'fill', 'thumbnail')
+
+# Уменьшение в два этапа: быстрый reduce в целое число раз, пока до цели
+# остается больше reducing_gap раз, затем фильтр. 3.0 почти неотличимо от
+# одного шага, а большие уменьшения (8000 -> 800 px) ускоряет в разы
+DEFAULT_REDUCING_GAP = 3.0
+
+# Режимы, которые Image.reduce умеет уменьшать
+REDUCIBLE_MODES = ('L', 'LA', 'RGB', 'RGBA', 'RGBa', 'La', 'I', 'F', 'CMYK')
+
+# Прозрачность при фильтрации учитывается в премультиплицированном виде, как в Image.resize
+_PREMULTIPLIED_MODES = {'RGBA': 'RGBa', 'LA': 'La'}
+
+
+def get_filter(name: str) -> Image.Resampling:
+    if name not in RESAMPLE_FILTERS:
+        raise ValueError(f"Неизвестный фильтр: {name}. Доступные: {', '.join(RESAMPLE_FILTERS)}")
+    return RESAMPLE_FILTERS[name]
+
+
+def target_size(size: tuple, width: int, height: int, mode: str = 'exact') -> Tuple[tuple, Optional[tuple]]:
+    """
+    Размер результата и область исходного изображения (или None - все изображение)
+    для изменения размера в режиме mode
+    """
+    if width <= 0 or height <= 0:
+        raise ValueError("Ширина и высота должны быть положительными числами")
+    if mode not in RESIZE_MODES:
+        raise ValueError(f"Неизвестный режим изменения размера: {mode}")
+    src_width, src_height = size
+    if mode == 'exact':
+        return (width, height), None
+    if mode == 'fill':
+        # Из исходного вырезается центральная область с пропорциями цели
+        ratio = max(width / src_width, height / src_height)
+        crop_width, crop_height = width / ratio, height / ratio
+        left, top = (src_width - crop_width) / 2, (src_height - crop_height) / 2
+        return (width, height), (left, top, left + crop_width, top + crop_height)
+
+    ratio = min(width / src_width, height / src_height)
+    if mode == 'thumbnail':
+        ratio = min(ratio, 1.0)
+    return (max(1, round(src_width * ratio)), max(1, round(src_height * ratio))), None
+
+
+def resize(image: Image.Image, width: int, height: int, mode: str = 'exact', filter: str = 'lanczos',
+           reducing_gap: Optional[float] = None) -> Image.Image:
+    """Изменение размера в режиме mode; reducing_gap включает быстрое предварительное уменьшение"""
+    size, box = target_size(image.size, width, height, mode)
+    if size == image.size and box is None:
+        return image.copy()
+    return image.resize(size, get_filter(filter), box=box, reducing_gap=reducing_gap)
+
+
+def resize_many(image: Image.Image, sizes: List[tuple], mode: str = 'fit', filter: str = 'lanczos',
+                reducing_gap: Optional[float] = DEFAULT_REDUCING_GAP) -> List[Image.Image]:
+    """
+    Несколько размеров одного изображения за раз. Уровни пирамиды (reduce
+    в целое число раз) общие для всех целей: каждая следующая, меньшая цель
+    уменьшает уже построенный уровень, а не оригинал, и затем доводится
+    фильтром от уровня, который еще больше нее в reducing_gap раз.
+    Без reducing_gap каждая цель считается от оригинала
+    """
+    resample = get_filter(filter)
+    targets = [target_size(image.size, width, height, mode) for width, height in sizes]
+    if image.mode not in REDUCIBLE_MODES or resample == Image.Resampling.NEAREST:
+        reducing_gap = None
+    source_mode = image.mode
+    if reducing_gap and source_mode in _PREMULTIPLIED_MODES:
+        image = image.convert(_PREMULTIPLIED_MODES[source_mode])
+    # Уровень пирамиды: (изображение, во сколько раз уменьшено)
+    levels = [(image, 1)]
+    results = [None] * len(targets)
+    # От больших целей к меньшим: пирамида достраивается по мере надобности
+    order = sorted(range(len(targets)), key=lambda i: -targets[i][0][0] * targets[i][0][1])
+    for i in order:
+        size, box = targets[i]
+        box = box or (0, 0) + image.size
+        level, factor = levels[0]
+        if reducing_gap:
+            # Исходная область должна остаться больше цели в reducing_gap раз
+            limit = min((box[2] - box[0]) / (size[0] * reducing_gap),
+                        (box[3] - box[1]) / (size[1] * reducing_gap))
+            # Ближайший построенный уровень, который уменьшен не сильнее limit,
+            # при необходимости уменьшается дальше и становится новым уровнем
+            level, factor = next((lvl, f) for lvl, f in reversed(levels) if f <= max(1, limit))
+            extra = int(limit / factor)
+            if extra >= 2:
+                level, factor = level.reduce(extra), factor * extra
+                levels.append((level, factor))
+                levels.sort(key=lambda item: item[1])
+        # Пиксель k уровня - среднее блока [k * factor, (k + 1) * factor) оригинала;
+        # при некратном размере последний блок неполный, но начала блоков
+        # от этого не сдвигаются, поэтому область пересчитывается делением на factor
+        level_box = tuple(value / factor for value in box)
+        if size == level.size and level_box == (0, 0) + level.size:
+            results[i] = level.copy()
+        else:
+            results[i] = level.resize(size, resample, box=level_box)
+        if results[i].mode != source_mode:
+            results[i] = results[i].convert(source_mode)
+    logger.debug(f"Построено {len(sizes)} размеров, уровней пирамиды: {len(levels)}")
+    return results
@@ -0,0 +1,135 @@
+import logging
+import math
+from typing import List, Optional
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Статистика запоминается на объекте изображения (отдельно для каждого размера
+# выборки) только по просьбе вызывающего: image_stats(..., cached=True) для
+# изображений, которыми он владеет и которые не меняет на месте (paste, ImageDraw).
+# point переносит ее на результат, поэтому то же относится и к производным
+# изображениям. ImageProcessor получает чужие изображения и запомненной
+# статистике не доверяет
+_STATS_ATTRIBUTE = '_image_stats'
+
+# Режимы, у которых каждый канал - 8 бит и Image.histogram дает по 256 значений на канал
+HISTOGRAM_MODES = ('L', 'LA', 'RGB', 'RGBA', 'CMYK')
+
+
+class ImageStats:
+    """Гистограммы каналов формы (каналы, 256) и производные от них величины"""
+
+    def __init__(self, histograms: np.ndarray, bands: tuple):
+        self.histograms = np.asarray(histograms, dtype=np.int64).reshape(len(bands), 256)
+        self.bands = tuple(bands)
+
+    @property
+    def count(self) -> int:
+        return int(self.histograms[0].sum())
+
+    def means(self) -> List[float]:
+        # Целочисленная сумма дает то же среднее, что и np.mean по каналу
+        return [sum(i * int(h) for i, h in enumerate(hist)) / max(1, int(hist.sum()))
+                for hist in self.histograms]
+
+    def percentiles(self, percentile: float) -> List[int]:
+        """Наименьшее значение каждого канала, до которого включительно лежит percentile % пикселей"""
+        if not 0 < percentile <= 100:
+            raise ValueError("Перцентиль должен быть в диапазоне (0, 100]")
+        references = []
+        for hist in self.histograms:
+            cumulative = np.cumsum(hist)
+            references.append(int(np.searchsorted(cumulative, percentile / 100 * cumulative[-1])))
+        return references
+
+    def through_lut(self, lut) -> 'ImageStats':
+        """
+        Статистика результата поточечного преобразования image.point(lut) без
+        прохода по пикселям: каждый столбец гистограммы переносится в ячейку lut[значение]
+        """
+        luts = np.asarray(lut, dtype=np.intp).reshape(-1, 256)
+        if len(luts) == 1:
+            luts = np.repeat(luts, len(self.bands), axis=0)
+        if len(luts) != len(self.bands):
+            raise ValueError(f"Ожидается таблица на {len(self.bands)} каналов")
+        histograms = np.stack([np.bincount(lut, weights=hist, minlength=256)
+                               for lut, hist in zip(luts, self.histograms)])
+        return ImageStats(histograms, self.bands)
+
+    def autocontrast_lut(self, cutoff: float = 0) -> list:
+        """Таблица автоконтраста для Image.point, как в ImageOps.autocontrast"""
+        lut = []
+        for hist in self.histograms:
+            h = [int(v) for v in hist]
+            if cutoff:
+                n = sum(h)
+                _cut_tail(h, int(n * cutoff // 100), range(256))
+                _cut_tail(h, int(n * cutoff // 100), range(255, -1, -1))
+            lo = next((i for i in range(256) if h[i]), 255)
+            hi = next((i for i in range(255, -1, -1) if h[i]), 0)
+            if hi <= lo:
+                lut.extend(range(256))
+                continue
+            scale = 255.0 / (hi - lo)
+            offset = -lo * scale
+            lut.extend(min(255, max(0, int(ix * scale + offset))) for ix in range(256))
+        return lut
+
+
+def _cut_tail(h: list, cut: int, order) -> None:
+    # Отбрасывает cut пикселей с одного края гистограммы
+    for i in order:
+        if cut <= 0:
+            break
+        removed = min(cut, h[i])
+        h[i] -= removed
+        cut -= removed
+
+
+def image_stats(image: Image.Image, sample_pixels: Optional[int] = None, cached: bool = False) -> ImageStats:
+    """
+    Статистика изображения за один проход Image.histogram. Если пикселей
+    больше sample_pixels, считается по равномерной выборке. С cached=True
+    результат запоминается на изображении и берется из запомненного
+    """
+    if cached:
+        stored = getattr(image, _STATS_ATTRIBUTE, None)
+        if stored is not None and sample_pixels in stored:
+            return stored[sample_pixels]
+    if image.mode not in HISTOGRAM_MODES:
+        raise ValueError(f"Статистика не поддерживается для режима {image.mode}")
+
+    source = image
+    if sample_pixels and image.width * image.height > sample_pixels:
+        step = math.ceil(math.sqrt(image.width * image.height / sample_pixels))
+        size = (max(1, image.width // step), max(1, image.height // step))
+        source = image.resize(size, Image.Resampling.NEAREST)
+    stats = ImageStats(source.histogram(), image.getbands())
+    if cached:
+        attach(image, stats, sample_pixels)
+    return stats
+
+
+def attach(image: Image.Image, stats: ImageStats, sample_pixels: Optional[int] = None) -> None:
+    """Запоминает готовую статистику на изображении"""
+    cached = getattr(image, _STATS_ATTRIBUTE, None)
+    if cached is None:
+        cached = {}
+        setattr(image, _STATS_ATTRIBUTE, cached)
+    cached[sample_pixels] = stats
+
+
+def point(image: Image.Image, lut) -> Image.Image:
+    """
+    image.point(lut), который переносит уже посчитанную статистику
+    исходного изображения на результат через ту же таблицу
+    """
+    result = image.point(lut)
+    cached = getattr(image, _STATS_ATTRIBUTE, None)
+    if cached and result.mode == image.mode:
+        for sample_pixels, stats in cached.items():
+            attach(result, stats.through_lut(lut), sample_pixels)
+    return result
@@ -1,7 +1,26 @@
 import unittest
+import json
 import os
-from PIL import Image
-from image_processor import ImageProcessor
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+from PIL import Image, ImageOps
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from image_lib.image_processor import ImageProcessor
+from image_lib.history import OperationHistory, migrate_legacy_history, read_history
+from image_lib import batch
+from image_lib.tiling import TiledProcessor, open_raster
+from image_lib.parallel import ParallelExecutor
+from image_lib.cache import ResultCache
+from image_lib.edit_history import EditHistory, scale_operation
+from image_lib import metrics
+from image_lib.export import Exporter, ExportVariant
+from image_lib import filters, presets, resampling, stats
+from image_lib.watch import WatchService, ProcessedLedger
+from image_lib.workers import WorkerPool, SharedArena, read_shared, shared_size, write_shared
 
 class TestImageProcessor(unittest.TestCase):
     """Модульные тесты для ImageProcessor"""
@@ -26,6 +45,36 @@ class TestImageProcessor(unittest.TestCase):
         """Тест валидации несуществующего файла"""
         self.assertFalse(self.processor.validate_image("nonexistent.jpg"))
     
+    def test_validate_image_wrong_signature(self):
+        """Тест валидации файла с расширением изображения, но другим содержимым"""
+        with open("fake_image.png", "w") as f:
+            f.write("not an image")
+        try:
+            self.assertFalse(self.processor.validate_image("fake_image.png"))
+            with self.assertRaises(ValueError):
+                self.processor.load_image("fake_image.png")
+        finally:
+            os.remove("fake_image.png")
+    
+    def test_load_image_truncated(self):
+        """Тест загрузки поврежденного (обрезанного) файла"""
+        with open(self.test_path, "rb") as f:
+            data = f.read()
+        with open("truncated.png", "wb") as f:
+            f.write(data[:len(data) // 2])
+        try:
+            with self.assertRaises(ValueError):
+                self.processor.load_image("truncated.png")
+        finally:
+            os.remove("truncated.png")
+    
+    def test_load_image_trusted(self):
+        """Тест загрузки в доверенном режиме"""
+        image = self.processor.load_image(self.test_path, trusted=True)
+        self.assertEqual(image.format, "PNG")
+        self.assertEqual(image.getpixel((0, 0)), (255, 0, 0))
+        image.close()
+    
     def test_adjust_brightness(self):
         """Тест изменения яркости"""
         result = self.processor.adjust_brightness(self.test_image, 1.5)
@@ -40,6 +89,856 @@ class TestImageProcessor(unittest.TestCase):
         """Тест изменения размера"""
         result = self.processor.resize_image(self.test_image, 50, 50)
         self.assertEqual(result.size, (50, 50))
+    
+    def test_create_preview(self):
+        """Тест уменьшенной копии для предпросмотра"""
+        image = Image.new('RGB', (1000, 500), color='red')
+        preview = self.processor.create_preview(image, 400, 300)
+        self.assertEqual(preview.size, (400, 200))
+        self.assertEqual(image.size, (1000, 500))
+    
+    def test_sepia_matches_per_pixel(self):
+        """Тест совпадения векторной сепии с поэлементным расчетом"""
+        rng = np.random.default_rng(0)
+        image = Image.fromarray(rng.integers(0, 256, (16, 24, 3), dtype=np.uint8))
+        result = self.processor.apply_sepia(image)
+        
+        for (px, py) in [(0, 0), (5, 3), (23, 15), (11, 8)]:
+            r, g, b = image.getpixel((px, py))
+            expected = (
+                min(255, int(0.393 * r + 0.769 * g + 0.189 * b)),
+                min(255, int(0.349 * r + 0.686 * g + 0.168 * b)),
+                min(255, int(0.272 * r + 0.534 * g + 0.131 * b))
+            )
+            self.assertEqual(result.getpixel((px, py)), expected)
+    
+    def test_color_filter_output_buffer(self):
+        """Тест записи результата фильтра в переданный буфер"""
+        out = np.zeros((100, 100, 3), dtype=np.uint8)
+        result = self.processor.blue_tone(self.test_image, out=out)
+        self.assertEqual(tuple(out[0, 0]), (229, 0, 0))
+        self.assertEqual(result.getpixel((0, 0)), (229, 0, 0))
+
+    def test_color_matrix_identity(self):
+        """Тест единичной матрицы цвета со смещением"""
+        matrix = [[1, 0, 0, 0], [0, 1, 0, 10], [0, 0, 1, 0]]
+        result = self.processor.apply_color_matrix(self.test_image, matrix)
+        self.assertEqual(result.getpixel((0, 0)), (255, 10, 0))
+    
+    def test_color_preset_unknown(self):
+        """Тест применения несуществующего пресета"""
+        with self.assertRaises(ValueError):
+            self.processor.apply_color_preset(self.test_image, "nonexistent")
+
+    def test_pipeline_matches_sequential(self):
+        """Тест совпадения конвейера с последовательными вызовами"""
+        rng = np.random.default_rng(1)
+        image = Image.fromarray(rng.integers(0, 256, (40, 30, 3), dtype=np.uint8))
+        
+        expected = self.processor.apply_sepia(image)
+        expected = self.processor.adjust_saturation(expected, 0.8)
+        expected = self.processor.adjust_contrast(expected, 1.3)
+        expected = self.processor.adjust_brightness(expected, 1.1)
+        expected = self.processor.apply_invert(expected)
+        
+        result = (self.processor.pipeline()
+                  .color_preset('sepia').saturation(0.8).contrast(1.3)
+                  .brightness(1.1).invert().execute(image))
+        self.assertEqual(result.tobytes(), expected.tobytes())
+    
+    def test_pipeline_resize(self):
+        """Тест изменения размера в конвейере"""
+        result = self.processor.pipeline().grayscale().resize(20, 10).execute(self.test_image)
+        self.assertEqual(result.size, (20, 10))
+        self.assertEqual(result.getpixel((5, 5)), (76, 76, 76))
+
+    def test_pipeline_alpha_matches_sequential(self):
+        """Тест RGBA в конвейере: режим и пиксели как у последовательных вызовов"""
+        rng = np.random.default_rng(2)
+        image = Image.fromarray(rng.integers(0, 256, (40, 30, 4), dtype=np.uint8), 'RGBA')
+        chains = [
+            [("adjust_contrast", (1.3,)), ("adjust_brightness", (1.1,)), ("adjust_saturation", (0.7,))],
+            [("adjust_contrast", (1.3,)), ("adjust_brightness", (1.1,)), ("apply_invert", ())],
+            [("adjust_brightness", (0.9,)), ("apply_grayscale", ()), ("adjust_contrast", (1.2,))],
+            [("apply_color_preset", ("sepia",)), ("adjust_saturation", (0.8,))],
+            [("adjust_brightness", (1.1,)), ("resize_image", (15, 20)), ("adjust_contrast", (0.8,))],
+        ]
+        methods = {"adjust_contrast": "contrast", "adjust_brightness": "brightness",
+                   "adjust_saturation": "saturation", "apply_invert": "invert", "apply_grayscale": "grayscale",
+                   "apply_color_preset": "color_preset", "resize_image": "resize"}
+        for chain in chains:
+            with self.subTest(chain=[name for name, _ in chain]):
+                expected = image
+                compiled = self.processor.pipeline()
+                for name, args in chain:
+                    expected = getattr(self.processor, name)(expected, *args)
+                    getattr(compiled, methods[name])(*args)
+                result = compiled.execute(image)
+                self.assertEqual(result.mode, expected.mode)
+                self.assertEqual(result.tobytes(), expected.tobytes())
+        
+        # Винтаж начинается с сепии и, как до конвейера, возвращает RGB
+        self.assertEqual(self.processor.apply_vintage(image).mode, 'RGB')
+
+    def test_load_image_target_size(self):
+        """Тест загрузки уменьшенной копии для предпросмотра"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for name in ("big.jpg", "big.png"):
+                path = os.path.join(temp_dir, name)
+                Image.new('RGB', (1000, 800), color=(10, 120, 200)).save(path)
+                image = self.processor.load_image(path, target_size=(200, 150))
+                self.assertEqual(image.info["full_size"], (1000, 800))
+                # Не меньше запрошенного размера, но и не вдвое больше
+                self.assertTrue(200 <= image.width < 400 and 150 <= image.height < 300)
+                self.assertEqual(image.format, "JPEG" if name.endswith(".jpg") else "PNG")
+        
+        # Изображение меньше запрошенного размера не уменьшается
+        image = self.processor.load_image(self.test_path, target_size=(80, 80))
+        self.assertEqual(image.size, (100, 100))
+    
+    def test_white_balance_gray_world(self):
+        """Тест баланса белого по среднему серому"""
+        rng = np.random.default_rng(4)
+        arr = rng.integers(0, 256, (50, 60, 3), dtype=np.uint8)
+        arr[..., 2] //= 2
+        means = arr.reshape(-1, 3).mean(axis=0)
+        gains = means.mean() / means
+        expected = np.minimum(255, np.round(np.arange(256)[None, :] * gains[:, None]))
+        expected = np.stack([expected[c][arr[..., c]] for c in range(3)], axis=-1)
+        
+        result = self.processor.white_balance(Image.fromarray(arr), sample_pixels=None)
+        self.assertTrue(np.array_equal(np.asarray(result), expected.astype(np.uint8)))
+    
+    def test_white_balance_modes(self):
+        """Тест режимов white_patch и percentile"""
+        arr = np.zeros((10, 10, 3), dtype=np.uint8)
+        arr[..., 0] = np.arange(100).reshape(10, 10)
+        arr[..., 1] = 200
+        image = Image.fromarray(arr)
+        self.assertEqual(self.processor.white_balance(image, 'white_patch').getextrema()[:2],
+                         ((0, 255), (255, 255)))
+        self.assertEqual(self.processor.white_balance(image, 'percentile', 50).getpixel((9, 4))[0], 255)
+        with self.assertRaises(ValueError):
+            self.processor.white_balance(image, 'retinex')
+
+class TestOperationHistory(unittest.TestCase):
+    """Модульные тесты для журнала операций"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "history.jsonl")
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def test_record_and_read(self):
+        """Тест записи и чтения истории"""
+        history = OperationHistory(self.path)
+        history.record("adjust_brightness", {"brightness_factor": 1.5})
+        history.record("apply_sepia", {})
+        history.close()
+        
+        entries = list(read_history(self.path))
+        self.assertEqual([e["operation"] for e in entries], ["adjust_brightness", "apply_sepia"])
+        self.assertEqual(entries[0]["parameters"], {"brightness_factor": 1.5})
+    
+    def test_rotation_keeps_order(self):
+        """Тест ротации файла истории"""
+        history = OperationHistory(self.path, max_bytes=200, backup_count=10, batch_size=1)
+        for i in range(20):
+            history.record("op", {"index": i})
+        history.close()
+        
+        self.assertTrue(os.path.exists(self.path + ".1"))
+        indexes = [e["parameters"]["index"] for e in read_history(self.path)]
+        self.assertEqual(indexes, list(range(20)))
+    
+    def test_legacy_json_migrated_once(self):
+        """Тест переноса старого журнала user_history.json"""
+        legacy = os.path.join(self.temp_dir.name, "history.json")
+        with open(legacy, 'w', encoding='utf-8') as f:
+            json.dump([{"date": "2024-01-01T00:00:00", "operation": "apply_sepia", "parameters": {}}], f)
+        
+        history = OperationHistory(self.path)
+        history.record("apply_blur", {"radius": 2})
+        history.close()
+        
+        operations = [e["operation"] for e in read_history(self.path)]
+        self.assertEqual(operations, ["apply_sepia", "apply_blur"])
+        self.assertFalse(os.path.exists(legacy))
+        self.assertTrue(os.path.exists(legacy + ".bak"))
+        self.assertFalse(migrate_legacy_history(self.path))
+
+class TestBatch(unittest.TestCase):
+    """Модульные тесты для пакетной обработки"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.input_dir = os.path.join(self.temp_dir.name, "input")
+        os.makedirs(self.input_dir)
+        for name in ("a.png", "b.png"):
+            Image.new('RGB', (40, 30), color='red').save(os.path.join(self.input_dir, name))
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def test_parse_operation(self):
+        """Тест разбора описания операции"""
+        self.assertEqual(batch.parse_operation("apply_sepia"), ("apply_sepia", [], {}))
+        self.assertEqual(batch.parse_operation("adjust_brightness:1.2"), ("adjust_brightness", [1.2], {}))
+        self.assertEqual(batch.parse_operation("resize_image:width=8,height=6"),
+                         ("resize_image", [], {"width": 8, "height": 6}))
+        with self.assertRaises(ValueError):
+            batch.parse_operation("remove_background")
+    
+    def test_run_batch(self):
+        """Тест пакетной обработки каталога"""
+        output_dir = os.path.join(self.temp_dir.name, "output")
+        operations = [batch.parse_operation("resize_image:20,15")]
+        summary = batch.run_batch(batch.collect_inputs(self.input_dir), operations,
+                                  output_dir, format="jpeg", workers=2,
+                                  processor=ImageProcessor(history_file=None))
+        
+        self.assertEqual(summary["failed"], {})
+        self.assertEqual(sorted(os.listdir(output_dir)), ["a.jpg", "b.jpg"])
+        with Image.open(os.path.join(output_dir, "a.jpg")) as result:
+            self.assertEqual(result.size, (20, 15))
+
+    def test_same_names_in_subdirectories(self):
+        """Тест рекурсивной маски: одноименные файлы из подкаталогов не перезаписывают друг друга"""
+        nested = os.path.join(self.input_dir, "2024", "june")
+        os.makedirs(nested)
+        Image.new('RGB', (40, 30), color='blue').save(os.path.join(nested, "a.png"))
+        output_dir = os.path.join(self.temp_dir.name, "output")
+        pattern = os.path.join(self.input_dir, "**", "*.png")
+        inputs = batch.collect_inputs(pattern)
+        self.assertEqual(batch.input_root(pattern), self.input_dir)
+        
+        processor = ImageProcessor(history_file=None)
+        with self.assertRaises(ValueError):
+            batch.run_batch(inputs, [], output_dir, workers=1, processor=processor)
+        self.assertFalse(os.path.exists(output_dir))
+        
+        summary = batch.run_batch(inputs, [], output_dir, workers=1, processor=processor,
+                                  root=batch.input_root(pattern))
+        self.assertEqual(summary["failed"], {})
+        with Image.open(os.path.join(output_dir, "a.png")) as result:
+            self.assertEqual(result.getpixel((0, 0)), (255, 0, 0))
+        with Image.open(os.path.join(output_dir, "2024", "june", "a.png")) as result:
+            self.assertEqual(result.getpixel((0, 0)), (0, 0, 255))
+
+class TestTiledProcessor(unittest.TestCase):
+    """Модульные тесты для обработки полосами"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(2)
+        self.image = Image.fromarray(rng.integers(0, 256, (61, 37, 3), dtype=np.uint8))
+        self.src_path = os.path.join(self.temp_dir.name, "source.ppm")
+        self.image.save(self.src_path)
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def test_matches_whole_image(self):
+        """Тест совпадения обработки полосами с обработкой целого изображения"""
+        processor = ImageProcessor(history_file=None)
+        operations = [("apply_sepia", [], {}), ("adjust_contrast", [1.3], {}),
+                      ("apply_blur", [], {}), ("apply_sharpen", [], {})]
+        expected = self.image
+        for name, args, kwargs in operations:
+            expected = processor.apply_operation(expected, name, *args, **kwargs)
+        
+        dst_path = os.path.join(self.temp_dir.name, "result.npy")
+        TiledProcessor(processor, tile_rows=7).process(self.src_path, dst_path, operations)
+        self.assertTrue(np.array_equal(open_raster(dst_path), np.asarray(expected)))
+    
+    def test_unsupported_operation(self):
+        """Тест отказа для операций, зависящих от всего изображения"""
+        dst_path = os.path.join(self.temp_dir.name, "result.ppm")
+        with self.assertRaises(ValueError):
+            TiledProcessor(ImageProcessor(history_file=None)).process(
+                self.src_path, dst_path, [("resize_image", [10, 10], {})])
+
+class TestParallelExecutor(unittest.TestCase):
+    """Модульные тесты для параллельной обработки полосами"""
+    
+    def test_matches_serial(self):
+        """Тест побитового совпадения с последовательной обработкой"""
+        processor = ImageProcessor(history_file=None)
+        rng = np.random.default_rng(5)
+        image = Image.fromarray(rng.integers(0, 256, (83, 41, 3), dtype=np.uint8))
+        operations = [("apply_warm_tone", [], {}), ("adjust_contrast", [0.7], {}),
+                      ("apply_sharpen", [], {}), ("apply_blur", [], {})]
+        expected = image
+        for name, args, kwargs in operations:
+            expected = processor.apply_operation(expected, name, *args, **kwargs)
+        
+        executor = ParallelExecutor(workers=3, min_pixels=0)
+        try:
+            self.assertEqual(executor.run(image, operations).tobytes(), expected.tobytes())
+            self.assertFalse(executor.supports(image, [("resize_image", [10, 10], {})]))
+        finally:
+            executor.close()
+
+    def test_contrast_keeps_band_layout(self):
+        """Тест контраста полосами для изображений L и RGBA"""
+        processor = ImageProcessor(history_file=None)
+        rng = np.random.default_rng(6)
+        executor = ParallelExecutor(workers=3, min_pixels=0)
+        try:
+            for mode, channels in (('L', 1), ('RGBA', 4)):
+                with self.subTest(mode=mode):
+                    pixels = rng.integers(0, 256, (83, 41, channels), dtype=np.uint8)
+                    image = Image.fromarray(pixels[..., 0] if channels == 1 else pixels, mode)
+                    for operations in ([("adjust_contrast", [1.2], {})],
+                                       [("apply_blur", [], {}), ("adjust_contrast", [0.6], {})]):
+                        expected = image
+                        for name, args, kwargs in operations:
+                            expected = processor.apply_operation(expected, name, *args, **kwargs)
+                        result = executor.run(image, operations)
+                        self.assertEqual(result.mode, expected.mode)
+                        self.assertEqual(result.tobytes(), expected.tobytes())
+        finally:
+            executor.close()
+
+class TestResultCache(unittest.TestCase):
+    """Модульные тесты для кэша результатов"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.image = Image.new('RGB', (40, 30), color=(200, 100, 50))
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def test_repeated_operation_hits_cache(self):
+        """Тест повторной операции и различения параметров"""
+        processor = ImageProcessor(history_file=None, cache=ResultCache())
+        first = processor.apply_operation(self.image, "adjust_brightness", 1.2)
+        second = processor.apply_operation(self.image.copy(), "adjust_brightness", 1.2)
+        other = processor.apply_operation(self.image, "adjust_brightness", 1.3)
+        
+        self.assertIsNot(first, second)
+        self.assertEqual(first.tobytes(), second.tobytes())
+        self.assertNotEqual(first.getpixel((0, 0)), other.getpixel((0, 0)))
+        self.assertEqual(processor.cache.hits, 1)
+    
+    def test_in_place_edits_do_not_leak_into_cache(self):
+        """Тест: изменение на месте результата или исходного изображения не портит кэш"""
+        processor = ImageProcessor(history_file=None, cache=ResultCache())
+        image = self.image.copy()
+        expected = processor.adjust_brightness(image, 1.2).tobytes()
+        
+        processor.apply_operation(image, "adjust_brightness", 1.2).paste((0, 0, 0), (0, 0, 10, 10))
+        processor.apply_operation(image, "adjust_brightness", 1.2).paste((255, 0, 0), (0, 0, 10, 10))
+        self.assertEqual(processor.apply_operation(image, "adjust_brightness", 1.2).tobytes(), expected)
+        
+        image.paste((0, 0, 255), (0, 0, 10, 10))
+        self.assertEqual(processor.apply_operation(image, "adjust_brightness", 1.2).tobytes(),
+                         processor.adjust_brightness(image, 1.2).tobytes())
+    
+    def test_byte_limit_and_disk_tier(self):
+        """Тест вытеснения по объему и чтения с диска"""
+        disk_dir = os.path.join(self.temp_dir.name, "cache")
+        cache = ResultCache(max_bytes=40 * 30 * 3, disk_dir=disk_dir)
+        processor = ImageProcessor(history_file=None, cache=cache)
+        sepia = processor.apply_operation(self.image, "apply_sepia")
+        processor.apply_operation(self.image, "apply_invert")
+        self.assertEqual(cache.size, 40 * 30 * 3)
+        
+        # Новый процессор с тем же каталогом получает результат с диска
+        processor = ImageProcessor(history_file=None, cache=ResultCache(disk_dir=disk_dir))
+        cached = processor.apply_operation(self.image, "apply_sepia")
+        self.assertEqual(processor.cache.hits, 1)
+        self.assertEqual(cached.tobytes(), sepia.tobytes())
+
+class TestEditHistory(unittest.TestCase):
+    """Модульные тесты для истории отмены и повтора"""
+    
+    def setUp(self):
+        self.processor = ImageProcessor(history_file=None)
+        rng = np.random.default_rng(3)
+        self.image = Image.fromarray(rng.integers(0, 256, (24, 32, 3), dtype=np.uint8))
+        self.operations = [("apply_sepia", [], {}), ("adjust_brightness", [1.2], {}),
+                           ("apply_blur", [], {}), ("apply_invert", [], {}), ("resize_image", [16, 12], {})]
+    
+    def build_history(self, **kwargs):
+        history = EditHistory(self.processor, self.image, **kwargs)
+        states = [self.image]
+        for name, args, params in self.operations:
+            states.append(self.processor.apply_operation(states[-1], name, *args, **params))
+            history.push(name, [(name, args, params)], states[-1])
+        return history, states
+    
+    def test_undo_redo_restores_states(self):
+        """Тест отмены и повтора всех шагов"""
+        history, states = self.build_history(checkpoint_interval=2)
+        for index in range(len(states) - 2, -1, -1):
+            self.assertEqual(history.undo().tobytes(), states[index].tobytes())
+        self.assertFalse(history.can_undo())
+        for index in range(1, len(states)):
+            self.assertEqual(history.redo().tobytes(), states[index].tobytes())
+        self.assertFalse(history.can_redo())
+    
+    def test_proxy_history_renders_full_resolution(self):
+        """Тест истории на уменьшенной копии и повтора шагов в полном разрешении"""
+        proxy = self.image.resize((16, 12))
+        history = EditHistory(self.processor, proxy, scale=0.5, full_size=self.image.size)
+        history.push("apply_sepia", [("apply_sepia", [], {})], self.processor.apply_sepia(proxy))
+        history.push("resize_image", [("resize_image", [20, 10], {})], proxy.resize((10, 5)))
+        self.assertEqual(history.current_full_size(), (20, 10))
+        
+        history.undo()
+        self.assertEqual(history.redo().size, (10, 5))
+        full = history.render(self.image)
+        self.assertEqual(full.size, (20, 10))
+        self.assertEqual(full.tobytes(), self.processor.resize_image(
+            self.processor.apply_sepia(self.image), 20, 10).tobytes())
+    
+    def test_evicted_checkpoints_are_replayed(self):
+        """Тест пересчета состояний после вытеснения снимков"""
+        history, states = self.build_history(checkpoint_interval=1, memory_limit=1)
+        self.assertEqual(sum(1 for step in history.steps if step.snapshot), 1)
+        self.assertEqual(history.image_at(2).tobytes(), states[2].tobytes())
+        
+        # Новый шаг после отмены отбрасывает ветку повтора
+        history.undo()
+        history.push("apply_grayscale", [("apply_grayscale", [], {})], self.image.convert('L'))
+        self.assertFalse(history.can_redo())
+        self.assertEqual(len(history.steps), len(self.operations))
+
+class TestMetrics(unittest.TestCase):
+    """Модульные тесты для замеров операций"""
+    
+    def test_operations_are_recorded(self):
+        """Тест записи вызовов методов процессора в общий реестр"""
+        metrics.registry.reset()
+        processor = ImageProcessor(history_file=None)
+        image = Image.new('RGB', (100, 100), color='red')
+        with metrics.registry.collect() as records:
+            processor.apply_vintage(image)
+        
+        stats = metrics.registry.snapshot()["apply_vintage"]
+        self.assertEqual(stats["calls"], 1)
+        self.assertGreater(stats["mp_per_s"], 0)
+        self.assertEqual([r["operation"] for r in records], ["apply_vintage"])
+        self.assertEqual(records[0]["pixels"], 100 * 100)
+    
+    def test_capture_modes(self):
+        """Тест замера выделений памяти и профилирования"""
+        registry = metrics.MetricsRegistry(metrics.CAPTURE_TRACEMALLOC)
+        with registry.measure("allocate"):
+            data = bytearray(2 ** 20)
+        self.assertGreaterEqual(registry.last()["allocated"], 2 ** 20)
+        del data
+        
+        registry.set_capture(metrics.CAPTURE_PROFILE)
+        with registry.measure("sort"):
+            sorted(range(1000), reverse=True)
+        self.assertIn("sorted", registry.profile_stats())
+        registry.set_capture(metrics.CAPTURE_OFF)
+        with self.assertRaises(ValueError):
+            registry.set_capture("perf")
+
+class TestExport(unittest.TestCase):
+    """Модульные тесты для сохранения и экспорта"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.processor = ImageProcessor(history_file=None)
+        self.image = Image.new('RGBA', (120, 80), color=(200, 40, 40, 128))
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def test_save_with_encoder_options(self):
+        """Тест сохранения в .jpg с параметрами кодировщика"""
+        path = os.path.join(self.temp_dir.name, "result.jpg")
+        self.processor.save_image(self.image, path, quality=80, progressive=True)
+        with Image.open(path) as result:
+            self.assertEqual((result.format, result.mode), ("JPEG", "RGB"))
+            self.assertTrue(result.info.get("progressive"))
+        self.assertEqual(os.listdir(self.temp_dir.name), ["result.jpg"])
+        with self.assertRaises(ValueError):
+            self.processor.save_image(self.image, path, compress_level=1)
+
+    def test_save_file_permissions(self):
+        """Тест прав сохраненного файла: как у файла, созданного open()"""
+        path = os.path.join(self.temp_dir.name, "result.png")
+        reference = os.path.join(self.temp_dir.name, "reference")
+        open(reference, 'wb').close()
+        self.processor.save_image(self.image, path)
+        self.assertEqual(os.stat(path).st_mode & 0o777, os.stat(reference).st_mode & 0o777)
+
+    def test_export_variants(self):
+        """Тест параллельной записи нескольких размеров и форматов"""
+        variants = [
+            ExportVariant(os.path.join(self.temp_dir.name, "full.png"), compress_level=1),
+            ExportVariant(os.path.join(self.temp_dir.name, "small.jpg"), max_size=(60, 60), quality=70),
+            ExportVariant(os.path.join(self.temp_dir.name, "small.webp"), max_size=(30, 30), lossless=True)
+        ]
+        with Exporter(self.processor, workers=3) as exporter:
+            paths = [future.result() for future in exporter.export_variants(self.image, variants)]
+        
+        sizes = {}
+        for path in paths:
+            with Image.open(path) as result:
+                sizes[os.path.basename(path)] = result.size
+        self.assertEqual(sizes, {"full.png": (120, 80), "small.jpg": (60, 40), "small.webp": (30, 20)})
+
+class TestFilters(unittest.TestCase):
+    """Модульные тесты для фильтров с радиусом"""
+    
+    def setUp(self):
+        rng = np.random.default_rng(5)
+        self.image = Image.fromarray(rng.integers(0, 256, (240, 160, 3), dtype=np.uint8))
+        self.processor = ImageProcessor(history_file=None)
+    
+    def test_blur_radius(self):
+        """Тест размытия с радиусом и близости к свертке гауссовым ядром"""
+        weak = np.asarray(self.processor.apply_blur(self.image, 1.0), dtype=np.float32)
+        strong = np.asarray(self.processor.apply_blur(self.image, 8.0), dtype=np.float32)
+        self.assertLess(strong.std(), weak.std())
+        
+        reference = filters.separable_filter(self.image, filters.gaussian_kernel(2.0))
+        blurred = self.processor.apply_blur(self.image, 2.0)
+        difference = np.abs(np.asarray(reference, dtype=np.int16) - np.asarray(blurred, dtype=np.int16))
+        self.assertLess(difference.mean(), 2)
+        with self.assertRaises(ValueError):
+            self.processor.apply_blur(self.image, 2.0, "median")
+        with self.assertRaises(ValueError):
+            filters.separable_filter(self.image, [0.5, 0.5])
+    
+    def test_parallel_and_proxy_radius(self):
+        """Тест обработки полосами и пересчета радиуса для уменьшенной копии"""
+        operations = [("apply_blur", [6.5], {}), ("apply_sharpen", [], {"radius": 2.0, "percent": 80})]
+        serial = self.processor.apply_sharpen(self.processor.apply_blur(self.image, 6.5), radius=2.0, percent=80)
+        executor = ParallelExecutor(workers=4, min_pixels=1)
+        try:
+            parallel = executor.run(self.image, operations)
+        finally:
+            executor.close()
+        self.assertTrue(np.array_equal(np.asarray(serial), np.asarray(parallel)))
+        self.assertEqual(scale_operation(("apply_blur", [6.5], {}), 0.5), ("apply_blur", [3.25], {}))
+
+class TestResampling(unittest.TestCase):
+    """Модульные тесты для изменения размера"""
+    
+    def setUp(self):
+        rng = np.random.default_rng(9)
+        self.image = Image.fromarray(rng.integers(0, 256, (600, 900, 3), dtype=np.uint8))
+        self.processor = ImageProcessor(history_file=None)
+    
+    def test_resize_modes(self):
+        """Тест режимов exact, fit, fill и thumbnail"""
+        sizes = {mode: self.processor.resize_image(self.image, 300, 300, mode).size
+                 for mode in resampling.RESIZE_MODES}
+        self.assertEqual(sizes, {'exact': (300, 300), 'fit': (300, 200), 'fill': (300, 300),
+                                 'thumbnail': (300, 200)})
+        self.assertEqual(self.processor.resize_image(self.image, 2000, 2000, 'thumbnail').size, (900, 600))
+        self.assertEqual(self.processor.resize_image(self.image, 1800, 1800, 'fit').size, (1800, 1200))
+        with self.assertRaises(ValueError):
+            self.processor.resize_image(self.image, 300, 300, filter='cubic')
+    
+    def test_resize_many_shares_pyramid(self):
+        """Тест нескольких размеров от общей пирамиды: близко к прямому уменьшению"""
+        sizes = [(450, 450), (150, 150), (60, 60)]
+        results = resampling.resize_many(self.image, sizes, mode='fill')
+        self.assertEqual([result.size for result in results], sizes)
+        for result, (width, height) in zip(results, sizes):
+            direct = resampling.resize(self.image, width, height, 'fill')
+            difference = np.abs(np.asarray(result, dtype=np.int16) - np.asarray(direct, dtype=np.int16))
+            self.assertLessEqual(difference.max(), 6)
+
+    def test_resize_many_aligns_uneven_levels(self):
+        """Тест пирамиды при размере, не кратном уменьшению: уровни не сдвигают изображение"""
+        y, x = np.mgrid[0:601, 0:907]
+        image = Image.fromarray(np.stack([x * 255 // 906, y * 255 // 600,
+                                          128 + 100 * np.sin(x / 37) * np.cos(y / 23)], axis=-1).astype(np.uint8))
+        sizes = [(450, 450), (150, 150), (60, 60), (100, 67)]
+        for mode in ('fit', 'fill'):
+            results = resampling.resize_many(image, sizes, mode=mode)
+            for result, (width, height) in zip(results, sizes):
+                direct = resampling.resize(image, width, height, mode)
+                difference = np.abs(np.asarray(result, dtype=np.int16) - np.asarray(direct, dtype=np.int16))
+                self.assertLessEqual(difference.max(), 3)
+
+class TestPresets(unittest.TestCase):
+    """Модульные тесты для пресетов из файлов"""
+    
+    CONFIGS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "configs")
+    
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        self.image = Image.fromarray(rng.integers(0, 256, (60, 80, 3), dtype=np.uint8))
+        self.processor = ImageProcessor(history_file=None, presets_dir=self.CONFIGS_DIR)
+    
+    def test_bundled_presets_match_methods(self):
+        """Тест пресетов из configs: совпадают с соответствующими методами"""
+        self.assertIn("faded_film", self.processor.presets.names())
+        for preset, method in (("vintage", "apply_vintage"), ("warm_tone", "apply_warm_tone")):
+            expected = getattr(self.processor, method)(self.image)
+            result = self.processor.apply_preset(self.image, preset)
+            self.assertTrue(np.array_equal(np.asarray(result), np.asarray(expected)), preset)
+    
+    def test_reload_and_cache(self):
+        """Тест повторной компиляции измененного пресета и ключа кэша"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "look.json")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write('{"steps": [{"op": "brightness", "factor": 0.5}]}')
+            processor = ImageProcessor(history_file=None, cache=ResultCache(), presets_dir=temp_dir)
+            first = processor.apply_operation(self.image, "apply_preset", "look")
+            self.assertIs(processor.presets.get("look"), processor.presets.get("look"))
+            
+            with open(path, "w", encoding="utf-8") as f:
+                f.write('{"steps": [{"op": "invert"}]}')
+            os.utime(path, ns=(1, 1))
+            second = processor.apply_operation(self.image, "apply_preset", "look")
+            self.assertTrue(np.array_equal(np.asarray(second), 255 - np.asarray(self.image)))
+            self.assertFalse(np.array_equal(np.asarray(first), np.asarray(second)))
+            
+            with self.assertRaises(ValueError):
+                presets.parse_preset({"steps": [{"op": "brightness"}]}, "broken")
+
+class TestStats(unittest.TestCase):
+    """Модульные тесты для статистики изображений"""
+    
+    def setUp(self):
+        rng = np.random.default_rng(11)
+        self.image = Image.fromarray((rng.integers(0, 256, (90, 120, 3)) * 0.6 + 30).astype(np.uint8))
+        self.processor = ImageProcessor(history_file=None)
+    
+    def test_histogram_pushed_through_lut(self):
+        """Тест переноса гистограмм через таблицу без прохода по пикселям"""
+        image_stats = stats.image_stats(self.image, cached=True)
+        self.assertIs(stats.image_stats(self.image, cached=True), image_stats)
+        self.assertIsNot(stats.image_stats(self.image), image_stats)
+        self.assertEqual(image_stats.count, 90 * 120)
+        self.assertEqual(image_stats.percentiles(100), [int(np.asarray(self.image)[..., c].max()) for c in range(3)])
+        
+        result = self.processor.apply_invert(self.processor.white_balance(self.image))
+        pushed = stats.image_stats(result, cached=True)
+        self.assertTrue(np.array_equal(pushed.histograms, np.asarray(result.histogram()).reshape(3, 256)))
+        self.assertAlmostEqual(pushed.means()[0], np.asarray(result)[..., 0].mean())
+    
+    def test_in_place_edits_not_stale(self):
+        """Тест операций после изменения изображения на месте: статистика считается заново"""
+        image = self.image.copy()
+        stats.image_stats(image, cached=True)
+        image.paste((250, 10, 10), (0, 0, 120, 45))
+        fresh = image.copy()
+        self.assertEqual(self.processor.auto_contrast(image).tobytes(), self.processor.auto_contrast(fresh).tobytes())
+        self.assertEqual(self.processor.white_balance(image, sample_pixels=None).tobytes(),
+                         self.processor.white_balance(fresh, sample_pixels=None).tobytes())
+    
+    def test_autocontrast_matches_imageops(self):
+        """Тест автоконтраста и черной точки по кэшированным гистограммам"""
+        for image in (self.image, self.image.convert('L')):
+            self.assertTrue(np.array_equal(np.asarray(self.processor.auto_contrast(image)),
+                                           np.asarray(ImageOps.autocontrast(image.convert('RGB')))))
+            self.assertTrue(np.array_equal(np.asarray(self.processor.black_point(image)),
+                                           np.asarray(ImageOps.autocontrast(image.convert('RGB'), cutoff=2))))
+
+class TestWatch(unittest.TestCase):
+    """Модульные тесты для наблюдения за каталогами"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.input_dir = os.path.join(self.temp_dir.name, "incoming")
+        self.output_dir = os.path.join(self.temp_dir.name, "output")
+        os.makedirs(self.input_dir)
+        Image.new('RGB', (40, 30), color='red').save(os.path.join(self.input_dir, "existing.png"))
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def _run(self, service, done, timeout=30):
+        thread = threading.Thread(target=service.run)
+        thread.start()
+        try:
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline and not done():
+                time.sleep(0.05)
+        finally:
+            service.stop()
+            thread.join()
+    
+    def _upload(self, name):
+        # Загрузка пишется во временный скрытый файл и переименовывается
+        part = os.path.join(self.input_dir, f".{name}.part")
+        Image.new('RGB', (40, 30), color='blue').save(part, format='PNG')
+        os.replace(part, os.path.join(self.input_dir, name))
+    
+    def test_new_files_processed_once(self):
+        """Тест обработки уже лежащих и новых файлов без повторов после перезапуска"""
+        operations = [batch.parse_operation("resize_image:20,15")]
+        for polling in (False, True):
+            with self.subTest(polling=polling):
+                service = WatchService([self.input_dir], self.output_dir, operations, workers=1,
+                                       poll_interval=0.05, polling=polling,
+                                       processor=ImageProcessor(history_file=None))
+                
+                def done():
+                    if service.processed == 1 and not os.path.exists(os.path.join(self.input_dir, "new.png")):
+                        self._upload("new.png")
+                    return service.processed + service.failed >= 2
+                
+                self._run(service, done)
+                self.assertEqual((service.processed, service.failed), (2, 0))
+                self.assertEqual(sorted(name for name in os.listdir(self.output_dir) if not name.startswith('.')),
+                                 ["existing.png", "new.png"])
+                with Image.open(os.path.join(self.output_dir, "new.png")) as result:
+                    self.assertEqual(result.size, (20, 15))
+                
+                restarted = WatchService([self.input_dir], self.output_dir, operations, workers=1,
+                                         poll_interval=0.05, polling=True,
+                                         processor=ImageProcessor(history_file=None))
+                self.assertEqual(len(restarted.ledger), 2)
+                self._run(restarted, lambda: False, timeout=0.5)
+                self.assertEqual(restarted.processed, 0)
+                os.remove(os.path.join(self.input_dir, "new.png"))
+                os.remove(service.ledger.path)
+
+    def test_failed_files_retried_until_limit(self):
+        """Тест повторных попыток для файлов с ошибкой"""
+        path = os.path.join(self.temp_dir.name, "ledger.jsonl")
+        signature = (os.path.join(self.input_dir, "broken.png"), 10, 1)
+        ledger = ProcessedLedger(path, max_attempts=2)
+        self.assertEqual(ledger.record_failure(signature, "ошибка"), 1)
+        self.assertNotIn(signature, ledger)
+        self.assertEqual(ProcessedLedger(path, max_attempts=2).attempts(signature), 1)
+        self.assertEqual(ledger.record_failure(signature, "ошибка"), 2)
+        self.assertIn(signature, ledger)
+        self.assertIn(signature, ProcessedLedger(path, max_attempts=2))
+        self.assertNotIn(signature, ProcessedLedger(path, max_attempts=3))
+
+    def test_service_retries_failed_file(self):
+        """Тест повторов в работающем сервисе: две ошибки, затем успех"""
+        path = os.path.join(self.input_dir, "broken.png")
+        Image.new('RGB', (40, 30), color='green').save(path)
+        with open(path, 'rb') as f:
+            valid = f.read()
+        mtime_ns = os.stat(path).st_mtime_ns
+
+        def rewrite(data):
+            # Размер и время изменения не меняются: для сервиса это тот же файл
+            with open(path, 'wb') as f:
+                f.write(data)
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+
+        rewrite(b'\0' * len(valid))
+        for polling in (False, True):
+            with self.subTest(polling=polling):
+                service = WatchService([self.input_dir], self.output_dir, [], workers=1, poll_interval=0.05,
+                                       polling=polling, max_attempts=3, retry_delay=0.5,
+                                       processor=ImageProcessor(history_file=None))
+
+                repaired = []
+                
+                def done():
+                    if service.failed == 2 and not repaired:
+                        rewrite(valid)
+                        repaired.append(True)
+                    return service.processed >= 2 or service.failed > 2
+
+                self._run(service, done)
+                self.assertEqual((service.processed, service.failed), (2, 2))
+                self.assertTrue(os.path.exists(os.path.join(self.output_dir, "broken.png")))
+                os.remove(service.ledger.path)
+                os.remove(os.path.join(self.output_dir, "broken.png"))
+                rewrite(b'\0' * len(valid))
+
+    def test_same_names_from_several_directories(self):
+        """Тест одноименных файлов из разных каталогов: результаты не перезаписываются"""
+        other_dir = os.path.join(self.temp_dir.name, "camera")
+        os.makedirs(other_dir)
+        Image.new('RGB', (40, 30), color='blue').save(os.path.join(other_dir, "existing.png"))
+        service = WatchService([self.input_dir, other_dir], self.output_dir, [], workers=1,
+                               poll_interval=0.05, polling=True, processor=ImageProcessor(history_file=None))
+        self._run(service, lambda: service.processed + service.failed >= 2)
+        self.assertEqual((service.processed, service.failed), (2, 0))
+        for directory, color in (("incoming", (255, 0, 0)), ("camera", (0, 0, 255))):
+            with Image.open(os.path.join(self.output_dir, directory, "existing.png")) as result:
+                self.assertEqual(result.getpixel((0, 0)), color)
+        with self.assertRaises(ValueError):
+            WatchService([self.input_dir, os.path.join(other_dir, "incoming")], self.output_dir, [])
+
+class TestWorkerPool(unittest.TestCase):
+    """Модульные тесты для постоянного пула процессов"""
+    
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = WorkerPool(2)
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+    
+    def setUp(self):
+        rng = np.random.default_rng(5)
+        self.image = Image.fromarray(rng.integers(0, 256, (60, 80, 4), dtype=np.uint8), 'RGBA')
+        self.processor = ImageProcessor(history_file=None)
+    
+    def test_shared_image_round_trip(self):
+        """Тест передачи пикселей через разделяемую память"""
+        arena = SharedArena(max_free=1)
+        try:
+            for mode in ('RGBA', 'RGB', 'L', 'F', '1', 'P'):
+                image = self.image.convert(mode)
+                block = arena.acquire(shared_size(image))
+                restored = read_shared(write_shared(image, block), block)
+                arena.release(block)
+                expected = image.convert('RGB') if mode == 'P' else image
+                self.assertEqual(restored.mode, expected.mode)
+                self.assertTrue(np.array_equal(np.asarray(restored), np.asarray(expected)))
+        finally:
+            arena.close()
+    
+    def test_process_matches_local(self):
+        """Тест обработки в пуле: результат совпадает с обработкой в текущем процессе"""
+        operations = [batch.parse_operation("apply_sepia"), batch.parse_operation("resize_image:40,30")]
+        results = self.pool.map([self.image, self.image.convert('L')], operations)
+        for source, result in zip([self.image, self.image.convert('L')], results):
+            expected = source
+            for name, args, kwargs in operations:
+                expected = self.processor.apply_operation(expected, name, *args, **kwargs)
+            self.assertTrue(np.array_equal(np.asarray(result), np.asarray(expected)))
+        with self.assertRaises(ValueError):
+            self.pool.process(self.image, [("resize_image", [0, 0], {})]).result()
+    
+    def test_run_batch_reuses_pool(self):
+        """Тест нескольких пакетов в одном пуле"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self.image.save(os.path.join(temp_dir, "a.png"))
+            for run in ("first", "second"):
+                summary = batch.run_batch([os.path.join(temp_dir, "a.png")], [batch.parse_operation("apply_invert")],
+                                          os.path.join(temp_dir, run), processor=self.processor, pool=self.pool)
+                self.assertEqual(summary["processed"], [os.path.join(temp_dir, run, "a.png")])
+
+class TestStartup(unittest.TestCase):
+    """Модульные тесты для легкого импорта"""
+    
+    def test_headless_import_is_light(self):
+        """Тест: импорт image_lib и создание процессора не грузят numpy и Qt и не трогают диск"""
+        import subprocess
+        src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        code = ("import sys\nfrom image_lib import ImageProcessor\nImageProcessor()\n"
+                "print(sorted(m for m in ('numpy', 'PyQt6', 'image_lib.workers') if m in sys.modules))")
+        with tempfile.TemporaryDirectory() as temp_dir:
+            completed = subprocess.run([sys.executable, '-c', code], cwd=temp_dir, capture_output=True, text=True,
+                                       env=dict(os.environ, PYTHONPATH=src_dir), check=True)
+            self.assertEqual(completed.stdout.strip(), "[]")
+            self.assertEqual(os.listdir(temp_dir), [])
+    
+    def test_lazy_module(self):
+        """Тест ленивого модуля: загружается при первом обращении к атрибуту"""
+        from image_lib.lazy import lazy_import
+        module = lazy_import('.stats', 'image_lib')
+        self.assertIs(module.ImageStats, stats.ImageStats)
+        import image_lib
+        self.assertIs(image_lib.WorkerPool, WorkerPool)
 
 if __name__ == '__main__':
     unittest.main()
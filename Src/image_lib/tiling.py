@@ -0,0 +1,239 @@
+import logging
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from . import color_engine, filters
+from .image_processor import ImageProcessor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+
+# Сколько копий полосы одновременно живет при обработке (PIL хранит RGB в 4 байтах,
+# плюс входной и выходной массивы и промежуточные результаты операций)
+_STRIP_COPIES = 8
+
+# Поточечные операции: результат пикселя зависит только от него самого
+POINTWISE_OPERATIONS = (
+    'adjust_brightness', 'adjust_saturation',
+    'apply_grayscale', 'apply_invert', 'apply_sepia',
+    'apply_color_matrix', 'apply_color_preset',
+    'apply_warm_tone', 'apply_cool_tone', 'apply_vintage',
+    'blue_tone', 'skin_tone_enhance', 'vibrance'
+)
+
+
+def _blur_halo(args, kwargs) -> int:
+    params = dict(zip(('radius', 'method'), args), **kwargs)
+    if params.get('radius') is None:
+        return 2
+    return filters.blur_halo(params['radius'], params.get('method', 'gaussian'))
+
+
+def _sharpen_halo(args, kwargs) -> int:
+    radius = args[0] if args else kwargs.get('radius')
+    return 1 if radius is None else filters.blur_halo(radius)
+
+
+# Фильтры с ядром: сколько соседних строк нужно с каждой стороны полосы
+# (число или функция от параметров операции)
+KERNEL_OPERATIONS = {
+    'apply_blur': _blur_halo,
+    'apply_sharpen': _sharpen_halo,
+    'apply_emboss': 1
+}
+
+# Операции, которым нужна статистика всего изображения; она собирается
+# отдельным проходом по полосам
+STATISTICS_OPERATIONS = ('adjust_contrast',)
+
+
+def operations_halo(operations) -> int:
+    """Сколько соседних строк нужно полосе для цепочки фильтров с ядром"""
+    halo = 0
+    for name, args, kwargs in operations:
+        extent = KERNEL_OPERATIONS.get(name, 0)
+        halo += extent(args, kwargs) if callable(extent) else extent
+    return halo
+
+
+def contrast_point(args, kwargs, histogram) -> tuple:
+    """
+    Контраст как поточечная операция: среднее берется из гистограммы L
+    всего изображения, как в ImageEnhance.Contrast
+    """
+    factor = args[0] if args else kwargs['factor']
+    if factor < 0:
+        raise ValueError("Коэффициент контраста не может быть отрицательным")
+    # Таблица одна для всех цветовых каналов; под режим полосы она
+    # раскладывается в apply_operations
+    lut = color_engine.contrast_luts(color_engine.mean_luminance(histogram), factor)[0]
+    return '_point', [lut.tolist()], {}
+
+
+def _band_table(image: Image.Image, lut: list) -> list:
+    # Таблица для Image.point на каждый канал; альфа-канал не меняется, как в ImageEnhance
+    return [v for band in image.getbands() for v in (range(256) if band == 'A' else lut)]
+
+
+def apply_operations(processor: ImageProcessor, image: Image.Image, operations: list) -> Image.Image:
+    """Применяет к полосе цепочку операций, в том числе подготовленные таблицы '_point'"""
+    for name, args, kwargs in operations:
+        if name == '_point':
+            image = image.point(_band_table(image, *args))
+        else:
+            image = processor.apply_operation(image, name, *args, **kwargs)
+    return image
+
+
+# ===== РАСТРЫ НА ДИСКЕ =====
+def open_raster(path: str) -> np.ndarray:
+    """
+    Открывает несжатый RGB-растр как отображение в память формы (H, W, 3):
+    .npy, бинарный PPM (P6) или файл, который Pillow читает без декодера
+    (например, несжатый TIFF)
+    """
+    lower = path.lower()
+    if lower.endswith('.npy'):
+        raster = np.load(path, mmap_mode='r')
+        if raster.ndim != 3 or raster.shape[2] != 3 or raster.dtype != np.uint8:
+            raise ValueError(f"Ожидается массив uint8 формы (H, W, 3): {path}")
+        return raster
+    if lower.endswith(('.ppm', '.pnm')):
+        offset, width, height = _read_ppm_header(path)
+    else:
+        offset, width, height = _raw_layout(path)
+    return np.memmap(path, dtype=np.uint8, mode='r', offset=offset, shape=(height, width, 3))
+
+
+def create_raster(path: str, width: int, height: int) -> np.ndarray:
+    """Создает на диске RGB-растр (.npy или бинарный PPM) и отображает его в память"""
+    lower = path.lower()
+    if lower.endswith('.npy'):
+        return np.lib.format.open_memmap(path, mode='w+', dtype=np.uint8, shape=(height, width, 3))
+    if lower.endswith(('.ppm', '.pnm')):
+        header = f"P6\n{width} {height}\n255\n".encode('ascii')
+        with open(path, 'wb') as f:
+            f.write(header)
+            f.truncate(len(header) + width * height * 3)
+        return np.memmap(path, dtype=np.uint8, mode='r+', offset=len(header), shape=(height, width, 3))
+    raise ValueError(f"Поддерживается запись только в .npy и .ppm: {path}")
+
+
+def _read_ppm_header(path: str) -> Tuple[int, int, int]:
+    with open(path, 'rb') as f:
+        data = f.read(1024)
+
+    tokens, pos = [], 0
+    while len(tokens) < 4:
+        while pos < len(data) and data[pos:pos + 1].isspace():
+            pos += 1
+        if data[pos:pos + 1] == b'#':
+            pos = data.index(b'\n', pos)
+            continue
+        start = pos
+        while pos < len(data) and not data[pos:pos + 1].isspace():
+            pos += 1
+        tokens.append(data[start:pos])
+
+    if tokens[0] != b'P6' or int(tokens[3]) != 255:
+        raise ValueError(f"Поддерживаются только 8-битные PPM (P6): {path}")
+    # После maxval стоит ровно один пробельный символ
+    return pos + 1, int(tokens[1]), int(tokens[2])
+
+
+def _raw_layout(path: str) -> Tuple[int, int, int]:
+    with Image.open(path) as image:
+        width, height = image.size
+        tiles = sorted(image.tile, key=lambda tile: tile[1][1])
+        mode = image.mode
+
+    if not tiles:
+        raise ValueError(f"Файл нельзя читать полосами: {path}")
+    expected_offset = tiles[0][2]
+    for codec, box, offset, args in tiles:
+        rawmode = args[0] if isinstance(args, tuple) else args
+        if (mode != 'RGB' or codec != 'raw' or rawmode != 'RGB'
+                or box[0] != 0 or box[2] != width or offset != expected_offset):
+            raise ValueError(f"Файл нельзя читать полосами (сжатие или нестандартная раскладка): {path}")
+        expected_offset += (box[3] - box[1]) * width * 3
+    return tiles[0][2], width, height
+
+
+# ===== ОБРАБОТКА ПОЛОСАМИ =====
+class TiledProcessor:
+    """
+    Обработка изображений больше доступной памяти: растр читается и пишется
+    полосами через отображение файлов в память. Фильтры с ядром получают
+    перекрытие (halo) соседних строк, поэтому результат совпадает с обработкой
+    целого изображения
+    """
+
+    def __init__(self, processor: Optional[ImageProcessor] = None,
+                 memory_budget: int = DEFAULT_MEMORY_BUDGET, tile_rows: Optional[int] = None):
+        self.processor = processor or ImageProcessor()
+        # Полосы обрабатываются без записи в историю: она ведется одной записью на файл
+        self._strip_processor = ImageProcessor(history_file=None)
+        self.memory_budget = memory_budget
+        self.tile_rows = tile_rows
+
+    def process(self, src_path: str, dst_path: str, operations: list) -> None:
+        """
+        Применяет цепочку операций [(имя, args, kwargs), ...] к растру src_path
+        и записывает результат в dst_path
+        """
+        operations = [self._check_operation(op) for op in operations]
+        names = [name for name, _, _ in operations]
+        src = open_raster(src_path)
+        height, width = src.shape[:2]
+        tile_rows = self._tile_rows(width)
+
+        # Статистика для контраста считается по результату предыдущих шагов
+        for i, (name, args, kwargs) in enumerate(operations):
+            if name in STATISTICS_OPERATIONS:
+                histogram = np.zeros(256, dtype=np.int64)
+                for _, strip in self._iter_strips(src, operations[:i], tile_rows):
+                    histogram += np.asarray(strip.convert('L').histogram(), dtype=np.int64)
+                operations[i] = contrast_point(args, kwargs, histogram.tolist())
+
+        dst = create_raster(dst_path, width, height)
+        for top, strip in self._iter_strips(src, operations, tile_rows):
+            dst[top:top + strip.height] = np.asarray(strip)
+        dst.flush()
+        del dst
+
+        self.processor._log_operation("process_tiled", {
+            "file_path": src_path,
+            "output_path": dst_path,
+            "operations": names
+        })
+        logger.info(f"Обработано полосами: {src_path} -> {dst_path} ({width}x{height}, по {tile_rows} строк)")
+
+    def _check_operation(self, operation):
+        name, args, kwargs = operation
+        if name not in POINTWISE_OPERATIONS + STATISTICS_OPERATIONS + tuple(KERNEL_OPERATIONS):
+            raise ValueError(f"Операция {name} не поддерживается при обработке полосами")
+        return name, list(args), dict(kwargs)
+
+    def _tile_rows(self, width: int) -> int:
+        if self.tile_rows:
+            return self.tile_rows
+        return max(1, self.memory_budget // (width * 4 * _STRIP_COPIES))
+
+    def _iter_strips(self, src: np.ndarray, operations: list, tile_rows: int) -> Iterator[Tuple[int, Image.Image]]:
+        height = src.shape[0]
+        halo = operations_halo(operations)
+
+        for top in range(0, height, tile_rows):
+            bottom = min(height, top + tile_rows)
+            read_top = max(0, top - halo)
+            read_bottom = min(height, bottom + halo)
+
+            strip = Image.fromarray(np.ascontiguousarray(src[read_top:read_bottom]))
+            strip = apply_operations(self._strip_processor, strip, operations)
+
+            if read_top != top or read_bottom != bottom:
+                strip = strip.crop((0, top - read_top, strip.width, bottom - read_top))
+            yield top, strip
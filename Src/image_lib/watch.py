@@ -0,0 +1,394 @@
+import ctypes
+import hashlib
+import json
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from . import batch
+from .image_processor import ImageProcessor, SUPPORTED_EXTENSIONS
+
+if TYPE_CHECKING:
+    from .workers import WorkerPool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL = 1.0
+
+# Имя журнала обработанных файлов в каталоге результатов
+LEDGER_NAME = '.processed.jsonl'
+
+# Сколько раз пробовать обработать файл, который завершается ошибкой,
+# и через сколько секунд повторять попытку
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_RETRY_DELAY = 5.0
+
+# Флаги и события inotify (linux/inotify.h)
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_Q_OVERFLOW = 0x00004000
+_IN_ISDIR = 0x40000000
+_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_TO
+_EVENT_HEADER = struct.Struct('iIII')
+_READ_BUFFER = 64 * 1024
+
+
+def _is_candidate(name: str) -> bool:
+    # Скрытые файлы - обычно недокачанные загрузки (.photo.jpg.part и т.п.)
+    return not name.startswith('.') and name.lower().endswith(SUPPORTED_EXTENSIONS)
+
+
+def scan_directories(directories: List[str]) -> List[str]:
+    paths = []
+    for directory in directories:
+        with os.scandir(directory) as entries:
+            paths.extend(entry.path for entry in entries if entry.is_file() and _is_candidate(entry.name))
+    return sorted(paths)
+
+
+# ===== НАБЛЮДЕНИЕ ЗА КАТАЛОГАМИ =====
+def _load_libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.inotify_init1, libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class InotifyWatcher:
+    """
+    Наблюдение через inotify (Linux): файл сообщается, когда писатель закрыл
+    его (IN_CLOSE_WRITE) или переместил в каталог (IN_MOVED_TO)
+    """
+
+    def __init__(self, directories: List[str]):
+        libc = _load_libc()
+        if libc is None:
+            raise OSError("inotify недоступен на этой системе")
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._directories = {}
+        for directory in directories:
+            wd = libc.inotify_add_watch(self._fd, os.fsencode(directory), _WATCH_MASK)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                self.close()
+                raise OSError(errno, os.strerror(errno), directory)
+            self._directories[wd] = directory
+
+    def poll(self, timeout: float) -> Tuple[List[str], bool]:
+        """Готовые файлы и признак переполнения очереди событий (нужно пересканировать каталоги)"""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return [], False
+        try:
+            data = os.read(self._fd, _READ_BUFFER)
+        except BlockingIOError:
+            return [], False
+
+        paths, overflowed = [], False
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length].rstrip(b'\0'))
+            offset += _EVENT_HEADER.size + length
+            if mask & _IN_Q_OVERFLOW:
+                overflowed = True
+            elif not mask & _IN_ISDIR and wd in self._directories and _is_candidate(name):
+                paths.append(os.path.join(self._directories[wd], name))
+        return paths, overflowed
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher:
+    """
+    Наблюдение опросом каталогов. Файл сообщается, когда его размер и время
+    изменения не поменялись между двумя опросами, то есть загрузка закончилась.
+    Файлы, которые уже лежали в каталогах при создании, не сообщаются, пока
+    не изменятся: их забирает начальное сканирование сервиса
+    """
+
+    def __init__(self, directories: List[str]):
+        self.directories = directories
+        self._previous = self._snapshot()
+        self._reported = dict(self._previous)
+
+    def _snapshot(self) -> dict:
+        current = {}
+        for path in scan_directories(self.directories):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            current[path] = (stat.st_size, stat.st_mtime_ns)
+        return current
+
+    def poll(self, timeout: float) -> Tuple[List[str], bool]:
+        time.sleep(timeout)
+        current = self._snapshot()
+
+        ready = [path for path, signature in current.items()
+                 if self._previous.get(path) == signature and self._reported.get(path) != signature]
+        # Помним только файлы, которые еще лежат в каталогах
+        self._reported = {path: signature for path, signature in self._reported.items() if path in current}
+        self._reported.update((path, current[path]) for path in ready)
+        self._previous = current
+        return ready, False
+
+    def close(self) -> None:
+        pass
+
+
+def create_watcher(directories: List[str], polling: bool = False):
+    """inotify, если он доступен; иначе опрос каталогов"""
+    if not polling:
+        try:
+            return InotifyWatcher(directories)
+        except OSError as e:
+            logger.warning(f"inotify недоступен ({e}), каталоги будут опрашиваться")
+    return PollingWatcher(directories)
+
+
+# ===== ЖУРНАЛ ОБРАБОТАННЫХ ФАЙЛОВ =====
+class ProcessedLedger:
+    """
+    Журнал обработанных файлов (JSON Lines, только дозапись). Файл считается
+    обработанным по пути, размеру и времени изменения, поэтому замененный
+    файл обрабатывается заново. Ошибки записываются с номером попытки:
+    файл не считается обработанным, пока попыток меньше max_attempts, и
+    после перезапуска сервиса пробуется снова. В памяти хранятся только
+    8-байтные отпечатки
+    """
+
+    def __init__(self, path: str, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        if max_attempts < 1:
+            raise ValueError("Число попыток должно быть положительным")
+        self.path = path
+        self.max_attempts = max_attempts
+        # Обработанные файлы и файлы, исчерпавшие попытки
+        self._keys = set()
+        # Число неудачных попыток для файлов, которые еще будут пробоваться
+        self._failures = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Последняя строка могла не дописаться при аварийной остановке
+                        continue
+                    key = self._key(record["file_path"], record["size"], record["mtime_ns"])
+                    if record.get("status") == "failed":
+                        self._count_failure(key, record.get("attempts", self._failures.get(key, 0) + 1))
+                    else:
+                        self._keys.add(key)
+                        self._failures.pop(key, None)
+
+    @staticmethod
+    def _key(path: str, size: int, mtime_ns: int) -> bytes:
+        return hashlib.blake2b(f"{os.path.abspath(path)}|{size}|{mtime_ns}".encode(), digest_size=8).digest()
+
+    def __contains__(self, signature: tuple) -> bool:
+        return self._key(*signature) in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def attempts(self, signature: tuple) -> int:
+        """Число неудачных попыток обработать файл"""
+        return self._failures.get(self._key(*signature), 0)
+
+    def record(self, signature: tuple, **details) -> None:
+        """Отмечает файл обработанным"""
+        key = self._key(*signature)
+        with self._lock:
+            self._keys.add(key)
+            self._failures.pop(key, None)
+            self._append(signature, status="processed", **details)
+
+    def record_failure(self, signature: tuple, error: str) -> int:
+        """Записывает неудачную попытку; возвращает номер попытки"""
+        key = self._key(*signature)
+        with self._lock:
+            attempts = self._failures.get(key, 0) + 1
+            self._count_failure(key, attempts)
+            self._append(signature, status="failed", attempts=attempts, error=error)
+        return attempts
+
+    def _count_failure(self, key: bytes, attempts: int) -> None:
+        if attempts >= self.max_attempts:
+            self._keys.add(key)
+            self._failures.pop(key, None)
+        else:
+            self._failures[key] = attempts
+
+    def _append(self, signature: tuple, **details) -> None:
+        path, size, mtime_ns = signature
+        entry = {"file_path": os.path.abspath(path), "size": size, "mtime_ns": mtime_ns,
+                 "timestamp": datetime.now().isoformat(), **details}
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+# ===== СЕРВИС =====
+class WatchService:
+    """
+    Потоковая обработка каталогов загрузки: новые файлы проходят цепочку
+    операций в пуле процессов. Одновременно в работе не больше max_pending
+    файлов; когда пул занят, чтение событий приостанавливается, и они
+    копятся в очереди ядра (при ее переполнении каталоги сканируются заново).
+    Результаты пишутся атомарно (см. ImageProcessor.save_image), каждый
+    файл отмечается в журнале и повторно не обрабатывается; файл с ошибкой
+    ставится в очередь повторов и пробуется снова через retry_delay секунд,
+    всего до max_attempts раз (с учетом попыток до перезапуска).
+    При нескольких каталогах результаты каждого пишутся в подкаталог
+    output_dir с именем наблюдаемого каталога, чтобы одноименные файлы
+    из разных каталогов не перезаписывали друг друга
+    """
+
+    def __init__(self, directories: List[str], output_dir: str, operations: list,
+                 format: Optional[str] = None, workers: Optional[int] = None,
+                 ledger_path: Optional[str] = None, max_pending: Optional[int] = None,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL, polling: bool = False,
+                 save_options: Optional[dict] = None, sizes: Optional[List[tuple]] = None,
+                 resize_mode: str = 'fit', processor: Optional[ImageProcessor] = None,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS, retry_delay: float = DEFAULT_RETRY_DELAY):
+        self.directories = [os.path.abspath(directory) for directory in directories]
+        self.output_dir = os.path.abspath(output_dir)
+        if self.output_dir in self.directories:
+            raise ValueError("Каталог результатов не должен совпадать с наблюдаемым")
+        if len(self.directories) == 1:
+            self._output_dirs = {self.directories[0]: self.output_dir}
+        else:
+            self._output_dirs = {directory: os.path.join(self.output_dir, os.path.basename(directory))
+                                 for directory in self.directories}
+            if len(set(self._output_dirs.values())) != len(self.directories):
+                raise ValueError("Наблюдаемые каталоги должны называться по-разному: "
+                                 "их результаты пишутся в одноименные подкаталоги")
+        self.operations = operations
+        self.format = format
+        self.save_options = save_options
+        self.sizes = sizes
+        self.resize_mode = resize_mode
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 2
+        self.poll_interval = poll_interval
+        self.polling = polling
+        self.retry_delay = retry_delay
+        for directory in self._output_dirs.values():
+            os.makedirs(directory, exist_ok=True)
+        self.ledger = ProcessedLedger(ledger_path or os.path.join(self.output_dir, LEDGER_NAME), max_attempts)
+        self.processor = processor or ImageProcessor()
+        self.processed = 0
+        self.failed = 0
+        self._pending = set()
+        # Очередь повторов: (время повтора по time.monotonic, путь)
+        self._retries = []
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def run(self) -> None:
+        """Работает до вызова stop(); уже лежащие в каталогах файлы обрабатываются сразу"""
+        from .workers import WorkerPool
+        watcher = create_watcher(self.directories, self.polling)
+        logger.info(f"Наблюдение за {', '.join(self.directories)} ({type(watcher).__name__}), "
+                    f"в журнале {len(self.ledger)} файлов")
+        with WorkerPool(self.workers) as pool:
+            try:
+                self._submit_all(pool, scan_directories(self.directories))
+                while not self._stop.is_set():
+                    paths, overflowed = watcher.poll(self.poll_interval)
+                    if overflowed:
+                        logger.warning("Очередь событий переполнена, каталоги сканируются заново")
+                        paths = scan_directories(self.directories)
+                    self._submit_all(pool, paths + self._due_retries())
+            finally:
+                watcher.close()
+        logger.info(f"Наблюдение остановлено: обработано {self.processed}, ошибок {self.failed}")
+
+    def _due_retries(self) -> List[str]:
+        now = time.monotonic()
+        with self._lock:
+            due = [path for when, path in self._retries if when <= now]
+            self._retries = [(when, path) for when, path in self._retries if when > now]
+        return due
+
+    def _submit_all(self, pool: 'WorkerPool', paths: List[str]):
+        for path in paths:
+            if self._stop.is_set():
+                return
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            signature = (path, stat.st_size, stat.st_mtime_ns)
+            with self._lock:
+                if path in self._pending or signature in self.ledger:
+                    continue
+                self._pending.add(path)
+            # Обратное давление: ждем свободного места в пуле
+            while not self._slots.acquire(timeout=self.poll_interval):
+                if self._stop.is_set():
+                    with self._lock:
+                        self._pending.discard(path)
+                    return
+            future = pool.run(batch.process_file, path, self.operations, self._output_dirs[os.path.dirname(path)],
+                              self.format, self.save_options, self.sizes, self.resize_mode)
+            future.add_done_callback(lambda future, signature=signature: self._finished(signature, future))
+
+    def _finished(self, signature: tuple, future):
+        path = signature[0]
+        retry = False
+        try:
+            output_paths = future.result()
+        except BrokenProcessPool as e:
+            # Рабочий процесс аварийно завершился: файл не отмечается и
+            # будет обработан после перезапуска сервиса
+            logger.error(f"Пул процессов остановлен при обработке {path}: {e}")
+            with self._lock:
+                self.failed += 1
+            self.stop()
+        except Exception as e:
+            attempts = self.ledger.record_failure(signature, str(e))
+            logger.error(f"Ошибка обработки {path} (попытка {attempts} из {self.ledger.max_attempts}): {e}")
+            retry = attempts < self.ledger.max_attempts
+            with self._lock:
+                self.failed += 1
+        else:
+            self.ledger.record(signature, output_paths=output_paths)
+            with self._lock:
+                self.processed += 1
+            self.processor._log_operation("watch_process", {
+                "file_path": path,
+                "output_paths": output_paths,
+                "operations": [name for name, _, _ in self.operations]
+            })
+        finally:
+            # Повтор ставится под той же блокировкой, что и снятие отметки
+            # "в работе", иначе цикл мог бы пропустить его как еще не завершенный
+            with self._lock:
+                self._pending.discard(path)
+                if retry:
+                    self._retries.append((time.monotonic() + self.retry_delay, path))
+            self._slots.release()
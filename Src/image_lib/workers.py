@@ -0,0 +1,244 @@
+import functools
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from . import presets
+from .cache import ResultCache
+from .image_processor import ImageProcessor
+
+logger = logging.getLogger(__name__)
+
+# Процессор рабочего процесса; создается один раз в initializer пула
+_worker_processor = None
+
+# Файлы процессов разные, поэтому в памяти хранятся лишь промежуточные шаги
+# текущего файла; повторные запуски обслуживает дисковый уровень кэша
+_WORKER_CACHE_BYTES = 64 * 1024 * 1024
+
+# Сколько блоков разделяемой памяти рабочий процесс держит подключенными
+_ATTACHED_BLOCKS = 4
+_attached = OrderedDict()
+
+
+# ===== ПЕРЕДАЧА ПИКСЕЛЕЙ ЧЕРЕЗ РАЗДЕЛЯЕМУЮ ПАМЯТЬ =====
+class SharedImage:
+    """
+    Описание изображения в блоке разделяемой памяти. Между процессами
+    передается только оно (имя блока, форма, тип, режим), а не пиксели
+    """
+
+    def __init__(self, name: str, shape: tuple, dtype: str, mode: str, info: dict):
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+        self.mode = mode
+        self.info = info
+
+
+def _shareable(image: Image.Image) -> Image.Image:
+    if image.mode == 'P':
+        # Палитра в массив не попадает: передаются уже цвета
+        return image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    return image
+
+
+@functools.lru_cache(maxsize=None)
+def _pixel_layout(mode: str) -> Tuple[tuple, np.dtype]:
+    probe = np.asarray(Image.new(mode, (1, 1)))
+    return probe.shape[2:], probe.dtype
+
+
+def shared_size(image: Image.Image) -> int:
+    """Сколько байт займет изображение в блоке разделяемой памяти"""
+    channels, dtype = _pixel_layout(_shareable(image).mode)
+    return image.width * image.height * int(np.prod(channels, dtype=int)) * dtype.itemsize
+
+
+def write_shared(image: Image.Image, block: shared_memory.SharedMemory) -> SharedImage:
+    """Копирует пиксели в начало блока через представление NumPy; блок должен вмещать shared_size"""
+    image = _shareable(image)
+    array = np.asarray(image)
+    np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+    info = {key: value for key, value in image.info.items() if isinstance(value, (int, float, str, bytes, tuple))}
+    return SharedImage(block.name, array.shape, array.dtype.str, image.mode, info)
+
+
+def read_shared(shared: SharedImage, block: shared_memory.SharedMemory) -> Image.Image:
+    """Копия изображения из блока: блок после чтения можно переиспользовать"""
+    view = np.ndarray(shared.shape, np.dtype(shared.dtype), buffer=block.buf)
+    image = Image.fromarray(view)
+    # fromarray может ссылаться на буфер блока, а блок будет перезаписан
+    if image.readonly:
+        image = image.copy()
+    del view
+    if image.mode != shared.mode:
+        image = image.convert(shared.mode)
+    image.info.update(shared.info)
+    return image
+
+
+class SharedArena:
+    """
+    Переиспользуемые блоки разделяемой памяти. Новый блок при первой
+    записи платит за выделение страниц, поэтому блоки не удаляются после
+    задачи, а возвращаются в запас (не больше max_free)
+    """
+
+    def __init__(self, max_free: int):
+        self.max_free = max_free
+        self._free = []
+        self._lock = threading.Lock()
+
+    def acquire(self, size: int) -> shared_memory.SharedMemory:
+        with self._lock:
+            fitting = [block for block in self._free if block.size >= size]
+            if fitting:
+                block = min(fitting, key=lambda block: block.size)
+                self._free.remove(block)
+                return block
+        return shared_memory.SharedMemory(create=True, size=max(1, size))
+
+    def adopt(self, name: str) -> shared_memory.SharedMemory:
+        """Блок, созданный рабочим процессом, переходит в запас пула"""
+        return shared_memory.SharedMemory(name=name)
+
+    def release(self, block: shared_memory.SharedMemory) -> None:
+        with self._lock:
+            self._free.append(block)
+            if len(self._free) <= self.max_free:
+                return
+            # Лишним становится самый маленький блок: большие дороже создавать заново
+            block = min(self._free, key=lambda block: block.size)
+            self._free.remove(block)
+        _destroy(block)
+
+    def close(self) -> None:
+        with self._lock:
+            blocks, self._free = self._free, []
+        for block in blocks:
+            _destroy(block)
+
+
+def _destroy(block: shared_memory.SharedMemory) -> None:
+    block.close()
+    try:
+        block.unlink()
+    except FileNotFoundError:
+        pass
+
+
+# ===== РАБОЧИЕ ПРОЦЕССЫ =====
+def _init_worker(cache_dir=None, presets_dir=presets.DEFAULT_PRESETS_DIR):
+    global _worker_processor
+    # Рабочие процессы не пишут историю: ее ведет родительский процесс
+    cache = ResultCache(_WORKER_CACHE_BYTES, disk_dir=cache_dir) if cache_dir else None
+    _worker_processor = ImageProcessor(history_file=None, cache=cache, presets_dir=presets_dir)
+    # Пресеты компилируются заранее, а не при первой задаче
+    for name in _worker_processor.presets.names():
+        try:
+            _worker_processor.presets.get(name)
+        except ValueError as e:
+            logger.warning(f"Пресет {name} не загружен: {e}")
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    # Блоки пула переиспользуются, поэтому последние подключенные остаются
+    # отображенными в рабочем процессе
+    block = _attached.pop(name, None)
+    if block is None:
+        block = shared_memory.SharedMemory(name=name)
+    _attached[name] = block
+    while len(_attached) > _ATTACHED_BLOCKS:
+        _attached.pop(next(iter(_attached))).close()
+    return block
+
+
+def _call_in_worker(function, args):
+    return function(_worker_processor, *args)
+
+
+def _process_shared(shared: SharedImage, operations: list) -> SharedImage:
+    block = _attach(shared.name)
+    image = read_shared(shared, block)
+    for name, args, kwargs in operations:
+        image = _worker_processor.apply_operation(image, name, *args, **kwargs)
+    size = shared_size(image)
+    if size > block.size:
+        # Результат не помещается во входной блок: новый блок забирает родительский процесс
+        block = shared_memory.SharedMemory(create=True, size=size)
+        _attached[block.name] = block
+    return write_shared(image, block)
+
+
+class WorkerPool:
+    """
+    Постоянный пул процессов: у каждого процесса свой ImageProcessor с
+    заранее загруженными пресетами, и он переиспользуется между задачами и
+    пакетами. Изображения передаются через разделяемую память: результат
+    пишется в блок исходного изображения, а блоки переиспользуются между
+    задачами, поэтому межпроцессные расходы сводятся к копированию пикселей
+    """
+
+    def __init__(self, workers: Optional[int] = None, cache_dir: Optional[str] = None,
+                 presets_dir: str = presets.DEFAULT_PRESETS_DIR):
+        self.workers = workers or os.cpu_count() or 1
+        self._arena = SharedArena(max_free=self.workers * 2)
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                             initargs=(cache_dir, presets_dir))
+
+    def run(self, function: Callable, *args) -> Future:
+        """
+        Выполняет function(processor, *args) в рабочем процессе.
+        function должна быть функцией уровня модуля (передается по имени)
+        """
+        return self._executor.submit(_call_in_worker, function, args)
+
+    def process(self, image: Image.Image, operations: list) -> Future:
+        """Применяет цепочку операций [(имя, args, kwargs), ...]; Future возвращает Image"""
+        block = self._arena.acquire(shared_size(image))
+        try:
+            shared = write_shared(image, block)
+            future = self._executor.submit(_process_shared, shared, operations)
+        except BaseException:
+            self._arena.release(block)
+            raise
+        result = Future()
+        future.add_done_callback(lambda done: self._collect(block, done, result))
+        return result
+
+    def map(self, images: List[Image.Image], operations: list) -> List[Image.Image]:
+        return [future.result() for future in [self.process(image, operations) for image in images]]
+
+    def close(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+        self._arena.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _collect(self, block: shared_memory.SharedMemory, done: Future, result: Future):
+        # Результат сразу забирается из разделяемой памяти, чтобы блок
+        # вернулся в запас, даже если вызывающий не читает Future
+        try:
+            output = done.result()
+            if output.name != block.name:
+                self._arena.release(block)
+                block = self._arena.adopt(output.name)
+            image = read_shared(output, block)
+        except BaseException as e:
+            result.set_exception(e)
+        else:
+            result.set_result(image)
+        finally:
+            self._arena.release(block)
@@ -3,7 +3,6 @@ import os
 import logging
 import traceback
 from pathlib import Path
-from PyQt6.QtWidgets import QApplication
 
 def create_directories():
     directories = ['logs', 'configs', 'output']
@@ -26,6 +25,8 @@ def main():
     logger.info("=== ЗАПУСК ПРИЛОЖЕНИЯ ===")
     
     try:
+        # Qt загружается только при запуске интерфейса: image_lib и CLI работают без него
+        from PyQt6.QtWidgets import QApplication
         app = QApplication(sys.argv)
         
         from ui.main_window import MainWindow
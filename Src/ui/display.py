@@ -0,0 +1,84 @@
+from PIL import Image
+from PyQt6.QtGui import QImage, QPixmap
+
+from image_lib.lazy import lazy_import
+
+# numpy загружается при первом показе изображения, а не при запуске
+np = lazy_import('numpy')
+
+DISPLAY_SIZE = (400, 300)
+
+HISTOGRAM_SIZE = (256, 80)
+
+_HISTOGRAM_BACKGROUND = 245
+# На сколько темнеют чужие каналы там, где столбец канала закрашен
+_HISTOGRAM_SHADE = 90
+
+
+class DisplayBridge:
+    """
+    Готовит QPixmap для показа изображения в метке. Изображение сначала
+    уменьшается до размера метки средствами Pillow, и только потом
+    преобразуется в RGB и копируется в буфер, который переиспользуется
+    между кадрами. Память на кадр пропорциональна размеру метки
+    """
+
+    def __init__(self, width: int = DISPLAY_SIZE[0], height: int = DISPLAY_SIZE[1]):
+        self.width = width
+        self.height = height
+        self._buffers = {}
+
+    def fit_size(self, width: int, height: int) -> tuple:
+        scale = min(self.width / width, self.height / height)
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+    def to_pixmap(self, image: Image.Image, key=None) -> QPixmap:
+        size = self.fit_size(image.width, image.height)
+        if image.size != size:
+            # reducing_gap сначала сжимает изображение целочисленным усреднением
+            image = image.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+
+        if image.mode == "RGBA":
+            channels, qformat = 4, QImage.Format.Format_RGBA8888
+        else:
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            channels, qformat = 3, QImage.Format.Format_RGB888
+
+        width, height = image.size
+        buffer = self._buffers.get(key)
+        if buffer is None or buffer.shape != (height, width, channels):
+            buffer = np.empty((height, width, channels), dtype=np.uint8)
+            self._buffers[key] = buffer
+        buffer[...] = np.asarray(image)
+
+        # Строки буфера не выровнены на 4 байта, поэтому шаг строки передается явно
+        qimage = QImage(buffer.data, width, height, width * channels, qformat)
+        return QPixmap.fromImage(qimage)
+
+
+def histogram_pixmap(image_stats, width: int = HISTOGRAM_SIZE[0], height: int = HISTOGRAM_SIZE[1]) -> QPixmap:
+    """
+    Гистограмма каналов (image_lib.stats.ImageStats) столбцами цвета канала;
+    для одноканальных изображений - серая. Масштаб по высоте задает самый
+    высокий столбец без крайних значений 0 и 255, которые часто обрезаны
+    """
+    histograms = image_stats.histograms[:3].astype(np.float64)
+    peak = histograms[:, 1:-1].max() or histograms.max() or 1.0
+    heights = np.minimum(height, np.round(histograms / peak * height)).astype(np.int64)
+    # Номер строки снизу вверх для каждой ячейки холста
+    rows = np.arange(height - 1, -1, -1)[:, None]
+
+    canvas = np.full((height, 256, 3), _HISTOGRAM_BACKGROUND, dtype=np.int16)
+    if len(heights) < 3:
+        canvas[rows < heights[0]] = 110
+    else:
+        for channel in range(3):
+            filled = rows < heights[channel]
+            for other in range(3):
+                if other != channel:
+                    canvas[..., other][filled] -= _HISTOGRAM_SHADE
+    buffer = np.ascontiguousarray(np.clip(canvas, 0, 255).astype(np.uint8))
+
+    qimage = QImage(buffer.data, 256, height, 256 * 3, QImage.Format.Format_RGB888).copy()
+    return QPixmap.fromImage(qimage).scaled(width, height)
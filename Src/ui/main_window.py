@@ -2,27 +2,75 @@ import sys
 import os
 import logging
 from datetime import datetime
-from PIL import Image, ImageEnhance, ImageOps, ImageFilter
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                             QPushButton, QSlider, QLabel, QFileDialog, 
                             QGroupBox, QTextEdit, QMessageBox, QFrame,
-                            QSpinBox)
+                            QSpinBox, QDoubleSpinBox, QComboBox, QProgressBar)
 from PyQt6.QtCore import Qt
-from PyQt6.QtGui import QPixmap, QImage, QFont, QPalette, QColor
+from PyQt6.QtGui import QFont, QPalette, QColor
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from image_lib.image_processor import ImageProcessor
+from image_lib.image_processor import ImageProcessor, normalize_format
+from image_lib.cache import ResultCache
+from image_lib.edit_history import EditHistory, scale_operation
+from image_lib import metrics, resampling
+from image_lib.lazy import lazy_import
+from ui.worker import ProcessingWorker
+from ui.display import DisplayBridge, histogram_pixmap
+
+# Модули на numpy нужны только после загрузки изображения: окно открывается без них
+pipeline = lazy_import('image_lib.pipeline')
+stats = lazy_import('image_lib.stats')
+
+# Размер уменьшенной копии, на которой слайдеры рисуют живой предпросмотр
+PREVIEW_MAX_SIZE = (800, 600)
+
+# Правка ведется на копии не меньше этого размера; полное разрешение
+# декодируется только при сохранении
+PROXY_SIZE = (1600, 1200)
+
+# Гистограмма строится по выборке не больше этого числа пикселей
+HISTOGRAM_SAMPLE_PIXELS = 1 << 18
+
+# Режимы изменения размера в интерфейсе: подпись -> режим resampling
+RESIZE_MODES = {
+    "Точно": 'exact',
+    "Вписать": 'fit',
+    "Заполнить": 'fill',
+}
+
+# Подпись шага истории правок, который хранит значения слайдеров
+ADJUSTMENT_STEP = "Корректировка"
+
+# Параметры кодировщиков при сохранении: PNG сжимается быстрее настройки
+# Pillow по умолчанию ценой чуть большего файла
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 92, 'optimize': True, 'progressive': True},
+    'PNG': {'compress_level': 3},
+    'WEBP': {'quality': 90, 'method': 4},
+}
 
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
-        self.processor = ImageProcessor()
+        # Кэш результатов: повторное переключение между фильтрами не пересчитывает их.
+        # Большие изображения обрабатываются полосами на всех ядрах
+        self.processor = ImageProcessor(cache=ResultCache(), workers=os.cpu_count())
         self.current_image = None
         self.original_image = None
         self.processed_image = None
+        self.preview_image = None  # Уменьшенная копия current_image для слайдеров
+        self.adjustments_pending = False  # Слайдеры изменены, полное разрешение не пересчитано
+        self.adjustments_generation = 0  # Счетчик движений слайдеров: какое значение уже применено
         self.functional_buttons = []
         self.user_actions = []  # История действий пользователя
+        self.edit_history = None  # История отмены и повтора правок
+        self.source_path = None  # Файл, из которого при сохранении читается полное разрешение
+        self.proxy_scale = 1.0  # Масштаб копии для правки относительно полного разрешения
+        self.worker = ProcessingWorker(self)
+        self.display_bridge = DisplayBridge()
         self.setup_ui()
+        self.worker.busy_changed.connect(self.progress_bar.setVisible)
         self.apply_styles()
         
     def setup_ui(self):
@@ -107,6 +155,14 @@ class MainWindow(QMainWindow):
         
         left_panel.addLayout(images_container)
         
+        # Индикатор фоновой обработки
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 0)
+        self.progress_bar.setMaximumHeight(8)
+        self.progress_bar.setTextVisible(False)
+        self.progress_bar.setVisible(False)
+        left_panel.addWidget(self.progress_bar)
+        
         # Блок информации об изображении (техническая информация)
         image_info_frame = QFrame()
         image_info_frame.setFrameStyle(QFrame.Shape.Box)
@@ -118,7 +174,7 @@ class MainWindow(QMainWindow):
         image_info_layout.addWidget(image_info_title)
         
         self.image_info_text = QTextEdit()
-        self.image_info_text.setMaximumHeight(80)
+        self.image_info_text.setMaximumHeight(110)
         self.image_info_text.setReadOnly(True)
         self.image_info_text.setStyleSheet("""
             QTextEdit {
@@ -132,6 +188,12 @@ class MainWindow(QMainWindow):
         """)
         image_info_layout.addWidget(self.image_info_text)
         
+        # Гистограмма каналов показанного результата
+        self.histogram_label = QLabel()
+        self.histogram_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.histogram_label.setFixedHeight(84)
+        image_info_layout.addWidget(self.histogram_label)
+        
         left_panel.addWidget(image_info_frame)
         
         # Блок информации о действиях пользователя (как в схеме задания)
@@ -226,7 +288,8 @@ class MainWindow(QMainWindow):
             ("Черно-белое", self.apply_grayscale),
             ("Сепия", self.apply_sepia),
             ("Инверсия", self.apply_invert),
-            ("Размытие", self.apply_blur)
+            ("Размытие", self.apply_blur),
+            ("Резкость", self.apply_sharpen)
         ]
         
         for text, func in func_buttons:
@@ -259,6 +322,31 @@ class MainWindow(QMainWindow):
             self.functional_buttons.append(btn)
         
         functions_layout.addLayout(func_buttons_layout)
+        
+        # Радиус размытия и резкости в пикселях полного разрешения
+        radius_layout = QHBoxLayout()
+        radius_label = QLabel("Радиус, px:")
+        radius_label.setFont(QFont("Segoe UI", 9))
+        radius_layout.addWidget(radius_label)
+        self.radius_spinbox = QDoubleSpinBox()
+        self.radius_spinbox.setRange(0.5, 200.0)
+        self.radius_spinbox.setSingleStep(0.5)
+        self.radius_spinbox.setValue(2.0)
+        self.radius_spinbox.setEnabled(False)
+        radius_layout.addWidget(self.radius_spinbox)
+        functions_layout.addLayout(radius_layout)
+        
+        # Пресеты из каталога configs: новые образы добавляются без изменения кода
+        preset_layout = QHBoxLayout()
+        self.preset_combo = QComboBox()
+        self.preset_combo.addItems(self.processor.presets.names())
+        self.preset_combo.setEnabled(False)
+        preset_layout.addWidget(self.preset_combo)
+        self.btn_preset = QPushButton("Пресет")
+        self.btn_preset.clicked.connect(self.apply_preset)
+        self.btn_preset.setEnabled(False)
+        preset_layout.addWidget(self.btn_preset)
+        functions_layout.addLayout(preset_layout)
         right_panel.addWidget(functions_group)
         
         # Настройки обработки
@@ -276,6 +364,7 @@ class MainWindow(QMainWindow):
         self.brightness_slider.setRange(0, 200)
         self.brightness_slider.setValue(100)
         self.brightness_slider.valueChanged.connect(self.apply_adjustments)
+        self.brightness_slider.sliderReleased.connect(self.commit_adjustments)
         self.brightness_slider.setEnabled(False)
         brightness_layout.addWidget(self.brightness_slider)
         
@@ -302,6 +391,7 @@ class MainWindow(QMainWindow):
         self.contrast_slider.setRange(0, 200)
         self.contrast_slider.setValue(100)
         self.contrast_slider.valueChanged.connect(self.apply_adjustments)
+        self.contrast_slider.sliderReleased.connect(self.commit_adjustments)
         self.contrast_slider.setEnabled(False)
         contrast_layout.addWidget(self.contrast_slider)
         
@@ -333,7 +423,7 @@ class MainWindow(QMainWindow):
         width_layout.addWidget(width_label)
         
         self.width_spinbox = QSpinBox()
-        self.width_spinbox.setRange(1, 5000)
+        self.width_spinbox.setRange(1, 50000)
         self.width_spinbox.setValue(800)
         self.width_spinbox.setEnabled(False)
         self.width_spinbox.setStyleSheet("""
@@ -354,7 +444,7 @@ class MainWindow(QMainWindow):
         height_layout.addWidget(height_label)
         
         self.height_spinbox = QSpinBox()
-        self.height_spinbox.setRange(1, 5000)
+        self.height_spinbox.setRange(1, 50000)
         self.height_spinbox.setValue(600)
         self.height_spinbox.setEnabled(False)
         self.height_spinbox.setStyleSheet(self.width_spinbox.styleSheet())
@@ -363,6 +453,11 @@ class MainWindow(QMainWindow):
         
         resize_layout.addLayout(resize_controls_layout)
         
+        self.resize_mode_combo = QComboBox()
+        self.resize_mode_combo.addItems(RESIZE_MODES)
+        self.resize_mode_combo.setEnabled(False)
+        resize_layout.addWidget(self.resize_mode_combo)
+        
         # Кнопка применения размера
         self.btn_resize = QPushButton("Применить размер")
         self.btn_resize.setStyleSheet("""
@@ -452,6 +547,12 @@ class MainWindow(QMainWindow):
         self.btn_undo.setEnabled(False)
         control_layout.addWidget(self.btn_undo)
         
+        self.btn_redo = QPushButton("Повторить (Redo)")
+        self.btn_redo.setStyleSheet(self.btn_undo.styleSheet())
+        self.btn_redo.clicked.connect(self.redo_action)
+        self.btn_redo.setEnabled(False)
+        control_layout.addWidget(self.btn_redo)
+        
         right_panel.addWidget(control_group)
         
         # Добавляем растягивающийся спейсер внизу
@@ -509,12 +610,22 @@ class MainWindow(QMainWindow):
         controls = [
             self.brightness_slider, self.contrast_slider,
             self.btn_save, self.btn_undo, self.btn_resize,
-            self.width_spinbox, self.height_spinbox
+            self.width_spinbox, self.height_spinbox, self.radius_spinbox, self.resize_mode_combo,
+            self.preset_combo, self.btn_preset
         ] + self.functional_buttons
         
         for control in controls:
             if control:
                 control.setEnabled(enabled)
+        if enabled:
+            self.update_history_buttons()
+        else:
+            self.btn_redo.setEnabled(False)
+    
+    def update_history_buttons(self):
+        history = self.edit_history
+        self.btn_undo.setEnabled(history is not None and history.can_undo())
+        self.btn_redo.setEnabled(history is not None and history.can_redo())
     
     def load_image(self):
         try:
@@ -523,29 +634,34 @@ class MainWindow(QMainWindow):
                 "Images (*.png *.jpg *.jpeg *.bmp *.tiff *.gif);;All Files (*)"
             )
             if file_path:
-                self.current_image = self.processor.load_image(file_path)
-                self.original_image = self.current_image.copy()
-                self.processed_image = self.current_image.copy()
+                self.worker.cancel()
+                # Изображения не изменяются на месте, поэтому копии не нужны
+                self.current_image = self.processor.load_image(file_path, target_size=PROXY_SIZE)
+                full_size = self.current_image.info.get("full_size", self.current_image.size)
+                self.source_path = file_path
+                self.proxy_scale = self.current_image.width / full_size[0]
+                self.original_image = self.current_image
+                self.processed_image = self.current_image
+                self.edit_history = EditHistory(self.processor, self.current_image,
+                                                scale=self.proxy_scale, full_size=full_size)
+                self.preview_image = self.processor.create_preview(self.current_image, *PREVIEW_MAX_SIZE)
+                self.adjustments_pending = False
                 
                 # Отображаем оба изображения
                 self.display_image(self.current_image, self.original_label)
                 self.display_image(self.processed_image, self.processed_label)
+                self.update_histogram(self.processed_image)
                 
                 # Обновляем техническую информацию
-                info = self.processor.get_image_info(self.current_image)
-                info_text = f"Ширина: {info['width']} px\n"
-                info_text += f"Высота: {info['height']} px\n"
-                info_text += f"Формат: {info['format']}\n"
-                info_text += f"Режим: {info['mode']}"
-                self.image_info_text.setText(info_text)
+                info = self.update_image_info(self.current_image)
                 
                 # Логируем действие
                 filename = os.path.basename(file_path)
                 self.log_action("Загружено изображение", f"'{filename}' ({info['width']}x{info['height']})")
                 
                 # Устанавливаем текущие размеры в спинбоксы
-                self.width_spinbox.setValue(self.current_image.width)
-                self.height_spinbox.setValue(self.current_image.height)
+                self.width_spinbox.setValue(info['width'])
+                self.height_spinbox.setValue(info['height'])
                 
                 # Активируем элементы управления
                 self.brightness_slider.setValue(100)
@@ -559,22 +675,72 @@ class MainWindow(QMainWindow):
             QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить изображение:\n{str(e)}")
     
     def apply_adjustments(self):
+        """Живой предпросмотр яркости и контраста на уменьшенной копии"""
         if self.current_image is None:
             return
         
-        try:
-            brightness = self.brightness_slider.value() / 100.0
-            contrast = self.contrast_slider.value() / 100.0
-            
-            self.brightness_value.setText(f"{brightness:.2f}")
-            self.contrast_value.setText(f"{contrast:.2f}")
-            
-            # Применяем корректировки к копии изображения для предпросмотра
-            self.processed_image = self.processor.adjust_brightness(self.current_image, brightness)
-            self.processed_image = self.processor.adjust_contrast(self.processed_image, contrast)
-            
-            # Отображаем результат в предпросмотре
-            self.display_image(self.processed_image, self.processed_label)
+        brightness = self.brightness_slider.value() / 100.0
+        contrast = self.contrast_slider.value() / 100.0
+        
+        self.brightness_value.setText(f"{brightness:.2f}")
+        self.contrast_value.setText(f"{contrast:.2f}")
+        
+        # Изображение для правки пересчитывается при отпускании слайдера или сохранении
+        preview_image = self.preview_image
+        # Гистограммы предпросмотра считаются один раз; слайдеры переносят их через таблицы
+        stats.image_stats(preview_image, HISTOGRAM_SAMPLE_PIXELS, cached=True)
+        self.adjustments_pending = True
+        self.adjustments_generation += 1
+        self.worker.submit(
+            lambda: pipeline.Pipeline().brightness(brightness).contrast(contrast).execute(preview_image),
+            self.show_adjusted_preview,
+            lambda message: self.show_error("Ошибка обработки", message)
+        )
+    
+    def show_adjusted_preview(self, preview):
+        self.display_image(preview, self.processed_label)
+        self.update_histogram(preview)
+    
+    def update_histogram(self, image):
+        if image.mode not in stats.HISTOGRAM_MODES:
+            image = image.convert('RGB')
+        image_stats = stats.image_stats(image, HISTOGRAM_SAMPLE_PIXELS, cached=True)
+        self.histogram_label.setPixmap(histogram_pixmap(image_stats, height=80))
+    
+    def commit_adjustments(self, on_committed=None):
+        """Применяет значения слайдеров к изображению для правки и записывает шаг в историю"""
+        if self.current_image is None or not self.adjustments_pending:
+            if on_committed is not None:
+                on_committed()
+            return
+        
+        brightness = self.brightness_slider.value() / 100.0
+        contrast = self.contrast_slider.value() / 100.0
+        generation = self.adjustments_generation
+        image = self.current_image
+        operations = []
+        if brightness != 1.0:
+            operations.append(("adjust_brightness", [brightness], {}))
+        if contrast != 1.0:
+            operations.append(("adjust_contrast", [contrast], {}))
+        
+        def process():
+            processed = image
+            for name, args, kwargs in operations:
+                processed = self.processor.apply_operation(processed, name, *args, **kwargs)
+            return processed
+        
+        def done(output):
+            processed, records = output
+            self.record_step(ADJUSTMENT_STEP, operations, processed)
+            if generation == self.adjustments_generation:
+                self.adjustments_pending = False
+                self.set_processed_image(processed)
+            else:
+                # Слайдеры сдвинули, пока шаг применялся: на экране более новый
+                # предпросмотр, а новые значения будут применены следующим шагом
+                self.processed_image = processed
+            self.update_image_info(processed, records)
             
             # Логируем изменение параметров
             if brightness != 1.0 or contrast != 1.0:
@@ -585,86 +751,192 @@ class MainWindow(QMainWindow):
                     params.append(f"контраст: {contrast:.2f}")
                 self.log_action("Корректировка", ", ".join(params))
             
-        except Exception as e:
-            logging.error(f"Ошибка обработки: {e}")
-            QMessageBox.critical(self, "Ошибка", f"Ошибка обработки:\n{str(e)}")
+            if on_committed is not None:
+                on_committed()
+        
+        # Шаг истории и цепочка после него (фильтр, сохранение) не вытесняются предпросмотром
+        self.worker.submit(self.measured(process), done,
+                           lambda message: self.show_error("Ошибка обработки", message), coalesce=False)
     
-    def apply_resize(self):
-        if self.current_image is None:
+    def measured(self, func):
+        """Задача для фонового потока, которая вместе с результатом возвращает замеры операций"""
+        def job():
+            with metrics.registry.collect() as records:
+                result = func()
+            return result, records
+        return job
+    
+    def update_image_info(self, image, records=None):
+        """Показывает параметры изображения и замеры последней обработки"""
+        info = self.processor.get_image_info(image)
+        if self.edit_history is not None:
+            info['width'], info['height'] = self.edit_history.current_full_size()
+        info_text = f"Ширина: {info['width']} px\n"
+        info_text += f"Высота: {info['height']} px\n"
+        info_text += f"Формат: {info['format']}\n"
+        info_text += f"Режим: {info['mode']}"
+        if records is not None:
+            wall_time = sum(record["wall_time"] for record in records)
+            cpu_time = sum(record["cpu_time"] for record in records)
+            if records:
+                info_text += f"\nОбработка: {wall_time * 1000:.1f} мс (CPU {cpu_time * 1000:.1f} мс)"
+                pixels = sum(record["pixels"] for record in records)
+                if wall_time and pixels:
+                    info_text += f", {pixels / 1e6 / wall_time:.1f} Мп/с"
+            else:
+                info_text += "\nОбработка: результат из кэша"
+        self.image_info_text.setText(info_text)
+        return info
+    
+    def run_processing(self, func, on_done, error_title):
+        """Запускает обработку текущего состояния в фоновом потоке"""
+        if self.edit_history is None:
             return
         
-        try:
-            width = self.width_spinbox.value()
-            height = self.height_spinbox.value()
+        def start():
+            image = self.edit_history.current
             
-            # Применяем изменение размера к обработанному изображению
-            self.processed_image = self.processor.resize_image(self.current_image, width, height)
-            self.display_image(self.processed_image, self.processed_label)
+            def done(output):
+                result, records = output
+                on_done(result)
+                self.update_image_info(result, records)
+            
+            self.worker.submit(self.measured(lambda: func(image)), done,
+                               lambda message: self.show_error(error_title, message), coalesce=False)
+        
+        # Несохраненные значения слайдеров сначала становятся шагом истории
+        self.commit_adjustments(start)
+    
+    def record_step(self, label, operations, image):
+        """Добавляет шаг в историю правок; движения слайдеров подряд сливаются в один шаг"""
+        step = self.edit_history.current_step
+        if label == ADJUSTMENT_STEP and step is not None and step.label == ADJUSTMENT_STEP:
+            self.edit_history.replace_last(label, operations, image)
+        elif operations:
+            self.edit_history.push(label, operations, image)
+        self.update_history_buttons()
+    
+    def show_history_state(self, index=None, on_shown=None):
+        """
+        Переходит к состоянию истории правок index (по умолчанию к текущему),
+        показывает его и выставляет по нему слайдеры. Повтор операций и копия
+        для слайдеров считаются в фоновом потоке
+        """
+        history = self.edit_history
+        if index is None:
+            index = history.index
+        step = history.steps[index - 1] if index else None
+        render_state = history.replayer(index)
+        values = {}
+        render_base = None
+        if step is not None and step.label == ADJUSTMENT_STEP:
+            # Слайдеры задают корректировку относительно состояния под этим шагом
+            render_base = history.replayer(index - 1)
+            values = {name: args[0] for name, args, _ in step.operations}
+        
+        def render():
+            state = render_state()
+            base = render_base() if render_base is not None else state
+            return state, base, self.processor.create_preview(base, *PREVIEW_MAX_SIZE)
+        
+        def done(output):
+            state, base, preview = output
+            history.seek(index, state)
+            self.current_image = base
+            self.preview_image = preview
+            
+            brightness = values.get("adjust_brightness", 1.0)
+            contrast = values.get("adjust_contrast", 1.0)
+            for slider, value in ((self.brightness_slider, brightness), (self.contrast_slider, contrast)):
+                slider.blockSignals(True)
+                slider.setValue(round(value * 100))
+                slider.blockSignals(False)
+            self.brightness_value.setText(f"{brightness:.2f}")
+            self.contrast_value.setText(f"{contrast:.2f}")
             
-            # Обновляем техническую информацию
-            info = self.processor.get_image_info(self.processed_image)
-            info_text = f"Ширина: {info['width']} px\n"
-            info_text += f"Высота: {info['height']} px\n"
-            info_text += f"Формат: {info['format']}\n"
-            info_text += f"Режим: {info['mode']}"
-            self.image_info_text.setText(info_text)
+            self.adjustments_pending = False
+            self.set_processed_image(state)
+            width, height = history.current_full_size()
+            self.width_spinbox.setValue(width)
+            self.height_spinbox.setValue(height)
+            self.enable_controls(True)
+            if on_shown is not None:
+                on_shown()
+        
+        def failed(message):
+            self.enable_controls(True)
+            self.show_error("Ошибка истории правок", message)
+        
+        # Пока состояние считается, элементы управления выключены
+        self.enable_controls(False)
+        self.worker.submit(render, done, failed, coalesce=False)
+    
+    def set_processed_image(self, image):
+        """Сохраняет результат обработки и показывает его в предпросмотре"""
+        self.processed_image = image
+        self.display_image(self.processed_image, self.processed_label)
+        self.update_histogram(self.processed_image)
+    
+    def apply_resize(self):
+        width = self.width_spinbox.value()
+        height = self.height_spinbox.value()
+        # Сильное уменьшение идет через быстрый reduce, а фильтр работает на последнем шаге
+        operation = ("resize_image", [width, height], {
+            "mode": RESIZE_MODES[self.resize_mode_combo.currentText()],
+            "reducing_gap": resampling.DEFAULT_REDUCING_GAP
+        })
+        
+        def done(result):
+            # Применяем изменение размера к обработанному изображению
+            self.edit_history.push("Изменение размера", [operation], result)
+            self.show_history_state()
             
             # Логируем действие
             self.log_action("Изменен размер", f"{width}x{height} px")
             
             logging.info(f"Изменен размер: {width}x{height}")
-            
-        except Exception as e:
-            logging.error(f"Ошибка изменения размера: {e}")
-            QMessageBox.critical(self, "Ошибка", f"Ошибка изменения размера:\n{str(e)}")
+        
+        # Размеры заданы для полного разрешения и пересчитываются для копии
+        name, args, kwargs = scale_operation(operation, self.proxy_scale)
+        self.run_processing(lambda image: self.processor.apply_operation(image, name, *args, **kwargs),
+                            done, "Ошибка изменения размера")
     
     # ===== ФУНКЦИОНАЛЬНЫЕ КНОПКИ =====
+    def apply_filter(self, operation, name, error_title, args=()):
+        def done(result):
+            self.edit_history.push(name, [(operation, list(args), {})], result)
+            self.show_history_state()
+            self.log_action("Применен фильтр", name)
+        
+        # Радиусы заданы для полного разрешения и пересчитываются для копии
+        _, scaled_args, _ = scale_operation((operation, args, {}), self.proxy_scale)
+        # Через apply_operation результат берется из кэша, если фильтр уже применялся
+        self.run_processing(lambda image: self.processor.apply_operation(image, operation, *scaled_args),
+                            done, error_title)
+    
     def apply_grayscale(self):
-        try:
-            self.processed_image = self.processor.apply_grayscale(self.current_image)
-            self.display_image(self.processed_image, self.processed_label)
-            self.log_action("Применен фильтр", "Черно-белое")
-        except Exception as e:
-            self.show_error("Ошибка Ч/Б фильтра", str(e))
+        self.apply_filter("apply_grayscale", "Черно-белое", "Ошибка Ч/Б фильтра")
     
     def apply_sepia(self):
-        try:
-            self.processed_image = self.processor.apply_sepia(self.current_image)
-            self.display_image(self.processed_image, self.processed_label)
-            self.log_action("Применен фильтр", "Сепия")
-        except Exception as e:
-            self.show_error("Ошибка сепии", str(e))
+        self.apply_filter("apply_sepia", "Сепия", "Ошибка сепии")
     
     def apply_invert(self):
-        try:
-            self.processed_image = self.processor.apply_invert(self.current_image)
-            self.display_image(self.processed_image, self.processed_label)
-            self.log_action("Применен фильтр", "Инверсия")
-        except Exception as e:
-            self.show_error("Ошибка инвертирования", str(e))
+        self.apply_filter("apply_invert", "Инверсия", "Ошибка инвертирования")
     
     def apply_blur(self):
-        try:
-            self.processed_image = self.processor.apply_blur(self.current_image)
-            self.display_image(self.processed_image, self.processed_label)
-            self.log_action("Применен фильтр", "Размытие")
-        except Exception as e:
-            self.show_error("Ошибка размытия", str(e))
+        self.apply_filter("apply_blur", "Размытие", "Ошибка размытия", [self.radius_spinbox.value()])
+    
+    def apply_preset(self):
+        name = self.preset_combo.currentText()
+        if name:
+            self.apply_filter("apply_preset", f"Пресет: {name}", "Ошибка пресета", [name])
+    
+    def apply_sharpen(self):
+        self.apply_filter("apply_sharpen", "Резкость", "Ошибка резкости", [self.radius_spinbox.value()])
     
     def display_image(self, image, label):
         try:
-            if image.mode == "RGB":
-                qimage = QImage(image.tobytes(), image.width, image.height, QImage.Format.Format_RGB888)
-            elif image.mode == "RGBA":
-                qimage = QImage(image.tobytes(), image.width, image.height, QImage.Format.Format_RGBA8888)
-            else:
-                image = image.convert("RGB")
-                qimage = QImage(image.tobytes(), image.width, image.height, QImage.Format.Format_RGB888)
-            
-            pixmap = QPixmap.fromImage(qimage)
-            scaled = pixmap.scaled(400, 300, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-            label.setPixmap(scaled)
-            
+            label.setPixmap(self.display_bridge.to_pixmap(image, label))
         except Exception as e:
             logging.error(f"Ошибка отображения: {e}")
     
@@ -673,46 +945,71 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Предупреждение", "Нет изображения для сохранения")
             return
         
-        try:
-            file_path, _ = QFileDialog.getSaveFileName(
-                self, "Сохранить изображение", "обработанное_изображение", 
-                "PNG (*.png);;JPEG (*.jpg *.jpeg);;BMP (*.bmp);;All Files (*)"
-            )
-            
-            if file_path:
-                self.processor.save_image(self.processed_image, file_path)
-                QMessageBox.information(self, "Успех", "Изображение успешно сохранено!")
-                self.log_action("Сохранение", os.path.basename(file_path))
-                logging.info(f"Изображение сохранено: {file_path}")
-                
-        except Exception as e:
-            logging.error(f"Ошибка сохранения: {e}")
-            QMessageBox.critical(self, "Ошибка", f"Ошибка сохранения:\n{str(e)}")
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Сохранить изображение", "обработанное_изображение", 
+            "PNG (*.png);;JPEG (*.jpg *.jpeg);;WebP (*.webp);;BMP (*.bmp);;All Files (*)"
+        )
+        
+        if file_path:
+            # Несохраненные значения слайдеров сначала становятся шагом истории
+            self.commit_adjustments(lambda: self.write_image(file_path))
+    
+    def write_image(self, file_path):
+        """Сохраняет результат в фоновом потоке, при необходимости в полном разрешении"""
+        history = self.edit_history
+        source_path = self.source_path
+        processed = self.processed_image
+        
+        def render():
+            image = processed
+            if history.scale != 1.0:
+                # Полное разрешение декодируется только сейчас, и к нему повторяются все шаги
+                image = history.render(self.processor.load_image(source_path))
+            format = normalize_format(os.path.splitext(file_path)[1])
+            self.processor.save_image(image, file_path, format, **SAVE_OPTIONS.get(format, {}))
+        
+        def done(_):
+            self.enable_controls(True)
+            QMessageBox.information(self, "Успех", "Изображение успешно сохранено!")
+            self.log_action("Сохранение", os.path.basename(file_path))
+            logging.info(f"Изображение сохранено: {file_path}")
+        
+        def failed(message):
+            self.enable_controls(True)
+            logging.error(f"Ошибка сохранения: {message}")
+            QMessageBox.critical(self, "Ошибка", f"Ошибка сохранения:\n{message}")
+        
+        # Пока идет сохранение, элементы управления выключены
+        self.enable_controls(False)
+        self.worker.submit(render, done, failed, coalesce=False)
     
     def undo_action(self):
-        if self.original_image:
-            # Восстанавливаем оригинальное изображение
-            self.current_image = self.original_image.copy()
-            self.processed_image = self.original_image.copy()
-            
-            # Отображаем оба изображения
-            self.display_image(self.current_image, self.original_label)
-            self.display_image(self.processed_image, self.processed_label)
-            
-            # Сбрасываем слайдеры
-            self.brightness_slider.setValue(100)
-            self.contrast_slider.setValue(100)
-            self.brightness_value.setText("1.00")
-            self.contrast_value.setText("1.00")
-            
-            # Восстанавливаем оригинальные размеры
-            self.width_spinbox.setValue(self.original_image.width)
-            self.height_spinbox.setValue(self.original_image.height)
-            
-            # Логируем действие
-            self.log_action("Отмена", "Все изменения отменены")
-            
-            logging.info("Действие отменено")
+        if self.edit_history is None or not self.edit_history.can_undo():
+            return
+        self.worker.cancel()
+        label = self.edit_history.current_step.label
+        
+        def shown():
+            self.log_action("Отмена", label)
+            logging.info(f"Действие отменено: {label}")
+        
+        self.show_history_state(self.edit_history.index - 1, shown)
+    
+    def redo_action(self):
+        if self.edit_history is None or not self.edit_history.can_redo():
+            return
+        self.worker.cancel()
+        label = self.edit_history.steps[self.edit_history.index].label
+        
+        def shown():
+            self.log_action("Повтор", label)
+            logging.info(f"Действие повторено: {label}")
+        
+        self.show_history_state(self.edit_history.index + 1, shown)
     
     def show_error(self, title, message):
         QMessageBox.critical(self, title, message)
+    
+    def closeEvent(self, event):
+        self.worker.shutdown()
+        super().closeEvent(event)
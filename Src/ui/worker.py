@@ -0,0 +1,103 @@
+import logging
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class _TaskSignals(QObject):
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str)
+
+
+class _Task(QRunnable):
+    def __init__(self, job_id, func, signals):
+        super().__init__()
+        self.job_id = job_id
+        self.func = func
+        self.signals = signals
+
+    def run(self):
+        try:
+            result = self.func()
+        except Exception as e:
+            logging.error(f"Ошибка фоновой обработки: {e}")
+            self.signals.failed.emit(self.job_id, str(e))
+            return
+        self.signals.finished.emit(self.job_id, result)
+
+
+class ProcessingWorker(QObject):
+    """
+    Выполняет обработку изображений в фоновом потоке. Одновременно выполняется
+    одна задача; новая задача вытесняет ожидающие, а результаты устаревших
+    задач отбрасываются, поэтому быстрые движения слайдеров схлопываются.
+    Задачи с coalesce=False (применение шага, сохранение) не вытесняются,
+    и их результат доставляется всегда, кроме явной отмены
+    """
+
+    busy_changed = pyqtSignal(bool)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.signals = _TaskSignals(self)
+        self.signals.finished.connect(self._on_finished)
+        self.signals.failed.connect(self._on_failed)
+        self._last_id = 0
+        self._running = None
+        self._pending = []
+        self._callbacks = {}
+
+    def submit(self, func, on_done, on_error=None, coalesce=True) -> int:
+        """Ставит задачу в очередь; колбэки вызываются в GUI-потоке"""
+        self._last_id += 1
+        if coalesce:
+            for job_id, _, pending_coalesce in self._pending:
+                if pending_coalesce:
+                    self._callbacks.pop(job_id, None)
+            self._pending = [job for job in self._pending if not job[2]]
+        self._pending.append((self._last_id, func, coalesce))
+        self._callbacks[self._last_id] = (on_done, on_error, coalesce)
+        self._start_next()
+        return self._last_id
+
+    def cancel(self):
+        """Отменяет ожидающие задачи; результат выполняющейся будет отброшен"""
+        self._last_id += 1
+        self._pending = []
+        self._callbacks.clear()
+
+    def is_busy(self) -> bool:
+        return self._running is not None
+
+    def shutdown(self):
+        self.cancel()
+        self.pool.waitForDone()
+
+    def _start_next(self):
+        if self._running is not None or not self._pending:
+            return
+        job_id, func, _ = self._pending.pop(0)
+        self._running = job_id
+        self.pool.start(_Task(job_id, func, self.signals))
+        self.busy_changed.emit(True)
+
+    def _finish(self, job_id):
+        self._running = None
+        on_done, on_error, coalesce = self._callbacks.pop(job_id, (None, None, True))
+        self._start_next()
+        if self._running is None:
+            self.busy_changed.emit(False)
+        # Результат схлопываемой задачи доставляется, только если после нее ничего не ставили
+        if coalesce and job_id != self._last_id:
+            return None, None
+        return on_done, on_error
+
+    def _on_finished(self, job_id, result):
+        on_done, _ = self._finish(job_id)
+        if on_done is not None:
+            on_done(result)
+
+    def _on_failed(self, job_id, message):
+        _, on_error = self._finish(job_id)
+        if on_error is not None:
+            on_error(message)